@@ -1,7 +1,10 @@
 from langgraph import Graph
 from .llm_agent import LLMWrapper
 from .schema_retriever import SchemaRetriever
-import sqlite3
+from backend.rag.db_pool import get_pool
+from backend.rag.prompt_budget import (
+    PROMPT_BUDGET_RESULTS, PROMPT_BUDGET_SCHEMA, PromptSection, budget_sections, format_rows
+)
 
 class SQLQueryAgent:
     def __init__(self, db_path="db/retail.db"):
@@ -10,22 +13,24 @@ class SQLQueryAgent:
         self.db_path = db_path
 
     def execute_sql(self, sql: str):
-        conn = sqlite3.connect(self.db_path)
-        cur = conn.cursor()
         try:
-            cur.execute(sql)
-            results = cur.fetchall()
-            columns = [desc[0] for desc in cur.description] if cur.description else []
+            with get_pool(self.db_path).connection() as conn:
+                cur = conn.execute(sql)
+                results = cur.fetchall()
+                columns = [desc[0] for desc in cur.description] if cur.description else []
         except Exception as e:
             results, columns = [], []
             print(f"SQL Execution Error: {e}")
-        conn.close()
         return results, columns
 
     def run(self, user_query: str):
         # Step 1: Retrieve schema context
         context_docs = self.retriever.retrieve(user_query)
-        context_text = "\n".join([doc.page_content for doc in context_docs])
+        context_text = "\n\n".join([doc.page_content for doc in context_docs])
+        context_text = budget_sections("agent_sql", [
+            PromptSection("question", user_query),
+            PromptSection("schema", context_text, PROMPT_BUDGET_SCHEMA, priority=1),
+        ])["schema"]
 
         # Step 2: Generate SQL
         prompt_sql = f"""
@@ -41,8 +46,15 @@ class SQLQueryAgent:
         results, columns = self.execute_sql(sql)
 
         # Step 4: Generate AI insights
+        rows = format_rows([dict(zip(columns, row)) for row in results])
+        rows = budget_sections("agent_insights", [
+            PromptSection(
+                "results", rows, PROMPT_BUDGET_RESULTS, priority=1, separator="\n", pin_first=True
+            ),
+        ])["results"]
         prompt_insights = f"""
-        Given the SQL results: {results}
+        Given the SQL results ({len(results)} rows):
+        {rows}
         Provide a short, actionable summary and insights.
         """
         insights = self.llm.run(prompt_insights)
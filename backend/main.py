@@ -1,9 +1,25 @@
-from fastapi import FastAPI
-import sqlite3
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import Optional
+import base64
+import json
+import os
 from backend.rag.router import router as rag_router
+from backend.rag.db_pool import DB_PATH, get_pool
+from backend.rag.metrics import metrics
 
-DB_PATH = "backend/db/retail.db"
+# Pagination / streaming for the REST endpoints
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "100"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "1000"))
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "500"))
+
+# Table -> primary key used for keyset pagination
+TABLE_KEYS = {
+    "customers": "customer_id",
+    "orders": "order_id",
+    "products": "product_id",
+}
 
 app = FastAPI()
 
@@ -19,30 +35,88 @@ app.add_middleware(
 # Include RAG router
 app.include_router(rag_router, prefix="/rag")
 
+# Prometheus scrape endpoint: per-stage latency histograms and LLM token counts
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# Keyset pagination helpers
+def encode_cursor(last_key) -> str:
+    """Opaque `after` token for the last primary key of a page."""
+    raw = json.dumps({"after": last_key}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token: str):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded))["after"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid 'after' cursor token")
+
+def keyset_query(table: str, after: Optional[str]) -> tuple[str, list]:
+    pk = TABLE_KEYS[table]
+    if after:
+        return f"SELECT * FROM {table} WHERE {pk} > ? ORDER BY {pk}", [decode_cursor(after)]
+    return f"SELECT * FROM {table} ORDER BY {pk}", []
+
+def fetch_page(table: str, limit: int, after: Optional[str]) -> dict:
+    """One page of rows ordered by primary key, plus the cursor for the next one."""
+    sql, params = keyset_query(table, after)
+    with get_pool(DB_PATH).connection() as conn:
+        cursor = conn.execute(f"{sql} LIMIT ?", params + [limit + 1])
+        columns = [desc[0] for desc in cursor.description]
+        rows = cursor.fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_after = None
+    if has_more:
+        next_after = encode_cursor(rows[-1][columns.index(TABLE_KEYS[table])])
+    return {table: rows, "limit": limit, "next_after": next_after}
+
+def stream_table(table: str, after: Optional[str]) -> StreamingResponse:
+    """Stream a whole table as NDJSON, one row per line, in fetchmany chunks."""
+    sql, params = keyset_query(table, after)
+
+    def generate():
+        # Dedicated connection: the response iterator hops threadpool threads
+        with get_pool(DB_PATH).dedicated() as conn:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(STREAM_CHUNK_ROWS)
+                if not rows:
+                    break
+                yield "".join(json.dumps(row, default=str) + "\n" for row in rows)
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
 # Standard REST endpoints
 @app.get("/customers")
-def get_customers():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM customers;")
-    rows = cursor.fetchall()
-    conn.close()
-    return {"customers": rows}
+def get_customers(
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    after: Optional[str] = None,
+    stream: bool = False
+):
+    if stream:
+        return stream_table("customers", after)
+    return fetch_page("customers", limit, after)
 
 @app.get("/orders")
-def get_orders():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM orders;")
-    rows = cursor.fetchall()
-    conn.close()
-    return {"orders": rows}
+def get_orders(
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    after: Optional[str] = None,
+    stream: bool = False
+):
+    if stream:
+        return stream_table("orders", after)
+    return fetch_page("orders", limit, after)
 
 @app.get("/products")
-def get_products():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM products;")
-    rows = cursor.fetchall()
-    conn.close()
-    return {"products": rows}
+def get_products(
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    after: Optional[str] = None,
+    stream: bool = False
+):
+    if stream:
+        return stream_table("products", after)
+    return fetch_page("products", limit, after)
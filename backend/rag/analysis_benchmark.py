@@ -0,0 +1,121 @@
+"""
+Compare the three-call analysis path with the combined single-call mode.
+
+Runs a fixed set of (question, SQL) pairs through run_analysis in both
+modes and reports latency and the prompt/completion tokens the provider
+reported (via the RequestTrace token callback), plus LLM calls and field
+retries per request.
+
+    python -m backend.rag.analysis_benchmark --runs 5            # real OpenAI
+    python -m backend.rag.analysis_benchmark --offline --json    # stub providers
+
+--offline uses the same throwaway database and stub providers as
+loadtest.py; its token counts are word counts, useful for relative
+comparisons only.
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from .loadtest import percentile, prepare_environment
+
+SAMPLES = [
+    ("Who are our customers in each region?",
+     "SELECT region, COUNT(*) AS customers FROM customers GROUP BY region ORDER BY customers DESC"),
+    ("What are the five most expensive products?",
+     "SELECT name, category, price FROM products ORDER BY price DESC LIMIT 5"),
+    ("Monthly revenue",
+     "SELECT strftime('%Y-%m', order_date) AS month, SUM(total_amount) AS revenue "
+     "FROM orders GROUP BY month ORDER BY month"),
+    ("Top customers by total spend",
+     "SELECT c.name, SUM(o.total_amount) AS spend FROM customers c "
+     "JOIN orders o ON o.customer_id = c.customer_id GROUP BY c.customer_id ORDER BY spend DESC LIMIT 10"),
+]
+
+MODES = ("separate", "combined")
+
+
+def benchmark_mode(router, mode: str, runs: int, enrich: bool) -> Dict:
+    latencies: List[float] = []
+    prompt_tokens: List[int] = []
+    completion_tokens: List[int] = []
+    calls: List[int] = []
+    retries = 0
+    for _ in range(runs):
+        for question, sql in SAMPLES:
+            results, execution_time, meta = router.run_sql(sql)
+            trace = router.RequestTrace()
+            started = time.perf_counter()
+            router.run_analysis(
+                sql, question, results, execution_time, None, enrich, trace, mode, meta.get("profile")
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+            summary = trace.summary()
+            prompt_tokens.append(sum(t["prompt"] for t in summary["tokens"].values()))
+            completion_tokens.append(sum(t["completion"] for t in summary["tokens"].values()))
+            calls.append(sum(t["calls"] for t in summary["tokens"].values()))
+            retries += sum(1 for stage in summary["stages_ms"] if stage.startswith("retry_"))
+
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "latency_ms": {
+            "p50": round(percentile(ordered, 50), 2),
+            "p95": round(percentile(ordered, 95), 2),
+            "mean": round(statistics.fmean(ordered), 2),
+        },
+        "prompt_tokens_mean": round(statistics.fmean(prompt_tokens), 1),
+        "completion_tokens_mean": round(statistics.fmean(completion_tokens), 1),
+        "llm_calls_mean": round(statistics.fmean(calls), 2),
+        "field_retries": retries,
+    }
+
+
+def run_benchmark(runs: int, enrich: bool) -> Dict:
+    from backend.rag import router
+
+    report = {mode: benchmark_mode(router, mode, runs, enrich) for mode in MODES}
+    separate, combined = report["separate"], report["combined"]
+    report["combined_vs_separate"] = {
+        "prompt_tokens": round(combined["prompt_tokens_mean"] / separate["prompt_tokens_mean"], 3)
+        if separate["prompt_tokens_mean"] else None,
+        "latency_p50": round(combined["latency_ms"]["p50"] / separate["latency_ms"]["p50"], 3)
+        if separate["latency_ms"]["p50"] else None,
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Combined vs separate analysis calls")
+    parser.add_argument("--runs", type=int, default=3, help="passes over the sample queries")
+    parser.add_argument("--enrich", action="store_true", help="include LLM optimization tips")
+    parser.add_argument("--offline", action="store_true", help="use the stub providers")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    if args.offline:
+        with tempfile.TemporaryDirectory(prefix="sql-buddy-bench-") as workdir:
+            prepare_environment(workdir)
+            report = run_benchmark(args.runs, args.enrich)
+    else:
+        report = run_benchmark(args.runs, args.enrich)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for mode in MODES:
+        r = report[mode]
+        print(
+            f"{mode:>9}: p50 {r['latency_ms']['p50']}ms  p95 {r['latency_ms']['p95']}ms  "
+            f"prompt {r['prompt_tokens_mean']}  completion {r['completion_tokens_mean']}  "
+            f"calls {r['llm_calls_mean']}  retries {r['field_retries']}"
+        )
+    ratio = report["combined_vs_separate"]
+    print(f"combined/separate: prompt tokens x{ratio['prompt_tokens']}, p50 latency x{ratio['latency_p50']}")
+
+
+if __name__ == "__main__":
+    main()
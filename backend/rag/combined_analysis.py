@@ -0,0 +1,147 @@
+"""
+One-call analysis: explanation, optimization tips and insights from a single
+structured LLM response instead of three prompts that each repeat the SQL
+and question.
+
+The prompt asks for a JSON object with one string field per requested
+analysis. parse_analysis() accepts the object even when it is wrapped in
+prose or code fences, and salvages individual fields from malformed JSON;
+fields that are still missing are returned separately so the caller can
+retry just those with the single-field prompts.
+
+ANALYSIS_MODE=separate keeps the three-call path; combined enables this one
+(per request: QueryRequest.analysis_mode). COMBINED_ANALYSIS_RESPONSE_FORMAT
+chooses how the response is constrained: json_schema (structured outputs,
+gpt-4o family), json_object (JSON mode) or none (prompt only, any model).
+"""
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from .prompt_budget import (
+    PROMPT_BUDGET_PROFILE, PROMPT_BUDGET_RESULTS, PROMPT_PROFILE_SAMPLE_ROWS, PromptSection,
+    budget_sections, format_rows
+)
+from .result_profile import render_profile
+
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "separate").lower()
+COMBINED_ANALYSIS_RESPONSE_FORMAT = os.getenv("COMBINED_ANALYSIS_RESPONSE_FORMAT", "none").lower()
+
+ANALYSIS_MODES = ("separate", "combined")
+
+FIELD_INSTRUCTIONS = {
+    "explanation": "the SQL in simple terms, 2-3 sentences for beginners",
+    "optimization": "1-2 tips the analyzer missed, or say it is complete",
+    "insights": "key insights from the results",
+}
+
+_JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def combined_prompt(
+    sql_query: str,
+    question: str,
+    results: List[Dict],
+    execution_time: float,
+    fields: List[str],
+    plan_report: Optional[str] = None,
+    profile: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Single prompt covering every requested field; SQL and question appear
+    once. With a result profile the rows are only a small sample.
+    """
+    analyzer = plan_report if "optimization" in fields and plan_report else ""
+    if profile is None:
+        rows = format_rows(results)
+    else:
+        rows = format_rows(results, max_rows=PROMPT_PROFILE_SAMPLE_ROWS, total=profile["rows"])
+    sections = budget_sections("combined_analysis", [
+        PromptSection("question", question),
+        PromptSection("sql", sql_query),
+        PromptSection("analyzer", analyzer),
+        PromptSection(
+            "profile", render_profile(profile), PROMPT_BUDGET_PROFILE, priority=1,
+            separator="\n", pin_first=True
+        ),
+        PromptSection("results", rows, PROMPT_BUDGET_RESULTS, priority=2, separator="\n", pin_first=True),
+    ])
+    lines = [
+        "Analyze this SQLite query and its results.",
+        f"Question: {question}",
+        f"SQL: {sql_query}",
+        f"Time: {execution_time:.2f}ms",
+    ]
+    if sections["profile"]:
+        lines.extend([sections["profile"], "Sample rows:", sections["results"]])
+    else:
+        lines.extend([f"Results ({len(results)} rows):", sections["results"]])
+    if analyzer:
+        lines.append(f"Analyzer: {analyzer}")
+    lines.append("")
+    lines.append("Respond with only a JSON object with these string fields:")
+    lines.extend(f'- "{field}": {FIELD_INSTRUCTIONS[field]}' for field in fields)
+    return "\n".join(lines)
+
+
+def response_format(fields: List[str], mode: str = COMBINED_ANALYSIS_RESPONSE_FORMAT) -> Optional[Dict[str, Any]]:
+    """OpenAI response_format for the combined call, or None for prompt-only JSON."""
+    if mode == "json_object":
+        return {"type": "json_object"}
+    if mode == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "query_analysis",
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": {field: {"type": "string"} for field in fields},
+                    "required": list(fields),
+                    "additionalProperties": False,
+                },
+            },
+        }
+    return None
+
+
+def _field_text(value: Any) -> Optional[str]:
+    if isinstance(value, str):
+        return value.strip() or None
+    if isinstance(value, list) and value and all(isinstance(v, str) for v in value):
+        return "\n".join(f"- {v.strip()}" for v in value)
+    return None
+
+
+def _salvage(text: str, field: str) -> Optional[str]:
+    """Pull one string field out of JSON that does not parse as a whole."""
+    match = re.search(rf'"{field}"\s*:\s*"((?:[^"\\]|\\.)*)"', text, re.DOTALL)
+    if not match:
+        return None
+    try:
+        return json.loads(f'"{match.group(1)}"').strip() or None
+    except ValueError:
+        return None
+
+
+def parse_analysis(text: str, fields: List[str]) -> Tuple[Dict[str, str], List[str]]:
+    """Return (parsed fields, fields that still need a retry)."""
+    text = _CODE_FENCE.sub("", text.strip())
+    data: Dict[str, Any] = {}
+    match = _JSON_OBJECT.search(text)
+    if match:
+        try:
+            loaded = json.loads(match.group(0))
+            if isinstance(loaded, dict):
+                data = loaded
+        except ValueError:
+            pass
+
+    parsed = {}
+    for field in fields:
+        value = _field_text(data.get(field)) if data else _salvage(text, field)
+        if value:
+            parsed[field] = value
+    return parsed, [field for field in fields if field not in parsed]
@@ -0,0 +1,118 @@
+"""
+Run independent blocking calls concurrently, each with its own deadline.
+
+Used for context gathering (Redis short-term, Mem0 long-term, schema
+retrieval) and the analysis calls. A call that misses its deadline is not
+waited for: its result is replaced by the fallback and it is reported as
+"timeout", so one slow source never stalls the others.
+
+Deadlines count from submission by default. With queue_timeout_s set they
+count from when a worker starts the task instead, so time spent queued
+behind other requests on a shared pool does not eat into them; a task still
+queued after queue_timeout_s is cancelled and reported as "timeout".
+"""
+import threading
+import time
+from concurrent.futures import Executor, Future, TimeoutError as FuturesTimeoutError
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# name -> (fn, args, deadline_s, fallback)
+Tasks = Dict[str, Tuple[Callable, tuple, float, Any]]
+
+
+class DeadlineGather:
+    """
+    Submitted set of tasks; results can be collected one source at a time
+    (e.g. wait for the fast source, decide, then collect the rest).
+    """
+
+    def __init__(self, executor: Executor, tasks: Tasks, queue_timeout_s: Optional[float] = None):
+        self.tasks = tasks
+        self.queue_timeout_s = queue_timeout_s
+        self.started = time.monotonic()
+        self.results: Dict[str, Any] = {}
+        self.timings: Dict[str, Dict[str, Any]] = {}
+        self._started_at: Dict[str, float] = {}
+        self._running = {name: threading.Event() for name in tasks}
+        self._finished_at: Dict[str, float] = {}
+        self._futures: Dict[str, Future] = {}
+        for name, (fn, args, _, _) in tasks.items():
+            self._futures[name] = executor.submit(self._timed, name, fn, args)
+
+    def _timed(self, name: str, fn: Callable, args: tuple) -> Any:
+        self._started_at[name] = time.monotonic()
+        self._running[name].set()
+        try:
+            return fn(*args)
+        finally:
+            self._finished_at[name] = time.monotonic()
+
+    def _remaining(self, name: str, deadline_s: float) -> Optional[float]:
+        """Seconds left until the task's deadline; None while it is still queued."""
+        if self.queue_timeout_s is None:
+            return max(0.0, self.started + deadline_s - time.monotonic())
+        queue_left = max(0.0, self.started + self.queue_timeout_s - time.monotonic())
+        if not self._running[name].wait(queue_left):
+            return None
+        return max(0.0, self._started_at[name] + deadline_s - time.monotonic())
+
+    def result(self, name: str) -> Any:
+        """Wait for one task up to its deadline (see the module docstring)."""
+        if name in self.results:
+            return self.results[name]
+        _, _, deadline_s, fallback = self.tasks[name]
+        future = self._futures[name]
+        remaining = self._remaining(name, deadline_s)
+        if remaining is None and not future.cancel():
+            # A worker picked it up just as the queue wait ran out
+            self._running[name].wait()
+            remaining = self._remaining(name, deadline_s)
+        try:
+            if remaining is None:
+                print(f"Warning: {name} waited {self.queue_timeout_s:g}s for a free worker")
+                raise FuturesTimeoutError()
+            value = future.result(timeout=remaining)
+            status = "ok"
+        except FuturesTimeoutError:
+            future.cancel()
+            if remaining is not None:
+                print(f"Warning: {name} missed its {deadline_s:g}s deadline")
+            value, status = fallback, "timeout"
+        except Exception as e:
+            print(f"Warning: {name} failed - {e}")
+            value, status = fallback, "error"
+
+        finished = self._finished_at.get(name) if status != "timeout" else None
+        elapsed = (finished or time.monotonic()) - self.started
+        self.results[name] = value
+        self.timings[name] = {"ms": round(elapsed * 1000, 2), "status": status}
+        if self.queue_timeout_s is not None:
+            queued = self._started_at.get(name, time.monotonic()) - self.started
+            self.timings[name]["queue_ms"] = round(queued * 1000, 2)
+        return value
+
+    def collect(self) -> Dict[str, Any]:
+        """Wait for every remaining task (each bounded by its own deadline)."""
+        for name in self.tasks:
+            self.result(name)
+        return self.results
+
+    def abandon(self, name: str, reason: str = "skipped"):
+        """Stop waiting for a task whose result is no longer needed."""
+        if name in self.results:
+            return
+        self._futures[name].cancel()
+        self.results[name] = self.tasks[name][3]
+        self.timings[name] = {"ms": None, "status": reason}
+
+
+def gather_with_deadlines(
+    executor: Executor,
+    tasks: Tasks,
+    queue_timeout_s: Optional[float] = None
+) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    """Run all tasks concurrently; returns (results, timings)."""
+    gather = DeadlineGather(executor, tasks, queue_timeout_s)
+    gather.collect()
+    return gather.results, gather.timings
+
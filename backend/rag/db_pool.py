@@ -0,0 +1,203 @@
+"""
+Shared read-only SQLite connection layer.
+
+Every execution path (run_sql, the REST handlers in main.py, execute_sql in
+query_rag_sql.py and SQLQueryAgent) borrows a connection from here instead
+of calling sqlite3.connect per request. Connections are kept alive per
+thread so SQLite's page cache, mmap and statement cache survive between
+queries, and they are opened read-only (mode=ro + query_only).
+"""
+import os
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+DB_PATH = os.getenv("SQL_BUDDY_DB_PATH", "backend/db/retail.db")
+
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KIB = int(os.getenv("SQLITE_CACHE_SIZE_KIB", "65536"))
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+
+
+class _ThreadConnection:
+    """Holds one thread's connection; closes it when the thread goes away."""
+
+    def __init__(self, pool: "SQLitePool", conn: sqlite3.Connection):
+        self.pool = pool
+        self.conn = conn
+        self.uses = 0
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except sqlite3.Error:
+                pass
+            self.conn = None
+            self.pool._on_close()
+
+    def __del__(self):
+        self.close()
+
+
+class SQLitePool:
+    """Per-thread pool of read-only connections to one database file."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        # Re-entrant: a holder finalizer may run (and count) while the lock is held
+        self._lock = threading.RLock()
+        self._holders: "weakref.WeakValueDictionary[int, _ThreadConnection]" = weakref.WeakValueDictionary()
+        self._wal_checked = False
+        self.journal_mode = None
+        self.opened = 0
+        self.closed = 0
+        self.checkouts = 0
+        self.reuses = 0
+        self.errors = 0
+        self.dedicated_open = 0
+
+    # ---------- connection setup ----------
+
+    def _ensure_wal(self):
+        """Switch the database to WAL once (needs a writable connection)."""
+        if self._wal_checked:
+            return
+        with self._lock:
+            if self._wal_checked:
+                return
+            self._wal_checked = True
+            try:
+                conn = sqlite3.connect(f"file:{self.db_path}?mode=rw", uri=True, timeout=5)
+                try:
+                    self.journal_mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"Warning: could not enable WAL on {self.db_path} - {e}")
+
+    def open_connection(self, check_same_thread: bool = True) -> sqlite3.Connection:
+        """Open a new configured read-only connection (not managed by the pool)."""
+        self._ensure_wal()
+        conn = sqlite3.connect(
+            f"file:{self.db_path}?mode=ro",
+            uri=True,
+            check_same_thread=check_same_thread,
+            cached_statements=SQLITE_STATEMENT_CACHE,
+        )
+        conn.execute("PRAGMA query_only = 1")
+        conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KIB}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def _on_close(self):
+        with self._lock:
+            self.closed += 1
+
+    # ---------- borrowing ----------
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow this thread's long-lived connection."""
+        holder = getattr(self._local, "holder", None)
+        with self._lock:
+            self.checkouts += 1
+            if holder is not None and holder.conn is not None:
+                self.reuses += 1
+        if holder is None or holder.conn is None:
+            try:
+                # The holder is only ever used by this thread; check_same_thread is
+                # off so the finalizer can close it from whichever thread runs GC.
+                holder = _ThreadConnection(self, self.open_connection(check_same_thread=False))
+            except sqlite3.Error:
+                with self._lock:
+                    self.errors += 1
+                raise
+            self._local.holder = holder
+            self._holders[id(holder)] = holder
+
+        holder.uses += 1
+        try:
+            yield holder.conn
+        except sqlite3.ProgrammingError:
+            # e.g. the connection was closed underneath us; start fresh next time
+            with self._lock:
+                self.errors += 1
+            holder.close()
+            self._local.holder = None
+            raise
+
+    @contextmanager
+    def dedicated(self) -> Iterator[sqlite3.Connection]:
+        """
+        Open a short-lived connection usable from any thread, for work that
+        hops threads (streaming responses, held-open cursors).
+        """
+        conn = self.open_connection(check_same_thread=False)
+        with self._lock:
+            self.dedicated_open += 1
+        try:
+            yield conn
+        finally:
+            conn.close()
+            with self._lock:
+                self.dedicated_open -= 1
+                self.closed += 1
+
+    # ---------- management ----------
+
+    def close_all(self):
+        """Close every pooled connection (they reopen lazily on next use)."""
+        for holder in list(self._holders.values()):
+            holder.close()
+
+    def stats(self) -> Dict:
+        """Pool statistics."""
+        with self._lock:
+            return {
+                "db_path": self.db_path,
+                "journal_mode": self.journal_mode,
+                "thread_connections": sum(
+                    1 for h in self._holders.values() if h.conn is not None
+                ),
+                "dedicated_connections": self.dedicated_open,
+                "opened": self.opened,
+                "closed": self.closed,
+                "checkouts": self.checkouts,
+                "reuses": self.reuses,
+                "reuse_rate": round(self.reuses / self.checkouts, 4) if self.checkouts else 0.0,
+                "errors": self.errors,
+                "pragmas": {
+                    "mmap_size": SQLITE_MMAP_SIZE,
+                    "cache_size_kib": SQLITE_CACHE_SIZE_KIB,
+                    "temp_store": "MEMORY",
+                    "statement_cache": SQLITE_STATEMENT_CACHE,
+                },
+            }
+
+
+_pools: Dict[str, SQLitePool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str = DB_PATH) -> SQLitePool:
+    """Return the shared pool for a database file."""
+    key = os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = SQLitePool(db_path)
+        return pool
+
+
+def all_pool_stats() -> Dict[str, Dict]:
+    """Statistics for every pool created in this process."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.db_path: pool.stats() for pool in pools}
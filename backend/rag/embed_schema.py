@@ -3,47 +3,33 @@ import os
 
 load_dotenv()
 
-import sqlite3
-from typing import List, Dict
+import time
 
 # Updated imports for new LangChain structure
 from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
 
-SCHEMA_FILE = "backend/db/schema.sql"
-VECTOR_DIR = "backend/rag/vectorstore"
-
-def load_schema():
-    """Reads the schema.sql file and returns the full text."""
-    print("📥 Loading schema.sql...")
-    with open(SCHEMA_FILE, "r") as f:
-        return f.read()
-
-def split_schema_into_chunks(schema_text):
-    """
-    Splits schema.sql into chunks per table.
-    Each CREATE TABLE statement becomes one document.
-    """
-    print("🔪 Splitting schema into table chunks...")
-    chunks = []
-    statements = schema_text.split("CREATE TABLE")
-
-    for s in statements:
-        if "(" in s:
-            table_name = s.split("(")[0].strip()
-            chunk = "CREATE TABLE " + s
-            chunks.append({"table": table_name, "text": chunk})
-
-    print(f"📄 Found {len(chunks)} tables to embed.")
-    return chunks
+# Works both as `python backend/rag/embed_schema.py` and as a package import
+try:
+    from .schema_version import VECTOR_DIR, bump_schema_version
+    from .embedding_cache import cached_openai_embeddings
+    from .schema_introspection import schema_chunks
+except ImportError:
+    from schema_version import VECTOR_DIR, bump_schema_version
+    from embedding_cache import cached_openai_embeddings
+    from schema_introspection import schema_chunks
 
 def embed_schema():
     """
-    Embeds each table definition into a Chroma vector DB.
+    Incrementally sync table/view chunks into the Chroma vector DB.
+
+    Chunks are introspected from the live database and stored under stable
+    ids ("table:orders") with a content hash; only new or changed chunks are
+    embedded (in one batched call) and chunks for dropped tables are deleted.
     """
     print("🧠 Embedding schema into vector database...")
+    start_time = time.time()
 
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+    embeddings = cached_openai_embeddings("text-embedding-3-large")
 
     db = Chroma(
         collection_name="schema_embeddings",
@@ -51,29 +37,48 @@ def embed_schema():
         persist_directory=VECTOR_DIR
     )
 
-    # Clear old vectors
-    db.delete_collection()
-    db = Chroma(
-        collection_name="schema_embeddings",
-        embedding_function=embeddings,
-        persist_directory=VECTOR_DIR
-    )
+    chunks = schema_chunks()
+    print(f"📄 Found {len(chunks)} tables/views in the schema.")
 
-    schema_text = load_schema()
-    chunks = split_schema_into_chunks(schema_text)
+    existing = db.get(include=["metadatas"])
+    stored_hashes = {
+        chunk_id: (meta or {}).get("hash")
+        for chunk_id, meta in zip(existing["ids"], existing["metadatas"])
+    }
 
-    for c in chunks:
+    changed = [c for c in chunks if stored_hashes.get(c["id"]) != c["hash"]]
+    current_ids = {c["id"] for c in chunks}
+    # Also clears chunks stored under random ids by older versions of this script
+    removed = [chunk_id for chunk_id in stored_hashes if chunk_id not in current_ids]
+
+    if removed:
+        db.delete(ids=removed)
+        print(f"🗑️  Removed {len(removed)} stale chunks")
+
+    if changed:
+        # add_texts with ids upserts, so changed chunks replace their old vectors
         db.add_texts(
-            texts=[c["text"]],
-            metadatas=[{"table": c["table"]}]
+            texts=[c["text"] for c in changed],
+            metadatas=[{"table": c["table"], "type": c["type"], "hash": c["hash"]} for c in changed],
+            ids=[c["id"] for c in changed]
         )
-        print(f"✅ Embedded table: {c['table']}")
+        for c in changed:
+            print(f"✅ Embedded {c['type']}: {c['table']}")
+
+    unchanged = len(chunks) - len(changed)
+    print(
+        f"🎉 Schema synced in {time.time() - start_time:.2f}s: "
+        f"{len(changed)} embedded, {unchanged} unchanged, {len(removed)} removed"
+    )
 
-    # Note: persist() is no longer needed in newer versions of Chroma
-    # The data is automatically persisted when persist_directory is set
-    print("🎉 All schema embeddings stored successfully!")
+    # Invalidate cached question -> SQL entries built against the old schema
+    if changed or removed:
+        version = bump_schema_version()
+        print(f"🔖 Schema version: {version}")
+    else:
+        print("🔖 Schema unchanged, version kept")
 
 if __name__ == "__main__":
     print("▶ Running embed_schema.py")
     embed_schema()
-    print("▶ Done!")
\ No newline at end of file
+    print("▶ Done!")
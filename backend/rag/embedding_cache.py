@@ -0,0 +1,213 @@
+"""
+Persistent embedding cache shared by Chroma retrieval, embed_schema.py and Mem0.
+
+Vectors are stored in a small SQLite file as float32 blobs, keyed by model
+name + a hash of the (whitespace-normalized) text, so a question embedded
+once is never sent to the embeddings API again - across requests, worker
+processes and restarts. The file is bounded by EMBEDDING_CACHE_MAX_ENTRIES
+with least-recently-used eviction. A cache hit only notes its last-used
+time in memory; the times are written in one batch with the next store (so
+eviction sees them) or once EMBEDDING_CACHE_TOUCH_FLUSH_S has passed,
+instead of one UPDATE + commit per hit.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+try:
+    from .providers import embedding_cache_name, embeddings_model
+except ImportError:
+    from providers import embedding_cache_name, embeddings_model
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "backend/rag/embedding_cache.db")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+EMBEDDING_CACHE_TOUCH_FLUSH_S = float(os.getenv("EMBEDDING_CACHE_TOUCH_FLUSH_S", "30"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _cache_key(model: str, text: str) -> str:
+    normalized = _WHITESPACE.sub(" ", text.strip())
+    return hashlib.sha256(f"{model}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCacheStore:
+    """SQLite-backed store of float32 vectors."""
+
+    def __init__(
+        self,
+        path: str = EMBEDDING_CACHE_PATH,
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+        touch_flush_s: float = EMBEDDING_CACHE_TOUCH_FLUSH_S
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_flush_s = touch_flush_s
+        self._lock = threading.Lock()
+        self._writes_since_trim = 0
+        self._touched: Dict[str, float] = {}  # key -> last_used not yet written
+        self._last_flush = time.monotonic()
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.evictions = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)"
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Look up vectors for texts; missing ones come back as None."""
+        keys = [_cache_key(model, t) for t in texts]
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for key, blob in self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ):
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            if found:
+                now = time.time()
+                for key in found:
+                    self._touched[key] = now
+                if time.monotonic() - self._last_flush >= self.touch_flush_s:
+                    self._flush_touched()
+                    self._conn.commit()
+            self.hits[model] = self.hits.get(model, 0) + len(found)
+            self.misses[model] = self.misses.get(model, 0) + len(keys) - len(found)
+        return [found.get(key) for key in keys]
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """Store vectors and evict the least recently used entries if over budget."""
+        now = time.time()
+        rows = [
+            (_cache_key(model, t), model, len(v), array("f", v).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._writes_since_trim += len(rows)
+            self._flush_touched()
+            if self._writes_since_trim >= 100:
+                self._trim()
+            self._conn.commit()
+
+    def _flush_touched(self):
+        """Write batched last-used times (caller holds the lock and commits)."""
+        self._last_flush = time.monotonic()
+        if not self._touched:
+            return
+        self._conn.executemany(
+            "UPDATE embeddings SET last_used = MAX(last_used, ?) WHERE key = ?",
+            [(used, key) for key, used in self._touched.items()]
+        )
+        self._touched = {}
+
+    def _trim(self):
+        """Delete the oldest entries beyond max_entries (caller holds the lock)."""
+        self._writes_since_trim = 0
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            # Trim a little extra so eviction doesn't run on every write
+            excess += self.max_entries // 20
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            self.evictions += excess
+
+    def stats(self) -> Dict:
+        """Entry count and hit rate per model."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            hits = sum(self.hits.values())
+            lookups = hits + sum(self.misses.values())
+            return {
+                "path": self.path,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": hits,
+                "misses": lookups - hits,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "by_model": {
+                    model: {"hits": self.hits.get(model, 0), "misses": self.misses.get(model, 0)}
+                    for model in set(self.hits) | set(self.misses)
+                },
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that consults the shared cache before the API."""
+
+    def __init__(self, underlying: Embeddings, model_name: str, store: EmbeddingCacheStore):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.store = store
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.store.get_many(self.model_name, texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            computed = self.underlying.embed_documents([texts[i] for i in missing])
+            self.store.put_many(self.model_name, [texts[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.store.get_many(self.model_name, [text])[0]
+        if vector is None:
+            vector = self.underlying.embed_query(text)
+            self.store.put_many(self.model_name, [text], [vector])
+        return vector
+
+
+_store: Optional[EmbeddingCacheStore] = None
+_store_lock = threading.Lock()
+
+
+def get_embedding_store() -> EmbeddingCacheStore:
+    """Process-wide cache store (opened lazily)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EmbeddingCacheStore()
+        return _store
+
+
+def cached_openai_embeddings(model: str) -> CachedEmbeddings:
+    """OpenAIEmbeddings for `model` (stub embedder offline), wrapped with the shared cache."""
+    return CachedEmbeddings(embeddings_model(model), embedding_cache_name(model), get_embedding_store())
@@ -0,0 +1,291 @@
+"""
+Workload-driven index advisor.
+
+run_sql records every statement it executes (normalized SQL + timing). The
+advisor mines those statements for the columns they filter, join, group and
+order on, proposes indexes that no existing index already covers, and
+validates each candidate on a private copy of the database (SQLite backup
+API): the candidate is created on the copy, the affected statements are
+re-planned with EXPLAIN QUERY PLAN and timed before and after. Only
+candidates the planner actually uses and that make the workload faster are
+accepted; apply() creates those on the real database and runs ANALYZE.
+"""
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .db_pool import DB_PATH, get_pool
+from .plan_analyzer import explain_query_plan, index_statement, indexed_prefixes, referenced_columns
+from .result_cache import is_cacheable, normalize_sql
+from .sql_governor import QueryAborted, QueryGovernor
+
+INDEX_ADVISOR_MAX_STATEMENTS = int(os.getenv("INDEX_ADVISOR_MAX_STATEMENTS", "500"))
+# Benchmark runs per statement (median is reported)
+INDEX_ADVISOR_RUNS = int(os.getenv("INDEX_ADVISOR_RUNS", "3"))
+# Minimum workload speedup for a candidate to be accepted
+INDEX_ADVISOR_MIN_GAIN = float(os.getenv("INDEX_ADVISOR_MIN_GAIN", "0.1"))
+# Databases larger than this are copied to a temp file instead of memory
+INDEX_ADVISOR_MEMORY_COPY_MAX_BYTES = int(
+    os.getenv("INDEX_ADVISOR_MEMORY_COPY_MAX_BYTES", str(256 * 1024 * 1024))
+)
+
+
+class WorkloadLog:
+    """Bounded log of executed statements with call counts and timings."""
+
+    def __init__(self, max_statements: int = INDEX_ADVISOR_MAX_STATEMENTS):
+        self.max_statements = max_statements
+        self._statements: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, sql: str, execution_time_ms: float):
+        key = normalize_sql(sql)
+        if not is_cacheable(key):
+            return
+        with self._lock:
+            entry = self._statements.get(key)
+            if entry is None:
+                entry = self._statements[key] = {
+                    "sql": sql, "count": 0, "total_ms": 0.0, "max_ms": 0.0
+                }
+            self._statements.move_to_end(key)
+            entry["count"] += 1
+            entry["total_ms"] += execution_time_ms
+            entry["max_ms"] = max(entry["max_ms"], execution_time_ms)
+            entry["last_seen"] = time.time()
+            while len(self._statements) > self.max_statements:
+                self._statements.popitem(last=False)
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            return [dict(entry) for entry in self._statements.values()]
+
+    def clear(self):
+        with self._lock:
+            self._statements.clear()
+
+
+class IndexAdvisor:
+    """Proposes, benchmarks and applies indexes for the recorded workload."""
+
+    def __init__(self, db_path: str = DB_PATH, workload: Optional[WorkloadLog] = None):
+        self.db_path = db_path
+        self.workload = workload or WorkloadLog()
+        self.last_report: Optional[Dict] = None
+        self._lock = threading.Lock()
+
+    def record(self, sql: str, execution_time_ms: float):
+        self.workload.record(sql, execution_time_ms)
+
+    # ---------- candidates ----------
+
+    def candidates(self) -> List[Dict]:
+        """Index candidates ranked by the workload time they could affect."""
+        found: Dict[str, Dict] = {}
+        with get_pool(self.db_path).connection() as conn:
+            prefixes = {}
+            for entry in self.workload.snapshot():
+                try:
+                    usage = referenced_columns(entry["sql"], conn)
+                except sqlite3.Error:
+                    continue
+                for table, columns in usage.items():
+                    if table not in prefixes:
+                        prefixes[table] = indexed_prefixes(conn, table)
+                    for cols in self._column_sets(columns):
+                        if tuple(cols) in prefixes[table]:
+                            continue
+                        statement = index_statement(table, cols)
+                        candidate = found.setdefault(statement, {
+                            "table": table,
+                            "columns": cols,
+                            "index_sql": statement,
+                            "statements": [],
+                            "weight_ms": 0.0,
+                        })
+                        candidate["statements"].append(entry["sql"])
+                        candidate["weight_ms"] += entry["total_ms"]
+        ranked = sorted(found.values(), key=lambda c: c["weight_ms"], reverse=True)
+        for candidate in ranked:
+            candidate["weight_ms"] = round(candidate["weight_ms"], 2)
+        return ranked
+
+    @staticmethod
+    def _column_sets(columns: Dict[str, List[str]]) -> List[List[str]]:
+        """Single-column join/filter keys plus filter+sort composites."""
+        filters = columns.get("filter", [])
+        sets = [[c] for c in columns.get("join", [])] + [[c] for c in filters]
+        if len(filters) > 1:
+            sets.append(filters[:2])
+        for kind in ("order", "group"):
+            sort = [c for c in columns.get(kind, []) if c not in filters]
+            if sort:
+                sets.append((filters[:1] + sort)[:3])
+        unique = []
+        for cols in sets:
+            if cols not in unique:
+                unique.append(cols)
+        return unique
+
+    # ---------- validation on a copy ----------
+
+    def _copy_database(self) -> Tuple[sqlite3.Connection, Optional[str]]:
+        """Private writable copy of the database via the backup API (+ temp file path)."""
+        try:
+            size = os.path.getsize(self.db_path)
+        except OSError:
+            size = 0
+        if size > INDEX_ADVISOR_MEMORY_COPY_MAX_BYTES:
+            handle, target = tempfile.mkstemp(suffix=".db", prefix="index_advisor_")
+            os.close(handle)
+        else:
+            target = ":memory:"
+        copy = sqlite3.connect(target, check_same_thread=False)
+        with get_pool(self.db_path).dedicated() as source:
+            source.backup(copy)
+        copy.execute("ANALYZE")
+        return copy, (None if target == ":memory:" else target)
+
+    @staticmethod
+    def _time_statement(conn: sqlite3.Connection, sql: str, runs: int) -> Optional[float]:
+        """Median wall time in ms over `runs` governed executions, None if aborted."""
+        timings = []
+        for _ in range(runs):
+            governor = QueryGovernor()
+            start = time.perf_counter()
+            try:
+                with governor.attach(conn):
+                    cursor = conn.execute(sql)
+                    while cursor.fetchmany(1024):
+                        pass
+                    cursor.close()
+            except (QueryAborted, sqlite3.Error):
+                return None
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def evaluate(self, max_candidates: int = 5, runs: int = INDEX_ADVISOR_RUNS) -> Dict:
+        """
+        Benchmark the top candidates one at a time on a database copy.
+        Returns (and keeps as last_report) {"candidates": [...], "accepted": [...]}.
+        """
+        with self._lock:
+            start = time.perf_counter()
+            candidates = self.candidates()[:max_candidates]
+            copy, temp_path = self._copy_database()
+            try:
+                baseline = {}
+                for candidate in candidates:
+                    for sql in candidate["statements"]:
+                        if sql not in baseline:
+                            baseline[sql] = {
+                                "plan": [s["detail"] for s in explain_query_plan(copy, sql)],
+                                "ms": self._time_statement(copy, sql, runs),
+                            }
+
+                for candidate in candidates:
+                    self._evaluate_candidate(copy, candidate, baseline, runs)
+                # An accepted index that leads a wider accepted index is redundant
+                for candidate in candidates:
+                    cols = candidate["columns"]
+                    if candidate["accepted"] and any(
+                        other["accepted"] and other["table"] == candidate["table"]
+                        and len(other["columns"]) > len(cols) and other["columns"][:len(cols)] == cols
+                        for other in candidates
+                    ):
+                        candidate["accepted"] = False
+                        candidate["redundant"] = True
+            finally:
+                copy.close()
+                if temp_path:
+                    os.unlink(temp_path)
+
+            report = {
+                "evaluated_at": time.time(),
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+                "candidates": candidates,
+                "accepted": [c["index_sql"] for c in candidates if c["accepted"]],
+            }
+            self.last_report = report
+            return report
+
+    def _evaluate_candidate(self, copy: sqlite3.Connection, candidate: Dict, baseline: Dict, runs: int):
+        index_name = candidate["index_sql"].split()[2]
+        copy.execute(candidate["index_sql"])
+        copy.execute(f"ANALYZE {index_name}")
+        try:
+            before_total = after_total = 0.0
+            used = False
+            results = []
+            for sql in candidate["statements"]:
+                plan = [s["detail"] for s in explain_query_plan(copy, sql)]
+                uses_index = any(index_name in step for step in plan)
+                after_ms = self._time_statement(copy, sql, runs)
+                before_ms = baseline[sql]["ms"]
+                used = used or uses_index
+                if before_ms is not None and after_ms is not None:
+                    before_total += before_ms
+                    after_total += after_ms
+                results.append({
+                    "sql": sql,
+                    "plan_before": baseline[sql]["plan"],
+                    "plan_after": plan,
+                    "uses_index": uses_index,
+                    "before_ms": None if before_ms is None else round(before_ms, 3),
+                    "after_ms": None if after_ms is None else round(after_ms, 3),
+                })
+        finally:
+            copy.execute(f"DROP INDEX {index_name}")
+
+        gain = (before_total - after_total) / before_total if before_total else 0.0
+        candidate["benchmarks"] = results
+        candidate["before_ms"] = round(before_total, 3)
+        candidate["after_ms"] = round(after_total, 3)
+        candidate["gain"] = round(gain, 4)
+        candidate["accepted"] = used and gain >= INDEX_ADVISOR_MIN_GAIN
+
+    # ---------- apply ----------
+
+    def apply(self, index_sqls: Optional[List[str]] = None) -> Dict:
+        """
+        Create accepted indexes from the last evaluation on the real database,
+        then ANALYZE. Only statements from that report can be applied.
+        """
+        with self._lock:
+            if self.last_report is None:
+                raise ValueError("No evaluation report; run evaluate() first")
+            accepted = self.last_report["accepted"]
+            selected = accepted if index_sqls is None else [s for s in index_sqls if s in accepted]
+            rejected = [] if index_sqls is None else [s for s in index_sqls if s not in accepted]
+
+            start = time.perf_counter()
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=rw", uri=True, timeout=30)
+            try:
+                for statement in selected:
+                    conn.execute(statement.replace("CREATE INDEX", "CREATE INDEX IF NOT EXISTS", 1))
+                conn.execute("ANALYZE")
+                conn.commit()
+            finally:
+                conn.close()
+
+            # Pooled connections re-plan against the new schema on next use
+            return {
+                "applied": selected,
+                "rejected": rejected,
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+            }
+
+    def stats(self) -> Dict:
+        statements = self.workload.snapshot()
+        return {
+            "statements": len(statements),
+            "executions": sum(s["count"] for s in statements),
+            "max_statements": self.workload.max_statements,
+            "last_evaluated_at": self.last_report["evaluated_at"] if self.last_report else None,
+            "accepted": self.last_report["accepted"] if self.last_report else [],
+        }
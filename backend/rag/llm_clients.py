@@ -0,0 +1,98 @@
+"""
+Bounded registry of ChatOpenAI clients.
+
+Building a ChatOpenAI per call gives every call its own HTTP connection
+pool (and TLS handshake). The registry hands out one client per
+(API key, model, temperature) so keep-alive connections are reused across
+requests. Keys are stored as salted HMAC digests, never in plain text.
+Clients come from providers.chat_model, so SQL_BUDDY_PROVIDERS=stub hands
+out the offline FakeChatModel instead.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from langchain_openai import ChatOpenAI
+
+from .providers import chat_model
+
+LLM_CLIENT_CACHE_SIZE = int(os.getenv("LLM_CLIENT_CACHE_SIZE", "32"))
+
+# Per-process salt so digests cannot be matched against known keys offline
+_KEY_SALT = secrets.token_bytes(16)
+
+
+def _client_key(api_key: Optional[str], model_name: str, temperature: float) -> str:
+    material = f"{api_key or ''}\0{model_name}\0{temperature}".encode("utf-8")
+    return hmac.new(_KEY_SALT, material, hashlib.sha256).hexdigest()
+
+
+def _pool_connections(api_client) -> int:
+    """Best-effort count of open connections in an OpenAI SDK client's httpx pool."""
+    try:
+        return len(api_client._client._transport._pool.connections)
+    except AttributeError:
+        return 0
+
+
+class LLMClientRegistry:
+    """LRU cache of chat model clients keyed by a hash of API key + model."""
+
+    def __init__(self, max_clients: int = LLM_CLIENT_CACHE_SIZE):
+        self.max_clients = max_clients
+        self._clients: "OrderedDict[str, ChatOpenAI]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(
+        self,
+        api_key: Optional[str] = None,
+        model_name: str = "gpt-4",
+        temperature: float = 0
+    ) -> ChatOpenAI:
+        """Return a shared client; api_key=None uses OPENAI_API_KEY."""
+        key = _client_key(api_key, model_name, temperature)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                self.hits += 1
+                return client
+
+            self.misses += 1
+            client = chat_model(model_name, temperature, api_key)
+            self._clients[key] = client
+
+            while len(self._clients) > self.max_clients:
+                # Not closed here: requests that already got the client may
+                # still be using it. Dropping the reference lets the OpenAI
+                # SDK close its sync and async pools when it is collected.
+                self._clients.popitem(last=False)
+                self.evictions += 1
+            return client
+
+    def stats(self) -> Dict:
+        """Cache counters and open HTTP connections across cached clients."""
+        with self._lock:
+            clients = list(self._clients.values())
+            lookups = self.hits + self.misses
+            stats = {
+                "clients": len(clients),
+                "max_clients": self.max_clients,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+        stats["open_connections"] = sum(
+            _pool_connections(getattr(c, "root_client", None))
+            + _pool_connections(getattr(c, "root_async_client", None))
+            for c in clients
+        )
+        return stats
@@ -0,0 +1,208 @@
+"""
+Offline load generator for the RAG API.
+
+Runs the FastAPI app in-process (httpx ASGI transport) with the stub
+providers from stubs.py, a throwaway SQLite copy of schema.sql and a fresh
+vector store, then fires requests at a fixed arrival rate (open loop, so a
+slow server cannot slow the generator down) and reports throughput and
+p50/p95/p99 latency. No OpenAI, Redis or Mem0 needed.
+
+    python -m backend.rag.loadtest --qps 20 --duration 30
+    python -m backend.rag.loadtest --endpoint /rag/query/stream --json
+
+Stub latencies are tuned with STUB_LLM_LATENCY_MS / STUB_LLM_JITTER_MS /
+STUB_MEM0_LATENCY_MS; any SQL_BUDDY_* variable already set is respected.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+DEFAULT_QUESTIONS = [
+    "Show me the first customers",
+    "What are the most expensive products?",
+    "Monthly revenue",
+    "List the latest orders with customer names",
+    "How many orders do we have?",
+]
+
+
+def prepare_environment(workdir: str):
+    """Point every provider and data path at offline, throwaway resources."""
+    os.environ.setdefault("SQL_BUDDY_PROVIDERS", "stub")
+    os.environ.setdefault("SQL_BUDDY_VECTOR_DIR", os.path.join(workdir, "vectorstore"))
+    os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(workdir, "embedding_cache.db"))
+    os.environ.setdefault("MEMSTATS_RECONCILE_S", "86400")
+    if "SQL_BUDDY_DB_PATH" not in os.environ:
+        db_path = os.path.join(workdir, "retail.db")
+        with open("backend/db/schema.sql") as f:
+            schema = f.read()
+        conn = sqlite3.connect(db_path)
+        conn.executescript(schema)
+        conn.close()
+        os.environ["SQL_BUDDY_DB_PATH"] = db_path
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], errors: int, sent: int, elapsed_s: float) -> Dict:
+    ordered = sorted(latencies)
+    return {
+        "sent": sent,
+        "ok": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed_s, 2),
+        "throughput_rps": round(len(latencies) / elapsed_s, 2) if elapsed_s else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(ordered, 50), 2),
+            "p95": round(percentile(ordered, 95), 2),
+            "p99": round(percentile(ordered, 99), 2),
+            "max": round(ordered[-1], 2) if ordered else 0.0,
+            "mean": round(statistics.fmean(ordered), 2) if ordered else 0.0,
+        },
+    }
+
+
+def final_response(response) -> Optional[Dict]:
+    """
+    The QueryResponse body: the JSON of /rag/query, or the "done" event of a
+    stream. None if the stream ended with an "error" event or no "done".
+    """
+    if not response.headers.get("content-type", "").startswith("text/event-stream"):
+        return response.json()
+    body = None
+    for block in response.text.split("\n\n"):
+        lines = block.strip().splitlines()
+        event = next((l[len("event: "):] for l in lines if l.startswith("event: ")), None)
+        data = next((l[len("data: "):] for l in lines if l.startswith("data: ")), None)
+        if event == "error":
+            return None
+        if event == "done" and data is not None:
+            body = json.loads(data)
+    return body
+
+
+def is_success(response) -> bool:
+    """/rag/query reports SQL generation and execution errors with status 200."""
+    if response.status_code != 200:
+        return False
+    body = final_response(response)
+    if not body or body.get("sql") == "Error":
+        return False
+    results = body.get("results") or []
+    return not (results and isinstance(results[0], dict) and "error" in results[0])
+
+
+async def run_load(app, args) -> Dict:
+    import httpx
+
+    questions = itertools.cycle(args.questions)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    errors = 0
+    sent = 0
+
+    async def one_request(client, n: int, record: bool):
+        nonlocal errors
+        question = next(questions)
+        if args.unique:
+            question = f"{question} #{n}"  # defeat the SQL/result caches
+        payload = {
+            "question": question,
+            "session_id": f"load-{n % args.sessions}",
+            "user_id": f"load-user-{n % args.sessions}",
+        }
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post(args.endpoint, json=payload)
+                await response.aread()
+                ok = is_success(response)
+            except Exception as e:
+                print(f"Warning: request {n} failed - {e}")
+                ok = False
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        if not record:
+            return
+        if ok:
+            latencies.append(elapsed_ms)
+        else:
+            errors += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=120) as client:
+        for n in range(args.warmup):
+            await one_request(client, -1 - n, record=False)
+
+        interval = 1.0 / args.qps
+        pending = []
+        started = time.perf_counter()
+        deadline = started + args.duration
+        next_send = started
+        while next_send < deadline:
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            pending.append(asyncio.create_task(one_request(client, sent, record=True)))
+            sent += 1
+            next_send += interval
+        await asyncio.gather(*pending)
+        elapsed = time.perf_counter() - started
+
+    return summarize(latencies, errors, sent, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for /rag/query")
+    parser.add_argument("--qps", type=float, default=10.0, help="target arrival rate")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    parser.add_argument("--concurrency", type=int, default=64, help="max requests in flight")
+    parser.add_argument("--endpoint", default="/rag/query")
+    parser.add_argument("--sessions", type=int, default=16, help="distinct session/user ids")
+    parser.add_argument("--warmup", type=int, default=5, help="unrecorded requests first")
+    parser.add_argument("--unique", action="store_true", help="make every question unique")
+    parser.add_argument("--questions", nargs="+", default=DEFAULT_QUESTIONS)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="sql-buddy-load-") as workdir:
+        prepare_environment(workdir)
+
+        # Imported only now so every module reads the offline settings
+        from backend.rag.embed_schema import embed_schema
+        embed_schema()
+        from backend.main import app
+
+        report = asyncio.run(run_load(app, args))
+        report.update({"target_qps": args.qps, "endpoint": args.endpoint})
+
+        from backend.rag.router import hybrid_memory
+        if hybrid_memory is not None:
+            hybrid_memory.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    latency = report["latency_ms"]
+    print(f"\n{report['endpoint']} @ {args.qps:g} qps for {args.duration:g}s")
+    print(f"  sent {report['sent']}, ok {report['ok']}, errors {report['errors']}")
+    print(f"  throughput {report['throughput_rps']} req/s")
+    print(
+        f"  latency ms  p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  "
+        f"max {latency['max']}  mean {latency['mean']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
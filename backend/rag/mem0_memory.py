@@ -4,6 +4,7 @@ Memory management using Mem0 for intelligent conversation memory.
 from mem0 import Memory
 from typing import List, Dict, Optional
 import os
+from .embedding_cache import cached_openai_embeddings
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -30,9 +31,11 @@ class Mem0MemoryManager:
                 }
             },
             "embedder": {
-                "provider": "openai",
+                # OpenAI text-embedding-3-small behind the shared embedding cache
+                "provider": "langchain",
                 "config": {
-                    "model": "text-embedding-3-small"
+                    "model": cached_openai_embeddings("text-embedding-3-small"),
+                    "embedding_dims": 1536
                 }
             },
             "vector_store": {
@@ -0,0 +1,198 @@
+"""
+O(1) per-user long-term memory statistics.
+
+Keeps a Redis hash memstats:{user_id} with
+    count       number of Mem0 memories
+    bytes       approximate size of their text
+    last_write  unix time of the last write
+updated from the events mem0.add reports (ADD / UPDATE / DELETE) in the
+same pipeline round-trip, and reset on delete_all. The stats endpoint then
+costs one HGETALL instead of a full mem0.get_all scroll.
+
+Because the counters are derived from events they can drift (writes from
+other tools, partial failures), so a background reconciler recounts users
+from mem0.get_all: users without a hash on first lookup, and every known
+user every MEMSTATS_RECONCILE_S seconds. get_all returns at most
+MEMSTATS_RECONCILE_LIMIT memories (Mem0 has no paging); a recount that hits
+the limit may be truncated, so it never lowers an existing counter.
+"""
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+MEMSTATS_RECONCILE_S = float(os.getenv("MEMSTATS_RECONCILE_S", "3600"))
+MEMSTATS_RECONCILE_LIMIT = int(os.getenv("MEMSTATS_RECONCILE_LIMIT", "100000"))
+
+_PREFIX = "memstats:"
+
+
+def memory_items(memories) -> List[Dict]:
+    """Normalize mem0 get_all/add output (list or {"results": [...]}) to a list."""
+    if isinstance(memories, dict):
+        memories = memories.get("results", [])
+    return list(memories or [])
+
+
+def _text(item) -> str:
+    if isinstance(item, dict):
+        return item.get("memory") or item.get("text") or ""
+    return str(item)
+
+
+def _decode(raw: Dict) -> Optional[Dict]:
+    if not raw:
+        return None
+    values = {
+        (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+        for k, v in raw.items()
+    }
+    return {
+        "total_memories": max(0, int(values.get("count", 0))),
+        "approx_bytes": max(0, int(values.get("bytes", 0))),
+        "last_write": float(values["last_write"]) if values.get("last_write") else None,
+        "reconciled_at": float(values["reconciled_at"]) if values.get("reconciled_at") else None,
+    }
+
+
+class MemoryStatsIndex:
+    """Per-user counters in Redis, kept in step with Mem0 writes."""
+
+    def __init__(self, client, async_client=None):
+        self.client = client
+        self.async_client = async_client
+        self._pending: "queue.Queue[str]" = queue.Queue()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._fetch_all: Optional[Callable[[str, int], object]] = None
+        self._fetch_limit = MEMSTATS_RECONCILE_LIMIT
+        self.reconciliations = 0
+
+    @staticmethod
+    def key(user_id: str) -> str:
+        return f"{_PREFIX}{user_id}"
+
+    # ---------- maintenance on write/delete ----------
+
+    def record_events(self, user_id: str, add_result):
+        """Apply the ADD/UPDATE/DELETE events returned by mem0.add."""
+        count = size = 0
+        for event in memory_items(add_result):
+            kind = (event.get("event") or "ADD").upper() if isinstance(event, dict) else "ADD"
+            text = _text(event)
+            if kind == "ADD":
+                count += 1
+                size += len(text.encode("utf-8"))
+            elif kind == "DELETE":
+                count -= 1
+                size -= len(text.encode("utf-8"))
+            elif kind == "UPDATE":
+                previous = event.get("previous_memory") or ""
+                size += len(text.encode("utf-8")) - len(previous.encode("utf-8"))
+        pipe = self.client.pipeline(transaction=True)
+        if count:
+            pipe.hincrby(self.key(user_id), "count", count)
+        if size:
+            pipe.hincrby(self.key(user_id), "bytes", size)
+        pipe.hset(self.key(user_id), "last_write", time.time())
+        pipe.execute()
+
+    def reset(self, user_id: str):
+        """All memories for the user were deleted."""
+        self.client.hset(self.key(user_id), mapping={
+            "count": 0, "bytes": 0, "last_write": time.time(), "reconciled_at": time.time()
+        })
+
+    # ---------- lookups (one round-trip) ----------
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        stats = _decode(self.client.hgetall(self.key(user_id)))
+        if stats is None or stats["reconciled_at"] is None:
+            self.request_reconcile(user_id)
+        return stats
+
+    async def aget(self, user_id: str) -> Optional[Dict]:
+        stats = _decode(await self.async_client.hgetall(self.key(user_id)))
+        if stats is None or stats["reconciled_at"] is None:
+            self.request_reconcile(user_id)
+        return stats
+
+    # ---------- reconciliation ----------
+
+    def start_reconciler(
+        self,
+        fetch_all: Callable[[str, int], object],
+        interval_s: float = MEMSTATS_RECONCILE_S,
+        limit: int = MEMSTATS_RECONCILE_LIMIT
+    ):
+        """
+        Start the background thread that recounts users from Mem0.
+        fetch_all(user_id, limit) returns up to `limit` memories.
+        """
+        self._fetch_all = fetch_all
+        self._fetch_limit = limit
+        threading.Thread(
+            target=self._reconcile_loop, args=(interval_s,), name="memstats-reconciler", daemon=True
+        ).start()
+
+    def request_reconcile(self, user_id: str):
+        with self._lock:
+            if user_id in self._queued:
+                return
+            self._queued.add(user_id)
+        self._pending.put(user_id)
+
+    def reconcile(self, user_id: str):
+        """
+        Recount one user from mem0.get_all and overwrite the counters. A
+        result at the fetch limit may be truncated: it can raise the counters
+        but never lower them.
+        """
+        items = memory_items(self._fetch_all(user_id, self._fetch_limit))
+        size = sum(len(_text(item).encode("utf-8")) for item in items)
+        current = _decode(self.client.hgetall(self.key(user_id))) or {}
+        count = len(items)
+        if count >= self._fetch_limit and current:
+            print(f"Warning: {user_id} has at least {count} memories, recount may be truncated")
+            count = max(count, current["total_memories"])
+            size = max(size, current["approx_bytes"])
+        now = time.time()
+        self.client.hset(self.key(user_id), mapping={
+            "count": count,
+            "bytes": size,
+            "last_write": current.get("last_write") or now,
+            "reconciled_at": now,
+        })
+        self.reconciliations += 1
+
+    def _known_users(self) -> List[str]:
+        users = []
+        for key in self.client.scan_iter(match=f"{_PREFIX}*", count=500):
+            key = key.decode() if isinstance(key, bytes) else key
+            users.append(key[len(_PREFIX):])
+        return users
+
+    def _reconcile_loop(self, interval_s: float):
+        next_sweep = time.monotonic() + interval_s
+        while True:
+            try:
+                user_id = self._pending.get(timeout=max(0.1, next_sweep - time.monotonic()))
+            except queue.Empty:
+                user_id = None
+
+            if user_id is not None:
+                with self._lock:
+                    self._queued.discard(user_id)
+                try:
+                    self.reconcile(user_id)
+                except Exception as e:
+                    print(f"Warning: memory stats reconcile failed for {user_id} - {e}")
+
+            if time.monotonic() >= next_sweep:
+                next_sweep = time.monotonic() + interval_s
+                try:
+                    for known in self._known_users():
+                        self.request_reconcile(known)
+                except Exception as e:
+                    print(f"Warning: memory stats sweep failed - {e}")
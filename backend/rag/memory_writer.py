@@ -0,0 +1,226 @@
+"""
+Write-behind queue for long-term (Mem0) memory writes.
+
+mem0.add runs its own extraction LLM call plus embedding and Qdrant writes,
+so doing it inline makes every /rag/query response wait on a second LLM
+pipeline. Instead, store_interaction puts the interaction on a bounded
+in-process queue and returns; background workers drain it, group queued
+interactions by user into one write_batch call per user, and retry failed
+writes with exponential backoff.
+
+write_batch(user_id, items) removes each item from `items` once it is
+stored. When it raises part way, only the items still in the list are
+retried, and only those are counted as failed if they never get through.
+
+When the queue is full, MEMORY_QUEUE_POLICY decides what happens:
+- drop_oldest: discard the oldest queued interaction (default)
+- drop_newest: discard the new interaction
+- block:       wait up to MEMORY_QUEUE_BLOCK_S for room (backpressure),
+               then discard the new interaction
+"""
+import os
+import queue
+import random
+import threading
+import time
+from typing import Callable, Dict, List
+
+MEMORY_QUEUE_MAX = int(os.getenv("MEMORY_QUEUE_MAX", "1000"))
+MEMORY_QUEUE_WORKERS = int(os.getenv("MEMORY_QUEUE_WORKERS", "2"))
+MEMORY_QUEUE_BATCH_SIZE = int(os.getenv("MEMORY_QUEUE_BATCH_SIZE", "8"))
+# How long a worker waits for more items to fill a batch
+MEMORY_QUEUE_BATCH_WAIT_S = float(os.getenv("MEMORY_QUEUE_BATCH_WAIT_S", "0.5"))
+MEMORY_QUEUE_MAX_RETRIES = int(os.getenv("MEMORY_QUEUE_MAX_RETRIES", "3"))
+MEMORY_QUEUE_POLICY = os.getenv("MEMORY_QUEUE_POLICY", "drop_oldest")
+MEMORY_QUEUE_BLOCK_S = float(os.getenv("MEMORY_QUEUE_BLOCK_S", "1.0"))
+# Time allowed at shutdown for queued writes to drain
+MEMORY_QUEUE_FLUSH_S = float(os.getenv("MEMORY_QUEUE_FLUSH_S", "5"))
+
+RETRY_BASE_S = 0.5
+
+
+class MemoryWriteBehind:
+    """Bounded queue + worker threads calling write_batch(user_id, items)."""
+
+    def __init__(
+        self,
+        write_batch: Callable[[str, List[Dict]], None],
+        max_queue: int = MEMORY_QUEUE_MAX,
+        workers: int = MEMORY_QUEUE_WORKERS,
+        batch_size: int = MEMORY_QUEUE_BATCH_SIZE,
+        batch_wait_s: float = MEMORY_QUEUE_BATCH_WAIT_S,
+        max_retries: int = MEMORY_QUEUE_MAX_RETRIES,
+        policy: str = MEMORY_QUEUE_POLICY
+    ):
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.batch_wait_s = batch_wait_s
+        self.max_retries = max_retries
+        self.policy = policy
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self.retries = 0
+        self.batches = 0
+        self.in_flight = 0
+        self.lag_last_ms = 0.0
+        self.lag_max_ms = 0.0
+        self._lag_total_ms = 0.0
+
+        self._workers = [
+            threading.Thread(target=self._run, name=f"memory-writer-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    # ---------- producer side ----------
+
+    def submit(self, user_id: str, item: Dict) -> bool:
+        """Queue one interaction; returns False if it was dropped."""
+        job = {"user_id": user_id, "item": item, "enqueued_at": time.monotonic()}
+        try:
+            if self.policy == "block":
+                self._queue.put(job, timeout=MEMORY_QUEUE_BLOCK_S)
+            else:
+                self._queue.put_nowait(job)
+        except queue.Full:
+            if self.policy != "drop_oldest":
+                self._count("dropped")
+                print(f"⚠️  Memory write queue full, dropped write for {user_id}")
+                return False
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self._count("dropped")
+                print("⚠️  Memory write queue full, dropped oldest write")
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self._count("dropped")
+                return False
+        self._count("enqueued")
+        return True
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    # ---------- worker side ----------
+
+    def _take_batch(self) -> List[Dict]:
+        """Block for one job, then collect more until batch_size or batch_wait_s."""
+        try:
+            jobs = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_wait_s
+        while len(jobs) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                jobs.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return jobs
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            jobs = self._take_batch()
+            if not jobs:
+                continue
+            with self._lock:
+                self.in_flight += len(jobs)
+            by_user: Dict[str, List[Dict]] = {}
+            for job in jobs:
+                by_user.setdefault(job["user_id"], []).append(job)
+            try:
+                for user_id, user_jobs in by_user.items():
+                    self._write_with_retry(user_id, user_jobs)
+            finally:
+                with self._lock:
+                    self.in_flight -= len(jobs)
+                for _ in jobs:
+                    self._queue.task_done()
+
+    def _write_with_retry(self, user_id: str, jobs: List[Dict]):
+        pending = jobs
+        for attempt in range(self.max_retries + 1):
+            items = [job["item"] for job in pending]
+            try:
+                self.write_batch(user_id, items)
+                self._record_written(pending)
+                return
+            except Exception as e:
+                # Items write_batch removed from the list were stored
+                unstored = {id(item) for item in items}
+                self._record_written([job for job in pending if id(job["item"]) not in unstored])
+                pending = [job for job in pending if id(job["item"]) in unstored]
+                if not pending:
+                    return
+                if attempt == self.max_retries or self._stopping.is_set():
+                    self._count("failed", len(pending))
+                    print(f"Error writing {len(pending)} memories for {user_id}: {e}")
+                    return
+                self._count("retries")
+                time.sleep(RETRY_BASE_S * (2 ** attempt) * (0.5 + random.random()))
+
+    def _record_written(self, jobs: List[Dict]):
+        if not jobs:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self.written += len(jobs)
+            self.batches += 1
+            for job in jobs:
+                lag_ms = (now - job["enqueued_at"]) * 1000
+                self.lag_last_ms = lag_ms
+                self.lag_max_ms = max(self.lag_max_ms, lag_ms)
+                self._lag_total_ms += lag_ms
+
+    # ---------- management ----------
+
+    def flush(self, timeout: float = MEMORY_QUEUE_FLUSH_S) -> bool:
+        """Wait until everything queued so far is written (or timeout)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout: float = MEMORY_QUEUE_FLUSH_S):
+        """Drain what can be drained within timeout, then stop the workers."""
+        drained = self.flush(timeout)
+        self._stopping.set()
+        if not drained:
+            print(f"⚠️  {self._queue.qsize()} memory writes not flushed at shutdown")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            completed = self.written
+            return {
+                "depth": self._queue.qsize(),
+                "max_depth": self._queue.maxsize,
+                "in_flight": self.in_flight,
+                "policy": self.policy,
+                "workers": len(self._workers),
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "retries": self.retries,
+                "batches": self.batches,
+                "lag_ms": {
+                    "last": round(self.lag_last_ms, 1),
+                    "avg": round(self._lag_total_ms / completed, 1) if completed else 0.0,
+                    "max": round(self.lag_max_ms, 1),
+                },
+            }
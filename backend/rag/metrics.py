@@ -0,0 +1,222 @@
+"""
+Per-stage latency histograms and LLM token counters.
+
+Every pipeline stage (context lookups, SQL generation, execution, the three
+analysis calls, memory reads/writes) is timed with stage_timer(), which
+feeds a process-wide histogram and, when given one, the RequestTrace of the
+current request. LLM calls pass llm_config(stage, trace) so a callback
+counts the prompt/completion tokens the provider reports.
+
+MetricsRegistry.render() produces the Prometheus text exposition format
+served at GET /metrics; RequestTrace.summary() is the optional per-request
+`timings` field of QueryResponse.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# Default for QueryRequest.include_timings
+RESPONSE_TIMINGS = os.getenv("RESPONSE_TIMINGS", "false").lower() == "true"
+
+STAGE_BUCKETS_S = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_PREFIX = "sql_buddy"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels: str) -> str:
+    return ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics)."""
+
+    def __init__(self, buckets: Tuple[float, ...] = STAGE_BUCKETS_S):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Process-wide stage histograms, token counters and request counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Histogram] = {}
+        self._tokens: Dict[Tuple[str, str, str], int] = {}
+        self._llm_calls: Dict[Tuple[str, str], int] = {}
+        self._requests: Dict[Tuple[str, str], int] = {}
+
+    def observe_stage(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def add_tokens(self, model: str, stage: str, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            for kind, count in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+                key = (model, stage, kind)
+                self._tokens[key] = self._tokens.get(key, 0) + count
+            self._llm_calls[(model, stage)] = self._llm_calls.get((model, stage), 0) + 1
+
+    def count_request(self, endpoint: str, outcome: str):
+        with self._lock:
+            key = (endpoint, outcome)
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            lines.append(f"# HELP {_PREFIX}_stage_seconds Latency of each query pipeline stage.")
+            lines.append(f"# TYPE {_PREFIX}_stage_seconds histogram")
+            for stage, histogram in sorted(self._stages.items()):
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(
+                        f"{_PREFIX}_stage_seconds_bucket{{{_labels(stage=stage, le=f'{bound:g}')}}} {count}"
+                    )
+                lines.append(
+                    f"{_PREFIX}_stage_seconds_bucket{{{_labels(stage=stage, le='+Inf')}}} {histogram.count}"
+                )
+                lines.append(f"{_PREFIX}_stage_seconds_sum{{{_labels(stage=stage)}}} {histogram.sum:.6f}")
+                lines.append(f"{_PREFIX}_stage_seconds_count{{{_labels(stage=stage)}}} {histogram.count}")
+
+            lines.append(f"# HELP {_PREFIX}_llm_tokens_total Tokens reported by the LLM provider.")
+            lines.append(f"# TYPE {_PREFIX}_llm_tokens_total counter")
+            for (model, stage, kind), count in sorted(self._tokens.items()):
+                lines.append(
+                    f"{_PREFIX}_llm_tokens_total{{{_labels(model=model, stage=stage, kind=kind)}}} {count}"
+                )
+
+            lines.append(f"# HELP {_PREFIX}_llm_calls_total LLM calls per model and stage.")
+            lines.append(f"# TYPE {_PREFIX}_llm_calls_total counter")
+            for (model, stage), count in sorted(self._llm_calls.items()):
+                lines.append(f"{_PREFIX}_llm_calls_total{{{_labels(model=model, stage=stage)}}} {count}")
+
+            lines.append(f"# HELP {_PREFIX}_requests_total Query requests by endpoint and outcome.")
+            lines.append(f"# TYPE {_PREFIX}_requests_total counter")
+            for (endpoint, outcome), count in sorted(self._requests.items()):
+                lines.append(
+                    f"{_PREFIX}_requests_total{{{_labels(endpoint=endpoint, outcome=outcome)}}} {count}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+class RequestTrace:
+    """Stage timings and token counts for one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages_ms: Dict[str, float] = {}
+        self.tokens: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages_ms[stage] = round(self.stages_ms.get(stage, 0.0) + seconds * 1000, 2)
+
+    def add_tokens(self, stage: str, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            counts = self.tokens.setdefault(stage, {"calls": 0, "prompt": 0, "completion": 0})
+            counts["calls"] += 1
+            counts["prompt"] += prompt_tokens
+            counts["completion"] += completion_tokens
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+                "stages_ms": dict(self.stages_ms),
+                "tokens": {stage: dict(counts) for stage, counts in self.tokens.items()},
+            }
+
+
+@contextmanager
+def stage_timer(stage: str, trace: Optional[RequestTrace] = None) -> Iterator[None]:
+    """Time a block into the stage histogram (and the request trace, if any)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.observe_stage(stage, elapsed)
+        if trace is not None:
+            trace.record(stage, elapsed)
+
+
+def record_gather_timings(
+    timings: Dict[str, Dict[str, Any]],
+    trace: Optional[RequestTrace] = None,
+    prefix: str = ""
+):
+    """Feed DeadlineGather timings ({"ms", "status"}) into the histograms."""
+    for name, timing in timings.items():
+        if timing.get("ms") is None:
+            continue  # abandoned, never waited for
+        seconds = timing["ms"] / 1000
+        metrics.observe_stage(prefix + name, seconds)
+        if trace is not None:
+            trace.record(prefix + name, seconds)
+
+
+def finish_trace(trace: RequestTrace, endpoint: str, outcome: str, include: bool) -> Optional[Dict[str, Any]]:
+    """Close a request: count it, observe its total time, return its summary if wanted."""
+    summary = trace.summary()
+    metrics.observe_stage("total", summary["total_ms"] / 1000)
+    metrics.count_request(endpoint, outcome)
+    return summary if include else None
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """Counts the token usage an LLM call reports, per stage."""
+
+    def __init__(self, stage: str, trace: Optional[RequestTrace] = None):
+        self.stage = stage
+        self.trace = trace
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any):
+        prompt_tokens = completion_tokens = 0
+        model = (response.llm_output or {}).get("model_name") or "unknown"
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+                if message is not None and model == "unknown":
+                    model = message.response_metadata.get("model_name") or model
+        if not (prompt_tokens or completion_tokens):
+            # Older providers only report usage in llm_output
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+        metrics.add_tokens(model, self.stage, prompt_tokens, completion_tokens)
+        if self.trace is not None:
+            self.trace.add_tokens(self.stage, prompt_tokens, completion_tokens)
+
+
+def llm_config(stage: str, trace: Optional[RequestTrace] = None) -> Dict[str, Any]:
+    """RunnableConfig for an LLM call that reports its tokens under `stage`."""
+    return {"callbacks": [TokenUsageHandler(stage, trace)], "run_name": stage}
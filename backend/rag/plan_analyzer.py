@@ -0,0 +1,290 @@
+"""
+Deterministic query-plan analyzer used for the `optimization` field.
+
+Runs EXPLAIN QUERY PLAN on the generated SQL and turns what SQLite reports
+into concrete advice in a few milliseconds:
+- full-table SCANs of filtered tables, or of inner join tables searched by
+  their join keys -> index suggestion (the outermost table of a join is
+  read in full anyway, so its join keys are never suggested)
+- AUTOMATIC (transient) indexes -> make them permanent
+- USE TEMP B-TREE FOR ORDER BY / GROUP BY / DISTINCT -> index on those
+  columns, when they belong to the outermost table
+- CORRELATED subqueries -> rewrite as a JOIN + GROUP BY
+
+The small SQL helpers here (table aliases, predicate and join columns) are
+also used by the index advisor.
+"""
+import re
+import sqlite3
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+_IDENT = r"[A-Za-z_][A-Za-z0-9_]*"
+_NOT_ALIAS = {
+    "where", "on", "join", "inner", "left", "right", "full", "cross", "outer",
+    "natural", "group", "order", "limit", "having", "union", "using", "and",
+    "or", "select", "except", "intersect", "window", "offset", "as",
+}
+_TABLE_REF = re.compile(rf"\b(?:from|join)\s+({_IDENT})(?:\s+(?:as\s+)?({_IDENT}))?", re.I)
+_JOIN_PAIR = re.compile(rf"\b({_IDENT})\.({_IDENT})\s*=\s*({_IDENT})\.({_IDENT})\b")
+_PREDICATE = re.compile(
+    rf"(?:\b({_IDENT})\.)?\b({_IDENT})\s*"
+    r"(=|==|<>|!=|<=|>=|<|>|\s(?:not\s+)?(?:in|like|glob|between|is)\b)",
+    re.I
+)
+_CLAUSE = re.compile(
+    r"\b(order|group)\s+by\s+(.+?)(?=\b(?:limit|having|order\s+by|window|union|except|intersect)\b|\)|;|$)",
+    re.I | re.S
+)
+_AUTO_INDEX = re.compile(r"AUTOMATIC (?:PARTIAL )?(?:COVERING )?INDEX \(([^)]*)\)")
+
+
+# ==================== SQL helpers ====================
+
+def table_aliases(sql: str) -> Dict[str, str]:
+    """Map every alias (and bare table name) in FROM/JOIN clauses to its table."""
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        aliases[table.lower()] = table
+        if alias and alias.lower() not in _NOT_ALIAS:
+            aliases[alias.lower()] = table
+    return aliases
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def indexed_prefixes(conn: sqlite3.Connection, table: str) -> Set[Tuple[str, ...]]:
+    """Leading column tuples already covered by an index or INTEGER PRIMARY KEY."""
+    prefixes = set()
+    for row in conn.execute(f'PRAGMA table_info("{table}")'):
+        if row[5] == 1 and (row[2] or "").upper() == "INTEGER":
+            prefixes.add((row[1].lower(),))
+    for index in conn.execute(f'PRAGMA index_list("{table}")'):
+        columns = tuple(
+            (info[2] or "").lower() for info in conn.execute(f'PRAGMA index_info("{index[1]}")')
+        )
+        for i in range(1, len(columns) + 1):
+            prefixes.add(columns[:i])
+    return prefixes
+
+
+def _resolve(
+    qualifier: Optional[str],
+    column: str,
+    aliases: Dict[str, str],
+    schema: Dict[str, List[str]]
+) -> Optional[Tuple[str, str]]:
+    """Resolve (qualifier, column) to (table, column) using the query's aliases."""
+    if qualifier:
+        table = aliases.get(qualifier.lower())
+        if table and column.lower() in (c.lower() for c in schema.get(table, [])):
+            return table, column.lower()
+        return None
+    owners = [t for t in set(aliases.values()) if column.lower() in (c.lower() for c in schema.get(t, []))]
+    return (owners[0], column.lower()) if len(owners) == 1 else None
+
+
+def referenced_columns(sql: str, conn: sqlite3.Connection) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Columns the query filters, joins, groups or orders on, per table:
+        {table: {"filter": [...], "join": [...], "group": [...], "order": [...]}}
+    """
+    aliases = table_aliases(sql)
+    schema = {}
+    for table in set(aliases.values()):
+        try:
+            schema[table] = table_columns(conn, table)
+        except sqlite3.Error:
+            schema[table] = []
+
+    usage: Dict[str, Dict[str, List[str]]] = {}
+
+    def add(kind: str, resolved: Optional[Tuple[str, str]]):
+        if resolved:
+            table, column = resolved
+            columns = usage.setdefault(table, {}).setdefault(kind, [])
+            if column not in columns:
+                columns.append(column)
+
+    for q1, c1, q2, c2 in _JOIN_PAIR.findall(sql):
+        add("join", _resolve(q1, c1, aliases, schema))
+        add("join", _resolve(q2, c2, aliases, schema))
+
+    for qualifier, column, _ in _PREDICATE.findall(sql):
+        resolved = _resolve(qualifier or None, column, aliases, schema)
+        if resolved and resolved[1] not in usage.get(resolved[0], {}).get("join", []):
+            add("filter", resolved)
+
+    for clause, body in _CLAUSE.findall(sql):
+        kind = clause.lower()
+        for item in body.split(","):
+            match = re.match(rf"\s*(?:({_IDENT})\.)?({_IDENT})", item)
+            if match:
+                add(kind, _resolve(match.group(1), match.group(2), aliases, schema))
+
+    return usage
+
+
+def index_statement(table: str, columns: List[str]) -> str:
+    name = f"idx_{table}_{'_'.join(columns)}".lower()
+    return f"CREATE INDEX {name} ON {table}({', '.join(columns)})"
+
+
+def _index_columns(finding: Dict) -> str:
+    """'(a, b)' part of a suggested CREATE INDEX, as 'a,b)'."""
+    return finding["index_sql"].split("(", 1)[1].replace(" ", "")
+
+
+# ==================== Plan analysis ====================
+
+def explain_query_plan(conn: sqlite3.Connection, sql: str) -> List[Dict]:
+    """Rows of EXPLAIN QUERY PLAN as dicts."""
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql.strip().rstrip(';')}").fetchall()
+    return [{"id": r[0], "parent": r[1], "detail": r[3]} for r in rows]
+
+
+def analyze_query_plan(conn: sqlite3.Connection, sql: str) -> Dict:
+    """
+    Analyze the plan of `sql`. Returns:
+        {"plan": [...], "findings": [{"kind", "table", "message", "index_sql"}], "elapsed_ms"}
+    """
+    start = time.perf_counter()
+    plan = explain_query_plan(conn, sql)
+    aliases = table_aliases(sql)
+    usage = referenced_columns(sql, conn)
+    findings: List[Dict] = []
+    suggested: Set[str] = set()
+
+    # The first SCAN/SEARCH under each parent is the outer loop of its join
+    outer: Dict[int, str] = {}
+    for step in plan:
+        loop = re.match(rf"(?:SCAN|SEARCH) ({_IDENT})", step["detail"])
+        if loop and step["parent"] not in outer:
+            outer[step["parent"]] = aliases.get(loop.group(1).lower(), loop.group(1))
+
+    def suggest_index(table: str, columns: List[str], kind: str, message: str):
+        if not columns:
+            return
+        prefixes = indexed_prefixes(conn, table)
+        if tuple(columns) in prefixes:
+            return
+        statement = index_statement(table, columns)
+        if statement in suggested:
+            return
+        suggested.add(statement)
+        findings.append({"kind": kind, "table": table, "message": message, "index_sql": statement})
+
+    for step in plan:
+        detail = step["detail"]
+
+        scan = re.match(rf"SCAN ({_IDENT})(?: USING (COVERING )?INDEX)?", detail)
+        if scan and "USING" not in detail:
+            table = aliases.get(scan.group(1).lower(), scan.group(1))
+            cols = usage.get(table, {})
+            filters = cols.get("filter", [])
+            inner = outer.get(step["parent"]) != table
+            # Join keys only help the inner side, which is looked up once per outer row
+            joins = [c for c in cols.get("join", []) if c not in filters] if inner else []
+            keys = filters + joins
+            if keys:
+                suggest_index(
+                    table, keys[:3], "full_scan",
+                    f"Full scan of `{table}` although it is "
+                    f"{'filtered' if filters else 'joined'} on {', '.join(keys[:3])}."
+                )
+            elif cols.get("join"):
+                findings.append({
+                    "kind": "full_scan",
+                    "table": table,
+                    "message": f"`{table}` drives the join and is read in full once; "
+                               f"the other tables are looked up per row.",
+                    "index_sql": None,
+                })
+            else:
+                findings.append({
+                    "kind": "full_scan",
+                    "table": table,
+                    "message": f"Full scan of `{table}` with no filter; fine for small tables, "
+                               f"add a WHERE or LIMIT if you only need part of it.",
+                    "index_sql": None,
+                })
+
+        auto = _AUTO_INDEX.search(detail)
+        if auto:
+            alias = detail.split()[1]
+            table = aliases.get(alias.lower(), alias)
+            columns = [c.split("=")[0].strip().lower() for c in auto.group(1).split(" AND ")]
+            suggest_index(
+                table, columns, "automatic_index",
+                f"SQLite builds a temporary index on `{table}` for every run of this query."
+            )
+
+        temp = re.match(r"USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT|RIGHT PART OF ORDER BY)", detail)
+        if temp:
+            kind = "order" if "ORDER" in temp.group(1) else "group"
+            targets = [(t, c[kind]) for t, c in usage.items() if c.get(kind)]
+            # An index can only replace the sort when it is read by the outer loop
+            if len(targets) == 1 and targets[0][0] == outer.get(step["parent"], targets[0][0]):
+                table, columns = targets[0]
+                equality = [c for c in usage[table].get("filter", []) if c not in columns]
+                suggest_index(
+                    table, (equality + columns)[:3], "temp_btree",
+                    f"Results are sorted in a temporary B-tree for {temp.group(1)}."
+                )
+            else:
+                findings.append({
+                    "kind": "temp_btree",
+                    "table": None,
+                    "message": f"Results are sorted in a temporary B-tree for {temp.group(1)}; "
+                               f"this is cheap for small results but grows with row count.",
+                    "index_sql": None,
+                })
+
+        if detail.startswith("CORRELATED"):
+            findings.append({
+                "kind": "correlated_subquery",
+                "table": None,
+                "message": "Correlated subquery runs once per outer row; rewrite it as a "
+                           "JOIN with GROUP BY (or a CTE) so it runs once.",
+                "index_sql": None,
+            })
+
+    # An index whose columns lead a larger suggested index is redundant
+    planned = [f for f in findings if f["index_sql"]]
+    redundant = [
+        finding for finding in planned
+        if any(
+            other["table"] == finding["table"]
+            and _index_columns(other).startswith(_index_columns(finding)[:-1] + ",")
+            for other in planned
+        )
+    ]
+    findings = [f for f in findings if not any(f is r for r in redundant)]
+
+    return {
+        "plan": [step["detail"] for step in plan],
+        "findings": findings,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+    }
+
+
+def format_optimization(analysis: Dict, execution_time: float, result_count: int) -> str:
+    """Render analyzer findings as the `optimization` text."""
+    findings = analysis["findings"]
+    actionable = [f for f in findings if f["index_sql"] or f["kind"] == "correlated_subquery"]
+    if not actionable:
+        notes = " ".join(f["message"] for f in findings[:2])
+        return (
+            f"Query plan looks good ({execution_time:.2f}ms, {result_count} rows). "
+            + (notes or "All tables are accessed through indexes.")
+        ).strip()
+
+    lines = []
+    for i, finding in enumerate(actionable, 1):
+        line = f"{i}. {finding['message']}"
+        if finding["index_sql"]:
+            line += f" Suggested: `{finding['index_sql']};`"
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,223 @@
+"""
+Token-budgeted prompt assembly.
+
+Prompts are built from named sections (retrieved schema, recent
+conversation, Mem0 memories, few-shot examples, result rows, ...), each
+with its own token budget counted with tiktoken. A section over its budget
+is cut at item boundaries (schema chunks, conversation turns, rows) keeping
+the most useful end; if the whole prompt is still over PROMPT_MAX_TOKENS,
+sections are trimmed further starting with the lowest priority. Token
+counts per section are logged (PROMPT_TOKEN_LOG) so prompt growth is
+visible.
+
+format_rows() renders query results as a compact header + delimited rows
+table instead of a list of Python dict reprs, adding rows until its budget
+is used.
+"""
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import tiktoken
+
+PROMPT_TOKENIZER_MODEL = os.getenv("PROMPT_TOKENIZER_MODEL", "gpt-4")
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "6000"))
+PROMPT_BUDGET_SCHEMA = int(os.getenv("PROMPT_BUDGET_SCHEMA", "2000"))
+PROMPT_BUDGET_SHORT_TERM = int(os.getenv("PROMPT_BUDGET_SHORT_TERM", "800"))
+PROMPT_BUDGET_LONG_TERM = int(os.getenv("PROMPT_BUDGET_LONG_TERM", "300"))
+PROMPT_BUDGET_EXAMPLES = int(os.getenv("PROMPT_BUDGET_EXAMPLES", "600"))
+PROMPT_BUDGET_RESULTS = int(os.getenv("PROMPT_BUDGET_RESULTS", "800"))
+PROMPT_RESULT_MAX_ROWS = int(os.getenv("PROMPT_RESULT_MAX_ROWS", "50"))
+PROMPT_BUDGET_PROFILE = int(os.getenv("PROMPT_BUDGET_PROFILE", "600"))
+# Sample rows shown next to a result profile
+PROMPT_PROFILE_SAMPLE_ROWS = int(os.getenv("PROMPT_PROFILE_SAMPLE_ROWS", "5"))
+PROMPT_TOKEN_LOG = os.getenv("PROMPT_TOKEN_LOG", "true").lower() == "true"
+
+TRUNCATION_MARK = "[...truncated]"
+CELL_MAX_CHARS = 80
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """tiktoken encoding for PROMPT_TOKENIZER_MODEL; False when it can't be loaded."""
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    _encoding = tiktoken.encoding_for_model(PROMPT_TOKENIZER_MODEL)
+                except KeyError:
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    # The BPE file is downloaded on first use; offline, estimate instead
+                    print(f"Warning: tiktoken unavailable, estimating tokens - {e}")
+                    _encoding = False
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is False:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, keep: str = "head") -> str:
+    """Cut text to max_tokens, keeping its start ("head") or end ("tail")."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is False:
+        chars = max_tokens * 4
+        return text[:chars] if keep == "head" else text[-chars:]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    kept = tokens[:max_tokens] if keep == "head" else tokens[-max_tokens:]
+    return encoding.decode(kept)
+
+
+class PromptSection:
+    """
+    One named part of a prompt.
+
+    Items are separated by `separator`; when over budget whole items are
+    dropped from the far end (keep="head" keeps the first items, "tail"
+    the last ones). pin_first keeps a header item such as
+    "RECENT CONVERSATION (from Redis):". Lower priority numbers are trimmed
+    last; budget=None means the section is never cut.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        text: str,
+        budget: Optional[int] = None,
+        priority: int = 0,
+        separator: str = "\n\n",
+        keep: str = "head",
+        pin_first: bool = False
+    ):
+        self.name = name
+        self.original = text or ""
+        self.text = self.original
+        self.budget = budget
+        self.priority = priority
+        self.separator = separator
+        self.keep = keep
+        self.pin_first = pin_first
+        self.original_tokens = count_tokens(self.original)
+        self.tokens = self.original_tokens
+
+    def fit(self, max_tokens: int):
+        """Trim the section to at most max_tokens."""
+        if self.tokens <= max_tokens:
+            return
+        items = self.original.split(self.separator) if self.separator else [self.original]
+        pinned = [items.pop(0)] if self.pin_first and len(items) > 1 else []
+        if self.keep == "tail":
+            items.reverse()
+
+        mark_tokens = count_tokens(TRUNCATION_MARK)
+        used = sum(count_tokens(p) for p in pinned) + mark_tokens
+        kept: List[str] = []
+        for item in items:
+            cost = count_tokens(item) + count_tokens(self.separator)
+            if used + cost > max_tokens:
+                if not kept:
+                    # Not even one item fits: cut inside it
+                    kept.append(truncate_tokens(item, max_tokens - used, self.keep))
+                break
+            kept.append(item)
+            used += cost
+        if self.keep == "tail":
+            kept.reverse()
+
+        parts = [p for p in kept if p]
+        if self.keep == "tail":
+            parts = pinned + [TRUNCATION_MARK] + parts
+        else:
+            parts = pinned + parts + [TRUNCATION_MARK]
+        self.text = self.separator.join(parts) if max_tokens > mark_tokens else ""
+        self.tokens = count_tokens(self.text)
+
+
+def budget_sections(
+    prompt: str,
+    sections: List[PromptSection],
+    max_tokens: int = PROMPT_MAX_TOKENS
+) -> Dict[str, str]:
+    """
+    Apply per-section budgets, then the overall limit (lowest priority
+    trimmed first). `prompt` names the prompt in the token log. Returns
+    {section name: text}.
+    """
+    for section in sections:
+        if section.budget is not None:
+            section.fit(section.budget)
+
+    overflow = sum(s.tokens for s in sections) - max_tokens
+    for section in sorted(sections, key=lambda s: -s.priority):
+        if overflow <= 0:
+            break
+        if section.budget is None:
+            continue
+        before = section.tokens
+        section.fit(max(0, section.tokens - overflow))
+        overflow -= before - section.tokens
+
+    if PROMPT_TOKEN_LOG:
+        log_sections(prompt, sections)
+    return {s.name: s.text for s in sections}
+
+
+def log_sections(prompt: str, sections: List[PromptSection]):
+    parts = []
+    for s in sections:
+        part = f"{s.name}={s.tokens}"
+        if s.tokens < s.original_tokens:
+            part += f"/{s.original_tokens}"
+        parts.append(part)
+    total = sum(s.tokens for s in sections)
+    print(f"🧮 Prompt {prompt}: {total} tokens ({', '.join(parts)})")
+
+
+def _cell(value: Any) -> str:
+    text = "NULL" if value is None else str(value)
+    text = text.replace("\n", " ").replace("|", "/")
+    return text if len(text) <= CELL_MAX_CHARS else text[:CELL_MAX_CHARS - 3] + "..."
+
+
+def format_rows(
+    rows: List[Dict],
+    budget: int = PROMPT_BUDGET_RESULTS,
+    max_rows: int = PROMPT_RESULT_MAX_ROWS,
+    total: Optional[int] = None
+) -> str:
+    """
+    Rows as "col | col" lines under one header, as many as fit in budget
+    tokens (at most max_rows). `total` is the full row count when `rows`
+    is itself a prefix of the result.
+    """
+    total = len(rows) if total is None else total
+    if not rows:
+        return "(no rows)"
+    columns = list(rows[0].keys())
+    lines = [" | ".join(columns)]
+    used = count_tokens(lines[0])
+    shown = 0
+    for row in rows[:max_rows]:
+        line = " | ".join(_cell(row.get(c)) for c in columns)
+        cost = count_tokens(line) + 1
+        if shown and used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+        shown += 1
+    if shown < total:
+        lines.append(f"(showing {shown} of {total} rows)")
+    return "\n".join(lines)
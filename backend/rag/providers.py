@@ -0,0 +1,108 @@
+"""
+Provider selection for the external services the pipeline depends on.
+
+SQL_BUDDY_PROVIDERS=openai (default) builds the real clients: ChatOpenAI,
+OpenAIEmbeddings, Redis and Mem0. SQL_BUDDY_PROVIDERS=stub swaps in the
+deterministic offline stand-ins from stubs.py, so the whole /rag/query
+pipeline (and loadtest.py) runs without network access.
+"""
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+# Dimensions of the OpenAI models the stub embedder imitates
+EMBEDDING_DIMENSIONS = {
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+}
+
+_stub_redis = None
+_stub_lock = threading.Lock()
+
+
+def using_stubs() -> bool:
+    # Read on every call: modules import this before load_dotenv() runs
+    return os.getenv("SQL_BUDDY_PROVIDERS", "openai").lower() == "stub"
+
+
+def _stubs():
+    try:
+        from . import stubs
+    except ImportError:
+        import stubs
+    return stubs
+
+
+def chat_model(model_name: str, temperature: float = 0, api_key: Optional[str] = None):
+    """ChatOpenAI, or FakeChatModel in stub mode."""
+    if using_stubs():
+        return _stubs().FakeChatModel(model_name=model_name)
+    from langchain_openai import ChatOpenAI
+
+    # stream_usage: streamed calls report token counts too (see metrics.py)
+    kwargs = {"model_name": model_name, "temperature": temperature, "stream_usage": True}
+    if api_key:
+        kwargs["openai_api_key"] = api_key
+    return ChatOpenAI(**kwargs)
+
+
+def embeddings_model(model: str):
+    """OpenAIEmbeddings, or HashEmbeddings of the same width in stub mode."""
+    if using_stubs():
+        return _stubs().HashEmbeddings(EMBEDDING_DIMENSIONS.get(model, 1536))
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(model=model)
+
+
+def embedding_cache_name(model: str) -> str:
+    """Cache namespace for a model; stub vectors never mix with real ones."""
+    return f"stub-{model}" if using_stubs() else model
+
+
+def _shared_stub_redis(pool_size: int = 0):
+    """One in-process Redis per worker, like one server behind every URL."""
+    global _stub_redis
+    with _stub_lock:
+        if _stub_redis is None:
+            _stub_redis = _stubs().InMemoryRedis(max_connections=pool_size)
+        return _stub_redis
+
+
+def redis_clients(redis_url: str, pool_size: int, timeout_s: float) -> Tuple[object, object]:
+    """(sync, asyncio) binary Redis clients, each with a bounded blocking pool."""
+    if using_stubs():
+        client = _shared_stub_redis(pool_size)
+        return client, _stubs().AsyncInMemoryRedis(client)
+    import redis
+    import redis.asyncio as aioredis
+
+    client = redis.Redis(
+        connection_pool=redis.BlockingConnectionPool.from_url(
+            redis_url, max_connections=pool_size, timeout=timeout_s
+        )
+    )
+    async_client = aioredis.Redis(
+        connection_pool=aioredis.BlockingConnectionPool.from_url(
+            redis_url, max_connections=pool_size, timeout=timeout_s
+        )
+    )
+    return client, async_client
+
+
+def redis_from_url(redis_url: str, **kwargs):
+    """redis.from_url, or the shared in-memory stand-in in stub mode."""
+    if using_stubs():
+        return _shared_stub_redis()
+    import redis
+
+    return redis.from_url(redis_url, **kwargs)
+
+
+def mem0_from_config(config: Dict):
+    """Memory.from_config, or LocalMemory in stub mode."""
+    if using_stubs():
+        return _stubs().LocalMemory()
+    from mem0 import Memory
+
+    return Memory.from_config(config)
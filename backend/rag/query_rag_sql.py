@@ -10,9 +10,14 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
 
+# Works both as `python backend/rag/query_rag_sql.py` and as a package import
+try:
+    from .db_pool import DB_PATH, get_pool
+except ImportError:
+    from db_pool import DB_PATH, get_pool
+
 # Paths
 VECTOR_DIR = "backend/rag/vectorstore"
-DB_PATH = "backend/db/retail.db"
 
 def format_docs(docs):
     """Format retrieved documents into a single string."""
@@ -87,20 +92,16 @@ def execute_sql(sql_query: str, db_path: str = DB_PATH):
         print(f"❌ Database not found at: {db_path}")
         return None
     
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
     try:
-        cursor.execute(sql_query)
-        rows = cursor.fetchall()
-        columns = [description[0] for description in cursor.description] if cursor.description else []
+        with get_pool(db_path).connection() as conn:
+            cursor = conn.execute(sql_query)
+            rows = cursor.fetchall()
+            columns = [description[0] for description in cursor.description] if cursor.description else []
         results = [dict(zip(columns, row)) for row in rows]
         return results
     except sqlite3.Error as e:
         print(f"❌ SQL Error: {e}")
         return None
-    finally:
-        cursor.close()
-        conn.close()
 
 def query_database(user_question: str):
     """Generates SQL using RAG and executes it."""
@@ -3,16 +3,23 @@ Hybrid memory system using Redis + Mem0:
 - Redis: Fast short-term conversation memory (last 10 exchanges)
 - Mem0/Qdrant: Long-term semantic memory (full history, searchable)
 """
-import redis
-import json
+import asyncio
 from typing import List, Dict, Optional
 from datetime import datetime
-from mem0 import Memory
 import os
+from .embedding_cache import cached_openai_embeddings
+from .providers import mem0_from_config
+from .memory_writer import MemoryWriteBehind
+from .short_term_store import ShortTermStore
+from .memory_stats import MemoryStatsIndex
+from .metrics import stage_timer
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Queue Mem0 writes for background workers instead of writing in the request
+MEMORY_WRITE_BEHIND = os.getenv("MEMORY_WRITE_BEHIND", "true").lower() == "true"
+
 class HybridMemoryManager:
     """
     Two-tier intelligent memory system.
@@ -21,16 +28,19 @@ class HybridMemoryManager:
     - Fast access to recent conversation
     - Key-value storage with TTL
     - Session-based memory
+    - One round-trip per operation, compact binary records
     
     Tier 2 (Mem0/Qdrant):
     - Semantic search across all history
     - Automatic memory extraction
     - Persistent long-term storage
+    - Written behind the request by a background queue
     """
     
-    def __init__(self, redis_url: str = "redis://localhost:6379"):
-        # Initialize Redis for short-term memory
-        self.redis_client = redis.from_url(redis_url, decode_responses=True)
+    def __init__(self, redis_url: str = "redis://localhost:6379", write_behind: bool = MEMORY_WRITE_BEHIND):
+        # Initialize Redis for short-term memory (pooled sync + asyncio clients)
+        self.short_term = ShortTermStore(redis_url)
+        self.redis_client = self.short_term.client
         
         # Test Redis connection
         try:
@@ -51,9 +61,11 @@ class HybridMemoryManager:
                 }
             },
             "embedder": {
-                "provider": "openai",
+                # OpenAI text-embedding-3-small behind the shared embedding cache
+                "provider": "langchain",
                 "config": {
-                    "model": "text-embedding-3-small"
+                    "model": cached_openai_embeddings("text-embedding-3-small"),
+                    "embedding_dims": 1536
                 }
             },
             "vector_store": {
@@ -65,8 +77,19 @@ class HybridMemoryManager:
             },
         }
         
-        self.mem0 = Memory.from_config(mem0_config)
+        self.mem0 = mem0_from_config(mem0_config)
         print("✅ Mem0 initialized successfully")
+
+        # Per-user memory counters (memstats:{user_id}), reconciled in the background
+        self.memory_stats = MemoryStatsIndex(self.short_term.client, self.short_term.async_client)
+        # Raw get_all: a failed scroll must raise, not reconcile the user to zero
+        self.memory_stats.start_reconciler(
+            lambda user_id, limit: self.mem0.get_all(user_id=user_id, limit=limit)
+        )
+
+        self.long_term_writer = (
+            MemoryWriteBehind(self._write_long_term_batch) if write_behind else None
+        )
     
     # ==================== SHORT-TERM MEMORY (Redis) ====================
     
@@ -76,19 +99,12 @@ class HybridMemoryManager:
         Fast access, expires after 1 hour.
         """
         try:
-            key = f"conversation:{session_id}"
-            
             # Add timestamp
             interaction['timestamp'] = datetime.now().isoformat()
             
-            # Push to Redis list (newest first)
-            self.redis_client.lpush(key, json.dumps(interaction))
-            
-            # Keep only last 10 interactions
-            self.redis_client.ltrim(key, 0, 9)
-            
-            # Set expiration (1 hour)
-            self.redis_client.expire(key, 3600)
+            # LPUSH + LTRIM (last 10) + EXPIRE (1 hour) in one MULTI round-trip
+            with stage_timer("memory_short_term_write"):
+                self.short_term.append(session_id, interaction)
             
             print(f"📝 Stored in Redis: {interaction['question'][:50]}...")
             
@@ -100,23 +116,8 @@ class HybridMemoryManager:
         Get recent conversation from Redis for immediate context.
         """
         try:
-            key = f"conversation:{session_id}"
-            items = self.redis_client.lrange(key, 0, limit - 1)
-            
-            if not items:
-                return ""
-            
-            context_parts = ["RECENT CONVERSATION (from Redis):"]
-            for item in reversed(items):  # Chronological order
-                data = json.loads(item)
-                context_parts.append(
-                    f"Q: {data['question']}\n"
-                    f"SQL: {data['sql']}\n"
-                    f"Results: {data.get('result_summary', 'N/A')}"
-                )
-            
-            return "\n\n".join(context_parts)
-            
+            with stage_timer("memory_short_term_read"):
+                return self.short_term.render(session_id, limit)
         except Exception as e:
             print(f"Error retrieving from Redis: {e}")
             return ""
@@ -124,8 +125,15 @@ class HybridMemoryManager:
     def clear_short_term(self, session_id: str):
         """Clear Redis conversation for a session."""
         try:
-            key = f"conversation:{session_id}"
-            self.redis_client.delete(key)
+            self.short_term.clear(session_id)
+            return {"status": "success", "message": f"Cleared Redis memory for {session_id}"}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+    
+    async def aclear_short_term(self, session_id: str):
+        """Async variant of clear_short_term."""
+        try:
+            await self.short_term.aclear(session_id)
             return {"status": "success", "message": f"Cleared Redis memory for {session_id}"}
         except Exception as e:
             return {"status": "error", "message": str(e)}
@@ -168,6 +176,7 @@ This interaction happened in session {session_id}."""
                 }
             )
             
+            self._record_stats(user_id, result)
             print(f"💾 Stored in Mem0: {question[:50]}...")
             return result
             
@@ -175,16 +184,65 @@ This interaction happened in session {session_id}."""
             print(f"Error storing in Mem0: {e}")
             return None
     
+    def _write_long_term_batch(self, user_id: str, interactions: List[Dict]):
+        """
+        Write queued interactions for one user with one mem0.add call (one
+        extraction pass) per session, so every memory carries the session it
+        came from. Written sessions are removed from `interactions`, so when
+        a later add raises, the write-behind queue retries only the rest.
+        """
+        by_session: Dict[str, List[Dict]] = {}
+        for i in interactions:
+            by_session.setdefault(i["session_id"], []).append(i)
+
+        for session_id, session_interactions in by_session.items():
+            messages = [
+                {
+                    "role": "user",
+                    "content": f"""User asked: "{i['question']}"
+
+Generated SQL query: {i['sql']}
+
+Query returned {i['result_count']} rows.
+
+Key insights: {i['insights'][:300]}
+
+This interaction happened in session {session_id}."""
+                }
+                for i in session_interactions
+            ]
+            metadata = {
+                "session_id": session_id,
+                "type": "sql_query",
+                "batch_size": len(session_interactions)
+            }
+            if len(session_interactions) == 1:
+                # Several questions can't share one per-question field
+                metadata["question"] = session_interactions[0]["question"]
+            with stage_timer("memory_long_term_write"):
+                result = self.mem0.add(messages=messages, user_id=user_id, metadata=metadata)
+            self._record_stats(user_id, result)
+            interactions[:] = [i for i in interactions if i["session_id"] != session_id]
+            print(f"💾 Stored {len(session_interactions)} interaction(s) in Mem0 for {user_id}")
+    
+    def _record_stats(self, user_id: str, add_result):
+        """Update memstats counters; a failure here must not fail the write."""
+        try:
+            self.memory_stats.record_events(user_id, add_result)
+        except Exception as e:
+            print(f"Warning: memory stats update failed - {e}")
+    
     def search_long_term(self, question: str, user_id: str, limit: int = 2) -> str:
         """
         Search long-term memory using semantic search.
         """
         try:
-            memories = self.mem0.search(
-                query=question,
-                user_id=user_id,
-                limit=limit
-            )
+            with stage_timer("memory_long_term_search"):
+                memories = self.mem0.search(
+                    query=question,
+                    user_id=user_id,
+                    limit=limit
+                )
             
             if not memories or len(memories) == 0:
                 return ""
@@ -216,10 +274,12 @@ This interaction happened in session {session_id}."""
         self, 
         question: str, 
         session_id: str, 
-        user_id: str
+        user_id: str,
+        short_term: Optional[str] = None
     ) -> Dict[str, str]:
         """
         Get both short-term (Redis) and long-term (Mem0) context.
+        Pass short_term if it was already fetched for this request.
         
         Returns:
             {
@@ -229,12 +289,17 @@ This interaction happened in session {session_id}."""
             }
         """
         # Get short-term from Redis
-        short_term = self.get_short_term_context(session_id, limit=3)
+        if short_term is None:
+            short_term = self.get_short_term_context(session_id, limit=3)
         
         # Get long-term from Mem0
         long_term = self.search_long_term(question, user_id, limit=2)
         
-        # Combine
+        return self.combine_contexts(short_term, long_term)
+    
+    @staticmethod
+    def combine_contexts(short_term: str, long_term: str) -> Dict[str, str]:
+        """Build the memory_context dict from already-fetched parts."""
         combined = []
         if short_term:
             combined.append(short_term)
@@ -262,6 +327,8 @@ This interaction happened in session {session_id}."""
     ):
         """
         Store interaction in BOTH Redis (short-term) and Mem0 (long-term).
+        The Redis write is synchronous so the next question sees it; the Mem0
+        write is handed to the write-behind queue.
         """
         # Prepare interaction data
         interaction = {
@@ -275,7 +342,17 @@ This interaction happened in session {session_id}."""
         # Store in Redis (fast, recent)
         self.add_to_short_term(session_id, interaction)
         
-        # Store in Mem0 (semantic, permanent)
+        # Store in Mem0 (semantic, permanent); queued unless write-behind is off
+        if self.long_term_writer is not None:
+            self.long_term_writer.submit(user_id, {
+                "question": question,
+                "sql": sql,
+                "result_count": len(results),
+                "insights": insights,
+                "session_id": session_id
+            })
+            return
+
         self.add_to_long_term(
             question=question,
             sql=sql,
@@ -299,31 +376,52 @@ This interaction happened in session {session_id}."""
         """Delete all memories for a user from Mem0."""
         try:
             self.mem0.delete_all(user_id=user_id)
+            self.memory_stats.reset(user_id)
             return {"status": "success"}
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
+    def get_write_queue_stats(self) -> Dict:
+        """Depth, lag and outcome counters of the long-term write queue."""
+        if self.long_term_writer is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.long_term_writer.stats()}
+
+    def close(self):
+        """Flush queued long-term writes (call at shutdown)."""
+        if self.long_term_writer is not None:
+            self.long_term_writer.close()
+    
     def get_memory_stats(self, session_id: str, user_id: str) -> Dict:
-        """Get statistics about stored memories."""
+        """Get statistics about stored memories (one Redis round-trip per tier)."""
         try:
-            # Redis stats
-            redis_key = f"conversation:{session_id}"
-            redis_count = self.redis_client.llen(redis_key)
-            redis_ttl = self.redis_client.ttl(redis_key)
-            
-            # Mem0 stats
-            mem0_memories = self.get_all_memories(user_id)
-            mem0_count = len(mem0_memories) if mem0_memories else 0
+            # Redis stats (LLEN + TTL in one round-trip)
+            redis_stats = self.short_term.stats(session_id)
             
-            return {
-                "redis": {
-                    "recent_exchanges": redis_count,
-                    "expires_in_seconds": redis_ttl if redis_ttl > 0 else 0
-                },
-                "mem0": {
-                    "total_memories": mem0_count
-                },
-                "total": redis_count + mem0_count
-            }
+            # Mem0 stats from the memstats counters (no get_all scan)
+            return self._format_stats(redis_stats, self.memory_stats.get(user_id))
         except Exception as e:
-            return {"error": str(e)}
\ No newline at end of file
+            return {"error": str(e)}
+    
+    async def aget_memory_stats(self, session_id: str, user_id: str) -> Dict:
+        """Async variant of get_memory_stats (both lookups run concurrently)."""
+        try:
+            redis_stats, mem0_stats = await asyncio.gather(
+                self.short_term.astats(session_id),
+                self.memory_stats.aget(user_id)
+            )
+            return self._format_stats(redis_stats, mem0_stats)
+        except Exception as e:
+            return {"error": str(e)}
+    
+    @staticmethod
+    def _format_stats(redis_stats: Dict, mem0_stats: Optional[Dict]) -> Dict:
+        # Users not counted yet are reported as 0 until the reconciler runs
+        mem0_stats = mem0_stats or {
+            "total_memories": 0, "approx_bytes": 0, "last_write": None, "reconciled_at": None
+        }
+        return {
+            "redis": redis_stats,
+            "mem0": mem0_stats,
+            "total": redis_stats["recent_exchanges"] + mem0_stats["total_memories"]
+        }
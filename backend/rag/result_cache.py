@@ -0,0 +1,238 @@
+"""
+Result cache for read-only SELECTs executed by run_sql.
+
+Entries are keyed by the normalized SQL text and tagged with the database
+version they were read at. The version combines SQLite's PRAGMA data_version
+(seen through one long-lived watcher connection) with the mtime/size of the
+database and its WAL file, so any committed write - from this process or
+another one - invalidates the cache. Memory is bounded by an approximate
+byte budget with LRU eviction.
+
+Results that depend on the clock (date('now'), CURRENT_DATE, ...) change
+without any write, so they expire after RESULT_CACHE_TIME_TTL_S; queries
+using random() are never cached.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_TIME_TTL_S = float(os.getenv("RESULT_CACHE_TIME_TTL_S", "60"))
+
+# Quoted literals/identifiers are kept verbatim; everything else is normalized
+_QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\])")
+_WHITESPACE = re.compile(r"\s+")
+_WRITE_KEYWORDS = re.compile(
+    r"\b(insert|update|delete|replace|create|drop|alter|attach|detach|pragma|vacuum|reindex|analyze)\b"
+)
+_RANDOM = re.compile(r"\brandom(?:blob)?\s*\(")
+_TIME_DEPENDENT = re.compile(
+    r"'now'|\bcurrent_(?:date|time|timestamp)\b|\bunixepoch\s*\(\s*\)", re.IGNORECASE
+)
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace and lower-case keywords outside of quoted literals."""
+    parts = _QUOTED.split(sql.strip().rstrip(";").strip())
+    normalized = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            normalized.append(part)
+        else:
+            normalized.append(_WHITESPACE.sub(" ", part).lower())
+    return "".join(normalized).strip()
+
+
+def is_cacheable(normalized_sql: str) -> bool:
+    """Only plain read-only SELECT / WITH ... SELECT statements are cached."""
+    if not normalized_sql.startswith(("select", "with")):
+        return False
+    unquoted = " ".join(_QUOTED.split(normalized_sql)[::2])
+    return ";" not in unquoted and not _WRITE_KEYWORDS.search(unquoted)
+
+
+def is_random(normalized_sql: str) -> bool:
+    """The result differs on every run (random(), randomblob())."""
+    return bool(_RANDOM.search(" ".join(_QUOTED.split(normalized_sql)[::2])))
+
+
+def is_time_dependent(normalized_sql: str) -> bool:
+    """The result depends on the current time ('now', CURRENT_DATE, unixepoch())."""
+    return bool(_TIME_DEPENDENT.search(normalized_sql))
+
+
+class DataVersionWatcher:
+    """Cheap "has the database changed?" token for one SQLite file."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _stat(self, path: str) -> Tuple[int, int]:
+        try:
+            st = os.stat(path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return 0, 0
+
+    def token(self) -> tuple:
+        """Return a value that changes whenever the database content changes."""
+        data_version = None
+        with self._lock:
+            try:
+                if self._conn is None:
+                    self._conn = sqlite3.connect(
+                        f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False
+                    )
+                data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            except sqlite3.Error:
+                self._conn = None
+        return (
+            data_version,
+            self._stat(self.db_path),
+            self._stat(self.db_path + "-wal"),
+        )
+
+
+class ResultCache:
+    """Byte-bounded LRU cache of query results, invalidated on database change."""
+
+    def __init__(
+        self,
+        db_path: str,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+        time_ttl_s: float = RESULT_CACHE_TIME_TTL_S
+    ):
+        self.max_bytes = max_bytes
+        self.time_ttl_s = time_ttl_s
+        self.watcher = DataVersionWatcher(db_path)
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.expirations = 0
+
+    def version(self) -> tuple:
+        """Current database version; drops all entries if it changed."""
+        version = self.watcher.token()
+        with self._lock:
+            if version != self._version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._bytes = 0
+                self._version = version
+        return version
+
+    def get(self, sql: str) -> Optional[Dict]:
+        """
+        Return {"rows", "columns", "execution_time_ms", "truncated", "profile",
+        "age_s"} for a cached query, or None.
+        """
+        key = normalize_sql(sql)
+        if not is_cacheable(key) or is_random(key):
+            return None
+        self.version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires_at"] is not None and time.time() >= entry["expires_at"]:
+                del self._entries[key]
+                self._bytes -= entry["size"]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return {
+                "rows": entry["rows"],
+                "columns": entry["columns"],
+                "execution_time_ms": entry["execution_time_ms"],
+                "truncated": entry["truncated"],
+                "profile": entry["profile"],
+                "age_s": round(time.time() - entry["stored_at"], 3),
+            }
+
+    def put(
+        self,
+        sql: str,
+        rows: List[Dict],
+        execution_time_ms: float,
+        version: tuple,
+        truncated: bool = False,
+        profile: Optional[Dict] = None,
+        columns: Optional[List[str]] = None
+    ):
+        """
+        Cache the result of a successful read-only query. `version` must be
+        taken with version() before the query ran, so a write that lands
+        while it executes is never cached as current. `truncated` marks rows
+        that are only the first page of a larger result; `profile` is the
+        column profile of the whole result and `columns` the column names as
+        the query returned them (duplicates included).
+        """
+        key = normalize_sql(sql)
+        if not is_cacheable(key) or is_random(key):
+            return
+        size = len(key) + len(json.dumps(rows, default=str)) + len(json.dumps(profile, default=str))
+        if size > self.max_bytes:
+            return
+        if self.version() != version:
+            return
+        stored_at = time.time()
+        expires_at = stored_at + self.time_ttl_s if is_time_dependent(key) else None
+        if expires_at is not None and self.time_ttl_s <= 0:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old["size"]
+            self._entries[key] = {
+                "rows": rows,
+                "execution_time_ms": execution_time_ms,
+                "truncated": truncated,
+                "profile": profile,
+                "columns": columns,
+                "stored_at": stored_at,
+                "expires_at": expires_at,
+                "size": size,
+            }
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted["size"]
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        """Counters and memory usage for the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "expirations": self.expirations,
+                "time_ttl_s": self.time_ttl_s,
+            }
@@ -0,0 +1,196 @@
+"""
+Server-side cursors for /rag/query results that exceed the row cap.
+
+run_sql returns the first RESULT_ROW_CAP rows plus a cursor token. The
+follow-up endpoint pages through the rest: the first fetch re-executes the
+query on a dedicated connection, skips the rows already returned and then
+holds that cursor open for later pages. At most MAX_OPEN_CURSORS cursors
+are held open at once; an evicted one transparently falls back to
+re-execution with an OFFSET (counted in `reexecutions`). Pages use the column
+names of the first page, since the OFFSET wrapper renames duplicates.
+Tokens expire after CURSOR_TTL_S of inactivity.
+Every page runs under the SQL execution governor, and paging stops once
+SQL_MAX_ROWS rows have been handed out in total.
+"""
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from .db_pool import SQLitePool
+from .sql_governor import SQL_MAX_ROWS, QueryGovernor, fetch_governed
+
+RESULT_ROW_CAP = int(os.getenv("RESULT_ROW_CAP", "500"))
+CURSOR_TTL_S = int(os.getenv("CURSOR_TTL_S", "300"))
+MAX_OPEN_CURSORS = int(os.getenv("MAX_OPEN_CURSORS", "16"))
+
+
+class _CursorState:
+    def __init__(self, sql: str, position: int, expires_at: float, columns: Optional[List[str]] = None):
+        self.sql = sql
+        self.position = position
+        # Rows handed out by run_sql; anything past it was paged through a cursor
+        self.first_page = position
+        self.expires_at = expires_at
+        self.conn = None
+        self.cursor = None
+        self.columns: List[str] = list(columns or [])
+        self.pending: list = []
+        self.lock = threading.Lock()
+
+    def release(self):
+        """Close the held cursor (the state can still re-execute later)."""
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+        self.conn = None
+        self.cursor = None
+        self.pending = []
+
+
+class ResultCursorRegistry:
+    """Tracks cursor tokens for truncated query results."""
+
+    def __init__(
+        self,
+        pool: SQLitePool,
+        ttl_seconds: int = CURSOR_TTL_S,
+        max_open: int = MAX_OPEN_CURSORS
+    ):
+        self.pool = pool
+        self.ttl_seconds = ttl_seconds
+        self.max_open = max_open
+        self._states: "OrderedDict[str, _CursorState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.expired = 0
+        self.reexecutions = 0
+
+    def open(self, sql: str, position: int, columns: Optional[List[str]] = None) -> str:
+        """
+        Register a result whose first `position` rows were already returned
+        with the given column names.
+        """
+        token = secrets.token_urlsafe(16)
+        with self._lock:
+            self._sweep()
+            self._states[token] = _CursorState(sql, position, time.time() + self.ttl_seconds, columns)
+            self.opened += 1
+        return token
+
+    def fetch(self, token: str, limit: int = RESULT_ROW_CAP) -> Optional[Dict]:
+        """
+        Return the next page for a token:
+            {"results": [...], "has_more": bool, "cursor": token or None,
+             "row_limit_reached": bool}
+        or None if the token is unknown or expired. Raises QueryAborted if the
+        page exceeds the governor's time / VM-step budget.
+        """
+        with self._lock:
+            self._sweep()
+            state = self._states.get(token)
+            if state is None:
+                return None
+            self._states.move_to_end(token)
+            state.expires_at = time.time() + self.ttl_seconds
+
+        with state.lock:
+            limit = min(limit, SQL_MAX_ROWS - state.position)
+            rows, has_more = [], True
+            if limit > 0:
+                try:
+                    rows, has_more = self._next_rows(state, limit)
+                except Exception:
+                    # Drop the token once the state lock is released
+                    state.release()
+                    state.expires_at = 0
+                    raise
+            state.position += len(rows)
+            results = [dict(zip(state.columns, row)) for row in rows]
+            row_limit_reached = has_more and state.position >= SQL_MAX_ROWS
+            if row_limit_reached:
+                has_more = False
+
+        if not has_more:
+            self.close(token)
+        return {
+            "results": results,
+            "has_more": has_more,
+            "cursor": token if has_more else None,
+            "row_limit_reached": row_limit_reached,
+        }
+
+    def _next_rows(self, state: _CursorState, limit: int) -> tuple:
+        """Fetch up to `limit` rows (plus one lookahead) under the governor."""
+        if state.cursor is None:
+            self._connect(state)
+        governor = QueryGovernor()
+        with governor.attach(state.conn):
+            if state.cursor is None:
+                sql = state.sql.strip().rstrip(";")
+                state.cursor = state.conn.execute(
+                    f"SELECT * FROM ({sql}) LIMIT -1 OFFSET ?", (state.position,)
+                )
+                if not state.columns:
+                    state.columns = [desc[0] for desc in state.cursor.description]
+                state.pending = []
+            rows = state.pending + fetch_governed(
+                state.cursor, governor, limit + 1 - len(state.pending)
+            )
+        state.pending = rows[limit:]
+        return rows[:limit], len(rows) > limit
+
+    def _connect(self, state: _CursorState):
+        """Open a dedicated connection for a state, evicting the oldest held cursors."""
+        with self._lock:
+            held = [s for s in self._states.values() if s.cursor is not None]
+            for old in held[:max(0, len(held) - self.max_open + 1)]:
+                # Evicted cursors re-execute with an OFFSET on their next fetch
+                if old.lock.acquire(blocking=False):
+                    try:
+                        old.release()
+                    finally:
+                        old.lock.release()
+            if state.position > state.first_page:
+                self.reexecutions += 1  # evicted after serving pages
+
+        state.conn = self.pool.open_connection(check_same_thread=False)
+
+    def close(self, token: str):
+        """Forget a token and close its cursor."""
+        with self._lock:
+            state = self._states.pop(token, None)
+        if state is not None:
+            with state.lock:
+                state.release()
+
+    def _sweep(self):
+        """Drop expired tokens (caller holds self._lock)."""
+        now = time.time()
+        for token in [t for t, s in self._states.items() if s.expires_at <= now]:
+            state = self._states[token]
+            if not state.lock.acquire(blocking=False):
+                continue  # mid-fetch; try again on the next sweep
+            try:
+                state.release()
+            finally:
+                state.lock.release()
+            del self._states[token]
+            self.expired += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "active": len(self._states),
+                "held_open": sum(1 for s in self._states.values() if s.cursor is not None),
+                "max_open": self.max_open,
+                "opened": self.opened,
+                "expired": self.expired,
+                "reexecutions": self.reexecutions,
+                "row_cap": RESULT_ROW_CAP,
+                "ttl_seconds": self.ttl_seconds,
+            }
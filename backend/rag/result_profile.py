@@ -0,0 +1,259 @@
+"""
+Per-column profile of a full query result, computed in one streaming pass.
+
+The insights prompt used to see only the first rows of a result, so for
+large results the insights described a sample, not the data. run_sql now
+feeds every fetched batch (the first page, then the rest of the cursor up
+to RESULT_PROFILE_MAX_ROWS) through a ResultProfiler without keeping the
+rows. Each batch is transposed into per-column NumPy arrays:
+
+- numeric: count, nulls, min, max, mean (running sum) and p5/p25/p50/p75/p95
+  from a uniform reservoir sample (random keys, kept with argpartition)
+- categorical: distinct count and top-k values (counts are exact until
+  RESULT_PROFILE_MAX_DISTINCT distinct values, approximate afterwards)
+- dates (ISO-8601 text): min/max range plus distinct days
+- identifiers (*_id / id): count, nulls and distinct count only
+
+The compact profile is returned as QueryResponse.profile and rendered into
+the insights prompts with render_profile().
+"""
+import os
+import re
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+RESULT_PROFILE_ENABLED = os.getenv("RESULT_PROFILE_ENABLED", "true").lower() == "true"
+RESULT_PROFILE_MAX_ROWS = int(os.getenv("RESULT_PROFILE_MAX_ROWS", "100000"))
+RESULT_PROFILE_TIMEOUT_S = float(os.getenv("RESULT_PROFILE_TIMEOUT_S", "2"))
+RESULT_PROFILE_RESERVOIR = int(os.getenv("RESULT_PROFILE_RESERVOIR", "4096"))
+RESULT_PROFILE_TOP_K = int(os.getenv("RESULT_PROFILE_TOP_K", "5"))
+RESULT_PROFILE_MAX_DISTINCT = int(os.getenv("RESULT_PROFILE_MAX_DISTINCT", "10000"))
+
+PERCENTILES = (5, 25, 50, 75, 95)
+FETCH_CHUNK = 1024
+
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?")
+
+
+def _is_identifier(name: str) -> bool:
+    lowered = name.lower()
+    return lowered == "id" or lowered.endswith("_id")
+
+
+def _round(value: float) -> float:
+    return float(f"{value:.6g}")
+
+
+class _Numeric:
+    def __init__(self, reservoir_size: int, rng: np.random.Generator):
+        self.count = 0
+        self.nulls = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.sum = 0.0
+        self.reservoir_size = reservoir_size
+        self.rng = rng
+        self.sample = np.empty(0, dtype=np.float64)
+        self.keys = np.empty(0, dtype=np.float64)
+        self.integral = True
+
+    def add(self, values: np.ndarray):
+        if not values.size:
+            return
+        self.count += values.size
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.sum += float(values.sum())
+        self.integral = self.integral and bool(np.all(np.mod(values, 1) == 0))
+        # Reservoir sample: every value gets a random key, the smallest keys survive
+        keys = self.rng.random(values.size)
+        self.sample = np.concatenate([self.sample, values])
+        self.keys = np.concatenate([self.keys, keys])
+        if self.sample.size > self.reservoir_size:
+            keep = np.argpartition(self.keys, self.reservoir_size - 1)[:self.reservoir_size]
+            self.sample = self.sample[keep]
+            self.keys = self.keys[keep]
+
+    def result(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"type": "numeric", "count": self.count, "nulls": self.nulls}
+        if not self.count:
+            return out
+        cast = int if self.integral else _round
+        out.update({"min": cast(self.min), "max": cast(self.max), "mean": _round(self.sum / self.count)})
+        values = np.percentile(self.sample, PERCENTILES)
+        out["percentiles"] = {f"p{p}": _round(v) for p, v in zip(PERCENTILES, values)}
+        out["percentiles_exact"] = self.count <= self.reservoir_size
+        return out
+
+
+class _Categorical:
+    def __init__(self, top_k: int, max_distinct: int):
+        self.count = 0
+        self.nulls = 0
+        self.top_k = top_k
+        self.max_distinct = max_distinct
+        self.counts: Counter = Counter()
+        self.approximate = False
+        self.date_min: Optional[str] = None
+        self.date_max: Optional[str] = None
+        self.dates = True
+
+    def add(self, values: np.ndarray):
+        if not values.size:
+            return
+        self.count += values.size
+        uniques, counts = np.unique(values.astype(str), return_counts=True)  # sorted
+        if self.dates:
+            low, high = str(uniques[0]), str(uniques[-1])
+            self.dates = bool(_ISO_DATE.match(low) and _ISO_DATE.match(high))
+            if self.dates:
+                self.date_min = low if self.date_min is None else min(self.date_min, low)
+                self.date_max = high if self.date_max is None else max(self.date_max, high)
+        self.counts.update(dict(zip(uniques.tolist(), counts.tolist())))
+        if len(self.counts) > self.max_distinct:
+            # Keep the heaviest half; later counts for dropped values are lower bounds
+            self.counts = Counter(dict(self.counts.most_common(self.max_distinct // 2)))
+            self.approximate = True
+
+    def result(self, identifier: bool = False) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"count": self.count, "nulls": self.nulls, "distinct": len(self.counts)}
+        if self.approximate:
+            out["distinct"] = max(len(self.counts), self.max_distinct)  # lower bound
+            out["distinct_approx"] = True
+        if self.dates and self.count:
+            out.update({"type": "date", "min": self.date_min, "max": self.date_max})
+            return out
+        out["type"] = "identifier" if identifier else "categorical"
+        if not identifier:
+            out["top"] = [[value, n] for value, n in self.counts.most_common(self.top_k)]
+        return out
+
+
+class ResultProfiler:
+    """Accumulates column statistics batch by batch."""
+
+    def __init__(
+        self,
+        columns: Sequence[str],
+        reservoir_size: int = RESULT_PROFILE_RESERVOIR,
+        top_k: int = RESULT_PROFILE_TOP_K,
+        max_distinct: int = RESULT_PROFILE_MAX_DISTINCT
+    ):
+        self.columns = list(columns)
+        self.rows = 0
+        self.complete = True
+        self._rng = np.random.default_rng()
+        self._reservoir_size = reservoir_size
+        self._top_k = top_k
+        self._max_distinct = max_distinct
+        self._stats: List[Optional[object]] = [None] * len(self.columns)
+        self._pending_nulls = [0] * len(self.columns)
+
+    def _column_stats(self, i: int, sample: Any):
+        """Pick the accumulator for column i from its first non-null value."""
+        if isinstance(sample, (int, float)) and not isinstance(sample, bool):
+            if _is_identifier(self.columns[i]):
+                stats = _Categorical(self._top_k, self._max_distinct)
+            else:
+                stats = _Numeric(self._reservoir_size, self._rng)
+        else:
+            stats = _Categorical(self._top_k, self._max_distinct)
+        stats.nulls = self._pending_nulls[i]
+        return stats
+
+    def add(self, rows: Sequence[Sequence[Any]]):
+        """Profile a batch of row tuples."""
+        if not rows:
+            return
+        self.rows += len(rows)
+        table = np.array(rows, dtype=object).reshape(len(rows), len(self.columns))
+        for i in range(len(self.columns)):
+            column = table[:, i]
+            present = column[np.not_equal(column, None)]
+            nulls = column.size - present.size
+            stats = self._stats[i]
+            if stats is None:
+                if not present.size:
+                    self._pending_nulls[i] += nulls
+                    continue
+                stats = self._stats[i] = self._column_stats(i, present[0])
+            else:
+                stats.nulls += nulls
+            if isinstance(stats, _Numeric):
+                try:
+                    values = present.astype(np.float64)
+                except (TypeError, ValueError):
+                    # Mixed types (SQLite is dynamically typed): profile what is numeric
+                    numeric = [v for v in present if isinstance(v, (int, float))]
+                    values = np.array(numeric, dtype=np.float64)
+                stats.add(values)
+            else:
+                stats.add(present)
+
+    def profile(self) -> Dict[str, Any]:
+        columns = {}
+        for i, name in enumerate(self.columns):
+            stats = self._stats[i]
+            if stats is None:
+                columns[name] = {"type": "empty", "count": 0, "nulls": self._pending_nulls[i]}
+            elif isinstance(stats, _Numeric):
+                columns[name] = stats.result()
+            else:
+                columns[name] = stats.result(identifier=_is_identifier(name))
+        return {"rows": self.rows, "complete": self.complete, "columns": columns}
+
+
+def profile_remaining(
+    cursor,
+    profiler: ResultProfiler,
+    max_rows: int = RESULT_PROFILE_MAX_ROWS,
+    timeout_s: float = RESULT_PROFILE_TIMEOUT_S
+):
+    """
+    Stream the rest of an open cursor through the profiler without keeping
+    rows. Stops (profile marked incomplete) at max_rows profiled rows, after
+    timeout_s, or if the statement is interrupted.
+    """
+    deadline = time.monotonic() + timeout_s
+    try:
+        while True:
+            if profiler.rows >= max_rows or time.monotonic() > deadline:
+                profiler.complete = not cursor.fetchmany(1)
+                return
+            batch = cursor.fetchmany(min(FETCH_CHUNK, max_rows - profiler.rows))
+            if not batch:
+                return
+            profiler.add(batch)
+    except Exception as e:
+        print(f"Warning: result profiling stopped early - {e}")
+        profiler.complete = False
+
+
+def render_profile(profile: Optional[Dict[str, Any]]) -> str:
+    """One line per column, for prompts."""
+    if not profile:
+        return ""
+    scope = "all" if profile["complete"] else "first"
+    lines = [f"Profile of {scope} {profile['rows']} rows:"]
+    for name, col in profile["columns"].items():
+        nulls = f", {col['nulls']} null" if col.get("nulls") else ""
+        kind = col["type"]
+        if kind == "numeric" and col["count"]:
+            p = col["percentiles"]
+            lines.append(
+                f"- {name} (numeric{nulls}): min {col['min']}, max {col['max']}, mean {col['mean']}, "
+                f"median {p['p50']}, p25 {p['p25']}, p75 {p['p75']}, p95 {p['p95']}"
+            )
+        elif kind == "date":
+            lines.append(f"- {name} (date{nulls}): {col['min']} to {col['max']}, {col['distinct']} distinct")
+        elif kind == "categorical":
+            top = ", ".join(f"{value} ({n})" for value, n in col["top"])
+            lines.append(f"- {name} (text{nulls}): {col['distinct']} distinct; top: {top}")
+        elif kind == "identifier":
+            lines.append(f"- {name} (id{nulls}): {col['distinct']} distinct")
+        else:
+            lines.append(f"- {name}: all null")
+    return "\n".join(lines)
@@ -1,14 +1,18 @@
 """
 SQL Query Buddy with Hybrid Memory System (Redis + Mem0).
 """
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import sqlite3
+import asyncio
+import hmac
+import json
 import os
 import time
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Dict, Optional
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_chroma import Chroma
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
@@ -16,22 +20,90 @@ from langchain_core.runnables import RunnablePassthrough
 
 # Import Hybrid Memory Manager (Redis + Mem0)
 from .redis_mem0_memory import HybridMemoryManager
+from .sql_cache import QuestionSQLCache
+from .result_cache import ResultCache
+from .db_pool import DB_PATH, all_pool_stats, get_pool
+from .result_cursors import RESULT_ROW_CAP, ResultCursorRegistry
+from .llm_clients import LLMClientRegistry
+from .embedding_cache import cached_openai_embeddings, get_embedding_store
+from .schema_index import SCHEMA_RETRIEVER_MODE, SchemaIndex
+from .sql_governor import (
+    SQL_MAX_ROWS, CancelScope, QueryAborted, QueryGovernor, fetch_governed
+)
+from .plan_analyzer import analyze_query_plan, format_optimization
+from .index_advisor import IndexAdvisor
+from .concurrency import DeadlineGather, gather_with_deadlines
+from .schema_version import VECTOR_DIR
+from .combined_analysis import (
+    ANALYSIS_MODE, ANALYSIS_MODES, combined_prompt, parse_analysis, response_format
+)
+from .metrics import (
+    RESPONSE_TIMINGS, RequestTrace, finish_trace, llm_config, record_gather_timings, stage_timer
+)
+from .sql_templates import TemplateFastPath
+from .sql_examples import VerifiedSQLIndex, format_examples
+from .result_profile import (
+    RESULT_PROFILE_ENABLED, RESULT_PROFILE_MAX_ROWS, ResultProfiler, profile_remaining, render_profile
+)
+from .prompt_budget import (
+    PROMPT_BUDGET_EXAMPLES, PROMPT_BUDGET_LONG_TERM, PROMPT_BUDGET_PROFILE, PROMPT_BUDGET_RESULTS,
+    PROMPT_BUDGET_SCHEMA, PROMPT_BUDGET_SHORT_TERM, PROMPT_PROFILE_SAMPLE_ROWS, PromptSection,
+    budget_sections, format_rows
+)
 
 load_dotenv()
 
-DB_PATH = "backend/db/retail.db"
-VECTOR_DIR = "backend/rag/vectorstore"
 router = APIRouter()
 
+# Analysis stage: explain/optimize/insights run concurrently, each with its own
+# timeout counted from when a worker starts the call; a call still waiting for
+# a free worker after ANALYSIS_QUEUE_TIMEOUT_S is given up
+ANALYSIS_TIMEOUT_S = float(os.getenv("ANALYSIS_TIMEOUT_S", "30"))
+ANALYSIS_QUEUE_TIMEOUT_S = float(os.getenv("ANALYSIS_QUEUE_TIMEOUT_S", "10"))
+ANALYSIS_MAX_WORKERS = int(os.getenv("ANALYSIS_MAX_WORKERS", "12"))
+analysis_executor = ThreadPoolExecutor(
+    max_workers=ANALYSIS_MAX_WORKERS,
+    thread_name_prefix="analysis"
+)
+
+# Context gathering: Redis, Mem0 and schema retrieval run concurrently, each
+# with its own deadline; a source that misses it is skipped
+CONTEXT_DEADLINE_SHORT_TERM_S = float(os.getenv("CONTEXT_DEADLINE_SHORT_TERM_S", "0.5"))
+CONTEXT_DEADLINE_LONG_TERM_S = float(os.getenv("CONTEXT_DEADLINE_LONG_TERM_S", "2"))
+CONTEXT_DEADLINE_SCHEMA_S = float(os.getenv("CONTEXT_DEADLINE_SCHEMA_S", "3"))
+CONTEXT_MAX_WORKERS = int(os.getenv("CONTEXT_MAX_WORKERS", "24"))
+context_executor = ThreadPoolExecutor(
+    max_workers=CONTEXT_MAX_WORKERS,
+    thread_name_prefix="context"
+)
+
+# Optimization tips come from EXPLAIN QUERY PLAN; the LLM only adds to them when enabled
+OPTIMIZATION_LLM_ENRICHMENT = os.getenv("OPTIMIZATION_LLM_ENRICHMENT", "false").lower() == "true"
+
+# How often /rag/query checks whether the client has gone away
+DISCONNECT_POLL_S = float(os.getenv("DISCONNECT_POLL_S", "0.25"))
+
 # Initialize components
-llm = ChatOpenAI(model_name="gpt-4", temperature=0)
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+# Chat clients are shared per (API key, model) so HTTP connections are reused
+llm_clients = LLMClientRegistry()
+embeddings = cached_openai_embeddings("text-embedding-3-large")
 vectorstore = Chroma(
     collection_name="schema_embeddings",
     embedding_function=embeddings,
     persist_directory=VECTOR_DIR
 )
 
+# In-process schema index (NumPy cosine / BM25); reloads when the schema is re-embedded
+schema_index = SchemaIndex(vectorstore, embeddings)
+if SCHEMA_RETRIEVER_MODE == "chroma":
+    schema_retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+else:
+    schema_retriever = schema_index.as_retriever(k=3)
+    try:
+        schema_index.reload()
+    except Exception as e:
+        print(f"Warning: schema index not loaded - {e}")
+
 # Initialize Hybrid Memory Manager (Redis + Mem0)
 try:
     hybrid_memory = HybridMemoryManager()
@@ -39,12 +111,51 @@ except Exception as e:
     print(f"Warning: Memory system not available - {e}")
     hybrid_memory = None
 
+# Question -> SQL cache (skips memory lookup, retrieval and the LLM on a hit)
+sql_cache = QuestionSQLCache()
+
+# SQL -> rows cache, invalidated whenever the database changes
+result_cache = ResultCache(DB_PATH)
+
+# Cursor tokens for results larger than RESULT_ROW_CAP
+result_cursors = ResultCursorRegistry(get_pool(DB_PATH))
+
+# Records executed SQL and proposes/benchmarks indexes for it (admin endpoints)
+index_advisor = IndexAdvisor(DB_PATH)
+
+# Simple single-table questions are answered from schema templates; a sample
+# is re-asked to the LLM in the background to measure agreement (schema only,
+# bypassing the SQL cache and memory)
+def shadow_generate_sql(question: str) -> str:
+    sql_query, _, _ = generate_sql_with_hybrid_memory(
+        question, "template-shadow", "template-shadow", fast_paths=False
+    )
+    return sql_query
+
+def shadow_rows(query: str) -> List[tuple]:
+    governor = QueryGovernor()
+    with get_pool(DB_PATH).connection() as conn, governor.attach(conn):
+        cursor = conn.execute(query)
+        rows = fetch_governed(cursor, governor, SQL_MAX_ROWS)
+        cursor.close()
+    return rows
+
+sql_templates = TemplateFastPath(DB_PATH, shadow_generate_sql, shadow_rows)
+
+# SQL that executed successfully, reused for paraphrased questions or shown as
+# examples; reuse also requires the same sampled column values (template lexicon)
+sql_examples = VerifiedSQLIndex(embeddings, value_terms=sql_templates.value_terms)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
 # Request/Response models
 class QueryRequest(BaseModel):
     question: str
     session_id: Optional[str] = "default"
     user_id: Optional[str] = "anonymous"
     api_key: Optional[str] = None  # Allow users to provide their own OpenAI API key
+    enrich_optimization: Optional[bool] = None  # Overrides OPTIMIZATION_LLM_ENRICHMENT
+    include_timings: Optional[bool] = None  # Overrides RESPONSE_TIMINGS
+    analysis_mode: Optional[str] = None  # "separate" | "combined"; overrides ANALYSIS_MODE
 
 class QueryResponse(BaseModel):
     sql: str
@@ -53,7 +164,14 @@ class QueryResponse(BaseModel):
     explanation: str
     optimization: str
     execution_time_ms: float
+    truncated: bool = False
+    cursor: Optional[str] = None  # Pass to /rag/query/cursor/{cursor} for more rows
+    abort: Optional[Dict[str, Any]] = None  # Set when the execution governor stopped the query
     memory_context: Optional[Dict[str, str]] = {}
+    context_timings: Optional[Dict[str, Dict[str, Any]]] = None  # Per-source {"ms", "status"}
+    timings: Optional[Dict[str, Any]] = None  # Per-stage ms and LLM tokens (include_timings)
+    profile: Optional[Dict[str, Any]] = None  # Per-column statistics over the whole result
+    cache: Optional[Dict[str, Any]] = {}
 
 # Helper functions
 def format_docs(docs):
@@ -62,55 +180,281 @@ def format_docs(docs):
         for doc in docs
     ])
 
-def run_sql(query: str) -> tuple[List[Dict], float]:
+def run_sql(query: str, scope: Optional[CancelScope] = None) -> tuple[List[Dict], float, Dict[str, Any]]:
+    """
+    Execute SQL under the execution governor and return
+    (rows, execution_time_ms, meta).
+
+    At most RESULT_ROW_CAP rows are returned; meta["truncated"] and
+    meta["cursor"] tell the caller how to fetch the rest.
+    meta["cache_hit"] / meta["cache_age_s"] report result-cache usage.
+    meta["abort"] describes the limit hit if the governor stopped the query.
+    meta["profile"] holds per-column statistics over the whole result (not
+    just the returned rows), computed while streaming the rest of the cursor.
+    """
+    cached = result_cache.get(query)
+    if cached is not None:
+        cursor_token = None
+        if cached["truncated"]:
+            cursor_token = result_cursors.open(
+                query, position=len(cached["rows"]), columns=cached["columns"]
+            )
+        return cached["rows"], cached["execution_time_ms"], {
+            "cache_hit": True,
+            "cache_age_s": cached["age_s"],
+            "truncated": cached["truncated"],
+            "cursor": cursor_token,
+            "profile": cached["profile"]
+        }
+
     try:
+        version = result_cache.version()
         start_time = time.time()
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(query)
-        columns = [desc[0] for desc in cursor.description] if cursor.description else []
-        rows = cursor.fetchall()
-        conn.close()
-        execution_time = (time.time() - start_time) * 1000
-        return [dict(zip(columns, row)) for row in rows], execution_time
+        row_cap = min(RESULT_ROW_CAP, SQL_MAX_ROWS)
+        governor = QueryGovernor(scope=scope)
+        with get_pool(DB_PATH).connection() as conn, governor.attach(conn):
+            cursor = conn.execute(query)
+            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+            rows = fetch_governed(cursor, governor, row_cap + 1)
+            execution_time = (time.time() - start_time) * 1000
+            profile = None
+            if RESULT_PROFILE_ENABLED and columns:
+                # One pass: the page already fetched, then the rest of the
+                # cursor without keeping it (later pages re-execute anyway)
+                profiler = ResultProfiler(columns)
+                profiler.add(rows)
+                if len(rows) > row_cap:
+                    profile_remaining(cursor, profiler, RESULT_PROFILE_MAX_ROWS)
+                profile = profiler.profile()
+            cursor.close()
+
+        truncated = len(rows) > row_cap
+        results = [dict(zip(columns, row)) for row in rows[:row_cap]]
+        result_cache.put(
+            query, results, execution_time, version, truncated=truncated, profile=profile, columns=columns
+        )
+        index_advisor.record(query, execution_time)
+        cursor_token = (
+            result_cursors.open(query, position=len(results), columns=columns) if truncated else None
+        )
+        return results, execution_time, {
+            "cache_hit": False,
+            "truncated": truncated,
+            "cursor": cursor_token,
+            "profile": profile
+        }
+    except QueryAborted as aborted:
+        return [{"error": str(aborted)}], aborted.elapsed_ms, {
+            "cache_hit": False,
+            "truncated": False,
+            "cursor": None,
+            "abort": aborted.to_dict()
+        }
     except Exception as e:
-        return [{"error": str(e)}], 0.0
+        return [{"error": str(e)}], 0.0, {"cache_hit": False, "truncated": False, "cursor": None}
+
+# Context sources (each runs on context_executor)
+def fetch_short_term(session_id: str) -> str:
+    if not hybrid_memory:
+        return ""
+    return hybrid_memory.get_short_term_context(session_id, limit=3)
+
+def fetch_long_term(question: str, user_id: str) -> str:
+    if not hybrid_memory:
+        return ""
+    return hybrid_memory.search_long_term(question, user_id, limit=2)
+
+def fetch_schema_context(question: str) -> str:
+    return format_docs(schema_retriever.invoke(question))
+
+def lexical_schema_context(question: str) -> str:
+    """Local BM25 schema lookup, used when retrieval misses its deadline."""
+    try:
+        return format_docs(schema_index.search(question, k=3, mode="bm25"))
+    except Exception as e:
+        print(f"Warning: lexical schema fallback failed - {e}")
+        return ""
+
+def remember_verified_sql(question: str, sql_query: str):
+    try:
+        sql_examples.add(question, sql_query)
+    except Exception as e:
+        print(f"Warning: could not index verified SQL - {e}")
+
+def record_sql_outcome(
+    question: str,
+    sql_query: str,
+    generation: Dict[str, Any],
+    failed: bool,
+    run_meta: Dict[str, Any]
+):
+    """
+    Feed the execution outcome back into the SQL cache and verified-SQL index.
+    A governor abort (client disconnect, time or row limit, busy database)
+    says nothing about the SQL itself, so it is neither discarded nor indexed.
+    """
+    if run_meta.get("abort"):
+        return
+    if failed:
+        # Never serve SQL that failed to execute again
+        sql_cache.discard(generation["cache_key"])
+        if generation["source"] == "similar":
+            sql_examples.discard_sql(sql_query)
+    elif generation["source"] == "llm" and generation["standalone"]:
+        # SQL written with conversation context in the prompt may depend on it
+        context_executor.submit(remember_verified_sql, question, sql_query)
+
+NO_EXAMPLES = {"reuse": None, "examples": []}
 
 # SQL Generation with Hybrid Memory (Redis + Mem0)
 def generate_sql_with_hybrid_memory(
     question: str,
     session_id: str,
     user_id: str,
-    api_key: Optional[str] = None
-) -> tuple[str, Dict[str, str]]:
-    """Generate SQL using RAG + Hybrid Memory (Redis short-term + Mem0 long-term)."""
+    api_key: Optional[str] = None,
+    trace: Optional[RequestTrace] = None,
+    fast_paths: bool = True
+) -> tuple[str, Dict[str, str], Dict[str, Any]]:
+    """
+    Generate SQL using RAG + Hybrid Memory (Redis short-term + Mem0 long-term).
 
-    # Create LLM instance with provided API key or use default
-    if api_key:
-        query_llm = ChatOpenAI(model_name="gpt-4", temperature=0, openai_api_key=api_key)
-    else:
-        query_llm = llm  # Use global instance
+    Simple standalone questions that a schema template understands fully are
+    answered without memory lookups or the LLM. Otherwise short-term memory,
+    long-term memory, schema retrieval and the verified-SQL index are queried
+    concurrently; a close enough paraphrase of a verified question reuses its
+    SQL, weaker matches become few-shot examples in the prompt. Returns the
+    SQL, the memory contexts and generation info
+    ({"source": "template" | "cache" | "similar" | "llm", "cache_key": ...,
+    "standalone": no short-term context, "timings": {...}}). fast_paths=False
+    (template shadow checks) asks the LLM with the schema alone: no template,
+    SQL cache, verified SQL or Redis/Mem0 lookups, and nothing is cached.
+    Stage timings and token counts go to `trace` when one is given.
+    """
+    if fast_paths:
+        with stage_timer("template_match", trace):
+            match = sql_templates.try_match(question)
+        if match is not None:
+            memory_contexts = {
+                "short_term": "Skipped (template match)",
+                "long_term": "Skipped (template match)",
+                "combined": "No relevant context found."
+            }
+            return match["sql"], memory_contexts, {
+                "source": "template", "cache_key": None, "standalone": True, "timings": {}
+            }
+
+    # Shared LLM client for the provided API key (or the default one)
+    query_llm = llm_clients.get(api_key)
+
+    sources = {
+        "schema": (fetch_schema_context, (question,), CONTEXT_DEADLINE_SCHEMA_S, None),
+    }
+    if fast_paths:
+        sources["short_term"] = (fetch_short_term, (session_id,), CONTEXT_DEADLINE_SHORT_TERM_S, "")
+        sources["long_term"] = (fetch_long_term, (question, user_id), CONTEXT_DEADLINE_LONG_TERM_S, "")
+        sources["examples"] = (sql_examples.search, (question,), CONTEXT_DEADLINE_SCHEMA_S, NO_EXAMPLES)
+    context = DeadlineGather(context_executor, sources)
 
-    # Get combined context from both Redis and Mem0
+    # Short-term context is part of the cache key, so it is awaited first.
+    # Without it a follow-up could match a standalone question, so skip the cache.
+    short_term = context.result("short_term") if fast_paths else ""
+    short_term_ok = not fast_paths or context.timings["short_term"]["status"] == "ok"
+    cache_key = None
+    # Verified SQL is only reused for, and learned from, questions asked
+    # without any conversation before them (see record_sql_outcome)
+    standalone = short_term_ok and not short_term
+    if fast_paths and short_term_ok:
+        with stage_timer("sql_cache", trace):
+            cache_key = sql_cache.make_key(question, short_term)
+            cached_sql = sql_cache.get(cache_key)
+        if cached_sql is not None:
+            for name in ("long_term", "schema", "examples"):
+                if name in sources:
+                    context.abandon(name)
+            record_gather_timings(context.timings, trace, prefix="context_")
+            memory_contexts = {
+                "short_term": short_term or "No recent conversation",
+                "long_term": "Skipped (SQL cache hit)",
+                "combined": short_term or "No relevant context found."
+            }
+            return cached_sql, memory_contexts, {
+                "source": "cache", "cache_key": cache_key, "standalone": standalone,
+                "timings": context.timings
+            }
+
+    # A verified paraphrase makes retrieval and the LLM unnecessary
+    similar = context.result("examples") if fast_paths else NO_EXAMPLES
+    if similar["reuse"] is not None and not standalone:
+        # The stored SQL may have been written for another conversation
+        similar = sql_examples.demote(similar)
+    if similar["reuse"] is not None:
+        context.abandon("long_term")
+        context.abandon("schema")
+        record_gather_timings(context.timings, trace, prefix="context_")
+        reuse = similar["reuse"]
+        memory_contexts = {
+            "short_term": short_term or "No recent conversation",
+            "long_term": f"Skipped (reused SQL of \"{reuse['question']}\", similarity {reuse['similarity']})",
+            "combined": short_term or "No relevant context found."
+        }
+        if cache_key is not None:
+            sql_cache.put(cache_key, reuse["sql"])
+        return reuse["sql"], memory_contexts, {
+            "source": "similar", "cache_key": cache_key, "standalone": standalone,
+            "timings": context.timings
+        }
+
+    context.collect()
+    record_gather_timings(context.timings, trace, prefix="context_")
+    schema_context = context.results["schema"]
+    if schema_context is None:
+        with stage_timer("context_schema_lexical", trace):
+            schema_context = lexical_schema_context(question)
+
+    # Combine Redis and Mem0 context, marking sources that were skipped
+    long_term = context.results.get("long_term", "")
     memory_contexts = {}
-    if hybrid_memory:
-        memory_contexts = hybrid_memory.get_combined_context(
-            question=question,
-            session_id=session_id,
-            user_id=user_id
-        )
+    if hybrid_memory and fast_paths:
+        memory_contexts = hybrid_memory.combine_contexts(short_term, long_term)
+        for name, label, deadline in (
+            ("short_term", "Redis", CONTEXT_DEADLINE_SHORT_TERM_S),
+            ("long_term", "Mem0", CONTEXT_DEADLINE_LONG_TERM_S),
+        ):
+            status = context.timings[name]["status"]
+            if status == "timeout":
+                memory_contexts[name] = f"Skipped ({label} missed its {deadline:g}s deadline)"
+            elif status == "error":
+                memory_contexts[name] = f"Skipped ({label} unavailable)"
 
-    combined_context = memory_contexts.get("combined", "")
+    # Each context section gets a token budget; when the prompt is still too
+    # large the lowest priority section (highest number) is trimmed first
+    sections = budget_sections("generate_sql", [
+        PromptSection("question", question),
+        PromptSection("schema", schema_context, PROMPT_BUDGET_SCHEMA, priority=1),
+        PromptSection(
+            "short_term", short_term, PROMPT_BUDGET_SHORT_TERM, priority=2, keep="tail", pin_first=True
+        ),
+        PromptSection("examples", format_examples(similar["examples"]), PROMPT_BUDGET_EXAMPLES, priority=3),
+        PromptSection(
+            "long_term", long_term, PROMPT_BUDGET_LONG_TERM, priority=4,
+            separator="\n", pin_first=True
+        ),
+    ])
+    schema_context = sections["schema"]
+    examples = sections["examples"]
+    combined_context = "\n\n".join(
+        part for part in (sections["short_term"], sections["long_term"]) if part
+    )
 
-    # Get schema context via RAG
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-    
     # Enhanced prompt
     template = """You are a SQL expert for a SQLite retail database.
 
 DATABASE SCHEMA (Retrieved via RAG):
 {schema_context}
-
+""" + ("""
+VERIFIED EXAMPLES (similar questions whose SQL ran successfully):
+{examples}
+""" if examples else "") + """
 MEMORY CONTEXT:
 {memory_context}
 
@@ -128,7 +472,8 @@ SQL Query:"""
     
     rag_chain = (
         {
-            "schema_context": retriever | format_docs,
+            "schema_context": lambda _: schema_context,
+            "examples": lambda _: examples,
             "memory_context": lambda _: combined_context if combined_context else "No relevant context.",
             "question": RunnablePassthrough()
         }
@@ -137,7 +482,8 @@ SQL Query:"""
         | StrOutputParser()
     )
     
-    sql_query = rag_chain.invoke(question).strip()
+    with stage_timer("generate_sql", trace):
+        sql_query = rag_chain.invoke(question, config=llm_config("generate_sql", trace)).strip()
     
     # Clean SQL
     for prefix in ["```sql", "```"]:
@@ -145,74 +491,324 @@ SQL Query:"""
             sql_query = sql_query[len(prefix):]
     if sql_query.endswith("```"):
         sql_query = sql_query[:-3]
-    
-    return sql_query.strip(), memory_contexts
+    sql_query = sql_query.strip()
 
-# Analysis functions
-def explain_sql(sql_query: str, question: str, api_key: Optional[str] = None) -> str:
-    try:
-        analysis_llm = ChatOpenAI(model_name="gpt-4", temperature=0, openai_api_key=api_key) if api_key else llm
-        prompt = f"""Explain this SQL in simple terms.
+    if cache_key is not None:
+        sql_cache.put(cache_key, sql_query)
+    return sql_query, memory_contexts, {
+        "source": "llm", "cache_key": cache_key, "standalone": standalone,
+        "timings": context.timings
+    }
+
+# Analysis prompts (shared by the blocking and streaming endpoints)
+def explain_prompt(sql_query: str, question: str) -> str:
+    return f"""Explain this SQL in simple terms.
 SQL: {sql_query}
 Question: {question}
 2-3 sentences for beginners."""
-        return analysis_llm.invoke(prompt).content
-    except:
-        return "Unable to explain."
 
-def suggest_optimizations(sql_query: str, execution_time: float, result_count: int, api_key: Optional[str] = None) -> str:
-    try:
-        analysis_llm = ChatOpenAI(model_name="gpt-4", temperature=0, openai_api_key=api_key) if api_key else llm
-        prompt = f"""Suggest optimizations.
+def optimization_prompt(sql_query: str, execution_time: float, result_count: int, plan_report: str) -> str:
+    return f"""Review this SQLite query plan analysis.
 SQL: {sql_query}
 Time: {execution_time:.2f}ms
 Rows: {result_count}
-2-3 tips."""
-        return analysis_llm.invoke(prompt).content
+Analyzer: {plan_report}
+Add 1-2 tips the analyzer missed, or say it is complete."""
+
+def insights_prompt(results: List[Dict], question: str, profile: Optional[Dict[str, Any]] = None) -> str:
+    """With a profile the statistics describe the whole result; rows are only a sample."""
+    if profile is None:
+        rows = format_rows(results)
+    else:
+        rows = format_rows(results, max_rows=PROMPT_PROFILE_SAMPLE_ROWS, total=profile["rows"])
+    sections = budget_sections("insights", [
+        PromptSection("question", question),
+        PromptSection(
+            "profile", render_profile(profile), PROMPT_BUDGET_PROFILE, priority=1,
+            separator="\n", pin_first=True
+        ),
+        PromptSection("results", rows, PROMPT_BUDGET_RESULTS, priority=2, separator="\n", pin_first=True),
+    ])
+    if sections["profile"]:
+        return f"""Analyze these results.
+Question: {question}
+{sections["profile"]}
+Sample rows:
+{sections["results"]}
+Provide key insights about the whole result, not just the sample."""
+    return f"""Analyze these results.
+Question: {question}
+Results ({len(results)} rows):
+{sections["results"]}
+Provide key insights."""
+
+# Analysis functions
+def explain_sql(
+    sql_query: str,
+    question: str,
+    api_key: Optional[str] = None,
+    trace: Optional[RequestTrace] = None
+) -> str:
+    try:
+        analysis_llm = llm_clients.get(api_key)
+        prompt = explain_prompt(sql_query, question)
+        return analysis_llm.invoke(prompt, config=llm_config("explanation", trace)).content
     except:
-        return "Query is already optimized."
+        return "Unable to explain."
 
-def generate_insights(results: List[Dict], question: str, sql_query: str, api_key: Optional[str] = None) -> str:
+def analyze_plan(
+    sql_query: str,
+    execution_time: float,
+    result_count: int,
+    trace: Optional[RequestTrace] = None
+) -> str:
+    """Deterministic optimization tips from EXPLAIN QUERY PLAN (no LLM call)."""
+    try:
+        with stage_timer("plan_analysis", trace), get_pool(DB_PATH).connection() as conn:
+            governor = QueryGovernor()
+            with governor.attach(conn):
+                analysis = analyze_query_plan(conn, sql_query)
+        return format_optimization(analysis, execution_time, result_count)
+    except Exception as e:
+        print(f"Warning: query plan analysis failed - {e}")
+        return "Query plan unavailable."
+
+def suggest_optimizations(
+    sql_query: str,
+    execution_time: float,
+    result_count: int,
+    api_key: Optional[str] = None,
+    enrich: bool = False,
+    trace: Optional[RequestTrace] = None
+) -> str:
+    report = analyze_plan(sql_query, execution_time, result_count, trace)
+    if not enrich:
+        return report
+    return enrich_plan_report(sql_query, execution_time, result_count, report, api_key, trace)
+
+def enrich_plan_report(
+    sql_query: str,
+    execution_time: float,
+    result_count: int,
+    report: str,
+    api_key: Optional[str] = None,
+    trace: Optional[RequestTrace] = None
+) -> str:
+    """Append LLM tips to a plan report (the report alone if the call fails)."""
+    try:
+        analysis_llm = llm_clients.get(api_key)
+        prompt = optimization_prompt(sql_query, execution_time, result_count, report)
+        enrichment = analysis_llm.invoke(prompt, config=llm_config("optimization", trace)).content
+        return f"{report}\n\n{enrichment}"
+    except:
+        return report
+
+def wants_enrichment(req: QueryRequest) -> bool:
+    if req.enrich_optimization is not None:
+        return req.enrich_optimization
+    return OPTIMIZATION_LLM_ENRICHMENT
+
+def requested_analysis_mode(req: QueryRequest) -> str:
+    if req.analysis_mode in ANALYSIS_MODES:
+        return req.analysis_mode
+    return ANALYSIS_MODE
+
+def wants_timings(req: QueryRequest) -> bool:
+    if req.include_timings is not None:
+        return req.include_timings
+    return RESPONSE_TIMINGS
+
+def generate_insights(
+    results: List[Dict],
+    question: str,
+    sql_query: str,
+    api_key: Optional[str] = None,
+    trace: Optional[RequestTrace] = None,
+    profile: Optional[Dict[str, Any]] = None
+) -> str:
     try:
         if not results:
             return "No results found."
         if "error" in results[0]:
             return f"Error: {results[0]['error']}"
 
-        analysis_llm = ChatOpenAI(model_name="gpt-4", temperature=0, openai_api_key=api_key) if api_key else llm
-        sample = results[:10]
-        prompt = f"""Analyze these results.
-Question: {question}
-Results ({len(results)} rows): {sample}
-Provide key insights."""
-        return analysis_llm.invoke(prompt).content
+        analysis_llm = llm_clients.get(api_key)
+        prompt = insights_prompt(results, question, profile)
+        return analysis_llm.invoke(prompt, config=llm_config("insights", trace)).content
     except:
         return "Unable to generate insights."
 
+def run_analysis(
+    sql_query: str,
+    question: str,
+    results: List[Dict],
+    execution_time: float,
+    api_key: Optional[str] = None,
+    enrich_optimization: bool = False,
+    trace: Optional[RequestTrace] = None,
+    mode: str = ANALYSIS_MODE,
+    profile: Optional[Dict[str, Any]] = None
+) -> Dict[str, str]:
+    """
+    Run explain_sql, suggest_optimizations and generate_insights concurrently.
+    A call that misses ANALYSIS_TIMEOUT_S is replaced by a degraded value so
+    the other fields are still returned. mode="combined" makes one LLM call
+    for all fields instead (see run_combined_analysis). `profile` (from
+    run_sql) gives the insights statistics over the whole result.
+    """
+    if mode == "combined":
+        return run_combined_analysis(
+            sql_query, question, results, execution_time, api_key, enrich_optimization, trace, profile
+        )
+    tasks = {
+        "explanation": (
+            explain_sql, (sql_query, question, api_key, trace),
+            ANALYSIS_TIMEOUT_S, "Explanation unavailable (timed out)."
+        ),
+        "optimization": (
+            suggest_optimizations,
+            (sql_query, execution_time, len(results), api_key, enrich_optimization, trace),
+            ANALYSIS_TIMEOUT_S, "Optimization tips unavailable (timed out)."
+        ),
+        "insights": (
+            generate_insights, (results, question, sql_query, api_key, trace, profile),
+            ANALYSIS_TIMEOUT_S, "Insights unavailable (timed out)."
+        ),
+    }
+    analysis, timings = gather_with_deadlines(analysis_executor, tasks, ANALYSIS_QUEUE_TIMEOUT_S)
+    record_gather_timings(timings, trace)
+    return analysis
+
+def run_combined_analysis(
+    sql_query: str,
+    question: str,
+    results: List[Dict],
+    execution_time: float,
+    api_key: Optional[str] = None,
+    enrich_optimization: bool = False,
+    trace: Optional[RequestTrace] = None,
+    profile: Optional[Dict[str, Any]] = None
+) -> Dict[str, str]:
+    """
+    One structured LLM call returning every analysis field. Fields missing
+    from the response or failing to parse are retried individually with the
+    single-field prompts; a timed-out call is not retried.
+    """
+    plan_report = analyze_plan(sql_query, execution_time, len(results), trace)
+    analysis = {"optimization": plan_report}
+    fields = ["explanation"]
+    if enrich_optimization:
+        fields.append("optimization")
+    if not results:
+        analysis["insights"] = "No results found."
+    elif "error" in results[0]:
+        analysis["insights"] = f"Error: {results[0]['error']}"
+    else:
+        fields.append("insights")
+
+    def call_combined() -> str:
+        analysis_llm = llm_clients.get(api_key)
+        constraint = response_format(fields)
+        if constraint is not None:
+            analysis_llm = analysis_llm.bind(response_format=constraint)
+        prompt = combined_prompt(
+            sql_query, question, results, execution_time, fields, plan_report, profile
+        )
+        return analysis_llm.invoke(prompt, config=llm_config("combined", trace)).content
+
+    response, timings = gather_with_deadlines(analysis_executor, {
+        "combined": (call_combined, (), ANALYSIS_TIMEOUT_S, "")
+    }, ANALYSIS_QUEUE_TIMEOUT_S)
+    record_gather_timings(timings, trace)
+    if timings["combined"]["status"] == "timeout":
+        analysis.setdefault("insights", "Insights unavailable (timed out).")
+        analysis.setdefault("explanation", "Explanation unavailable (timed out).")
+        return analysis
+
+    parsed, missing = parse_analysis(response["combined"], fields)
+    if "optimization" in parsed:
+        analysis["optimization"] = f"{plan_report}\n\n{parsed.pop('optimization')}"
+    analysis.update(parsed)
+    if not missing:
+        return analysis
+
+    print(f"Warning: combined analysis retrying {', '.join(missing)}")
+    retries = {
+        "explanation": (
+            explain_sql, (sql_query, question, api_key, trace),
+            ANALYSIS_TIMEOUT_S, "Explanation unavailable (timed out)."
+        ),
+        "optimization": (
+            enrich_plan_report,
+            (sql_query, execution_time, len(results), plan_report, api_key, trace),
+            ANALYSIS_TIMEOUT_S, plan_report
+        ),
+        "insights": (
+            generate_insights, (results, question, sql_query, api_key, trace, profile),
+            ANALYSIS_TIMEOUT_S, "Insights unavailable (timed out)."
+        ),
+    }
+    retried, timings = gather_with_deadlines(
+        analysis_executor, {field: retries[field] for field in missing}, ANALYSIS_QUEUE_TIMEOUT_S
+    )
+    record_gather_timings(timings, trace, prefix="retry_")
+    analysis.update(retried)
+    return analysis
+
 # Main endpoint with Hybrid Memory
 @router.post("/query", response_model=QueryResponse)
-def query_rag(req: QueryRequest):
+async def query_rag(req: QueryRequest, request: Request):
     """
     Enhanced endpoint with Hybrid Memory System (Redis + Mem0).
+    The pipeline runs in the threadpool; if the client disconnects, the
+    running SQL statement is interrupted and remaining stages are skipped.
     """
+    scope = CancelScope()
+    pipeline = asyncio.ensure_future(run_in_threadpool(run_query_pipeline, req, scope))
+    while True:
+        done, _ = await asyncio.wait({pipeline}, timeout=DISCONNECT_POLL_S)
+        if done:
+            return pipeline.result()
+        if await request.is_disconnected():
+            scope.cancel()
+            return await pipeline
+
+def run_query_pipeline(req: QueryRequest, scope: Optional[CancelScope] = None) -> QueryResponse:
+    """Generate, execute and analyze SQL for one question (blocking)."""
+    trace = RequestTrace()
+    include_timings = wants_timings(req)
     try:
         session_id = req.session_id or "default"
         user_id = req.user_id or "anonymous"
         api_key = req.api_key  # Get API key from request
 
         # 1. Generate SQL with Hybrid Memory context
-        sql_query, memory_contexts = generate_sql_with_hybrid_memory(
-            req.question, session_id, user_id, api_key
+        sql_query, memory_contexts, generation = generate_sql_with_hybrid_memory(
+            req.question, session_id, user_id, api_key, trace
         )
+        cache_info = {
+            "sql": {
+                "hit": generation["source"] == "cache",
+                "source": generation["source"],
+                **sql_cache.stats()
+            }
+        }
 
         # 2. Execute SQL
-        results, execution_time = run_sql(sql_query)
+        with stage_timer("execute_sql", trace):
+            results, execution_time, run_meta = run_sql(sql_query, scope)
+        cache_info["result"] = {
+            "hit": run_meta["cache_hit"],
+            "age_s": run_meta.get("cache_age_s"),
+            **result_cache.stats()
+        }
 
         # 3. Check for errors
         has_error = False
         if results and "error" in results[0]:
             has_error = True
 
+        record_sql_outcome(req.question, sql_query, generation, has_error, run_meta)
         if has_error:
             return QueryResponse(
                 sql=sql_query,
@@ -221,25 +817,49 @@ def query_rag(req: QueryRequest):
                 explanation="SQL execution error.",
                 optimization="Fix syntax first.",
                 execution_time_ms=execution_time,
-                memory_context=memory_contexts
+                abort=run_meta.get("abort"),
+                memory_context=memory_contexts,
+                context_timings=generation["timings"],
+                timings=finish_trace(trace, "/rag/query", "sql_error", include_timings),
+                cache=cache_info
             )
 
-        # 4. Generate analysis
-        explanation = explain_sql(sql_query, req.question, api_key)
-        optimization = suggest_optimizations(sql_query, execution_time, len(results), api_key)
-        insights = generate_insights(results, req.question, sql_query, api_key)
-        
+        if scope is not None and scope.cancelled:
+            # Client is gone; don't spend LLM calls on analysis nobody will read
+            return QueryResponse(
+                sql=sql_query,
+                results=results,
+                insights="Cancelled.",
+                explanation="Cancelled.",
+                optimization="Cancelled.",
+                execution_time_ms=execution_time,
+                memory_context=memory_contexts,
+                context_timings=generation["timings"],
+                timings=finish_trace(trace, "/rag/query", "cancelled", include_timings),
+                cache=cache_info
+            )
+
+        # 4. Generate analysis (concurrently)
+        analysis = run_analysis(
+            sql_query, req.question, results, execution_time, api_key,
+            wants_enrichment(req), trace, requested_analysis_mode(req), run_meta.get("profile")
+        )
+        explanation = analysis["explanation"]
+        optimization = analysis["optimization"]
+        insights = analysis["insights"]
+
         # 5. Store in BOTH Redis (short-term) AND Mem0 (long-term)
         if hybrid_memory:
             try:
-                hybrid_memory.store_interaction(
-                    question=req.question,
-                    sql=sql_query,
-                    results=results,
-                    insights=insights,
-                    user_id=user_id,
-                    session_id=session_id
-                )
+                with stage_timer("memory_write", trace):
+                    hybrid_memory.store_interaction(
+                        question=req.question,
+                        sql=sql_query,
+                        results=results,
+                        insights=insights,
+                        user_id=user_id,
+                        session_id=session_id
+                    )
             except Exception as mem_error:
                 print(f"Warning: Error storing memory: {mem_error}")
         
@@ -250,7 +870,13 @@ def query_rag(req: QueryRequest):
             explanation=explanation,
             optimization=optimization,
             execution_time_ms=execution_time,
-            memory_context=memory_contexts
+            truncated=run_meta["truncated"],
+            cursor=run_meta["cursor"],
+            profile=run_meta.get("profile"),
+            memory_context=memory_contexts,
+            context_timings=generation["timings"],
+            timings=finish_trace(trace, "/rag/query", "ok", include_timings),
+            cache=cache_info
         )
         
     except Exception as e:
@@ -265,23 +891,339 @@ def query_rag(req: QueryRequest):
             explanation=str(e),
             optimization="N/A",
             execution_time_ms=0.0,
-            memory_context={}
+            memory_context={},
+            timings=finish_trace(trace, "/rag/query", "error", include_timings)
         )
 
+# Server-sent events variant
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def stream_analysis_field(
+    name: str,
+    prompt: str,
+    fallback: str,
+    api_key: Optional[str],
+    queue: "asyncio.Queue",
+    trace: Optional[RequestTrace] = None
+):
+    """Stream one analysis call's tokens onto the queue, then post the full text."""
+    parts = []
+
+    async def consume():
+        stream = llm_clients.get(api_key).astream(prompt, config=llm_config(name, trace))
+        async for chunk in stream:
+            if chunk.content:
+                parts.append(chunk.content)
+                await queue.put((name, "delta", chunk.content))
+
+    try:
+        with stage_timer(name, trace):
+            await asyncio.wait_for(consume(), timeout=ANALYSIS_TIMEOUT_S)
+        text = "".join(parts)
+    except asyncio.TimeoutError:
+        print(f"Warning: {name} stream timed out after {ANALYSIS_TIMEOUT_S:.0f}s")
+        text = "".join(parts) + " (timed out)" if parts else f"{name.capitalize()} unavailable (timed out)."
+    except Exception as e:
+        print(f"Warning: {name} stream failed: {e}")
+        text = "".join(parts) or fallback
+    await queue.put((name, "done", text))
+
+@router.post("/query/stream")
+async def query_rag_stream(req: QueryRequest):
+    """
+    Streaming /rag/query. Sends SSE events in order:
+    `sql`, `results`, then `explanation` / `optimization` / `insights` token
+    deltas as they are produced, and finally `done` with the same payload as
+    QueryResponse (or `error`). With analysis_mode "combined" the analysis is
+    one structured LLM call, so each field arrives as a single delta once
+    that call has been parsed.
+    """
+    session_id = req.session_id or "default"
+    user_id = req.user_id or "anonymous"
+    api_key = req.api_key
+
+    scope = CancelScope()
+    trace = RequestTrace()
+    include_timings = wants_timings(req)
+
+    async def events():
+        tasks = []
+        try:
+            # 1. SQL as soon as it is generated
+            sql_query, memory_contexts, generation = await run_in_threadpool(
+                generate_sql_with_hybrid_memory, req.question, session_id, user_id, api_key, trace
+            )
+            cache_info = {
+                "sql": {
+                    "hit": generation["source"] == "cache",
+                    "source": generation["source"],
+                    **sql_cache.stats()
+                }
+            }
+            yield sse_event("sql", {
+                "sql": sql_query,
+                "memory_context": memory_contexts,
+                "context_timings": generation["timings"]
+            })
+
+            # 2. Rows
+            with stage_timer("execute_sql", trace):
+                results, execution_time, run_meta = await run_in_threadpool(run_sql, sql_query, scope)
+            cache_info["result"] = {
+                "hit": run_meta["cache_hit"],
+                "age_s": run_meta.get("cache_age_s"),
+                **result_cache.stats()
+            }
+            yield sse_event("results", {
+                "results": results,
+                "execution_time_ms": execution_time,
+                "truncated": run_meta["truncated"],
+                "cursor": run_meta["cursor"],
+                "profile": run_meta.get("profile")
+            })
+
+            failed = bool(results and "error" in results[0])
+            record_sql_outcome(req.question, sql_query, generation, failed, run_meta)
+            if failed:
+                response = QueryResponse(
+                    sql=sql_query,
+                    results=results,
+                    insights=f"Query failed: {results[0]['error']}",
+                    explanation="SQL execution error.",
+                    optimization="Fix syntax first.",
+                    execution_time_ms=execution_time,
+                    abort=run_meta.get("abort"),
+                    memory_context=memory_contexts,
+                    context_timings=generation["timings"],
+                    timings=finish_trace(trace, "/rag/query/stream", "sql_error", include_timings),
+                    cache=cache_info
+                )
+                yield sse_event("done", response.model_dump())
+                return
+
+            # 3. Plan-based optimization tips right away, then LLM tokens
+            #    interleaved as they arrive (combined mode: one call, one
+            #    delta per field)
+            if requested_analysis_mode(req) == "combined":
+                analysis = await run_in_threadpool(
+                    run_combined_analysis, sql_query, req.question, results, execution_time,
+                    api_key, wants_enrichment(req), trace, run_meta.get("profile")
+                )
+                for name in ("optimization", "explanation", "insights"):
+                    yield sse_event(name, {"delta": analysis[name]})
+            else:
+                analysis = {}
+                plan_report = await run_in_threadpool(
+                    analyze_plan, sql_query, execution_time, len(results), trace
+                )
+                enrich = wants_enrichment(req)
+                yield sse_event("optimization", {"delta": plan_report + ("\n\n" if enrich else "")})
+                analysis["optimization"] = plan_report
+                if not results:
+                    analysis["insights"] = "No results found."
+                prompts = {
+                    "explanation": (explain_prompt(sql_query, req.question), "Unable to explain."),
+                }
+                if enrich:
+                    prompts["optimization"] = (
+                        optimization_prompt(sql_query, execution_time, len(results), plan_report), ""
+                    )
+                if "insights" not in analysis:
+                    prompts["insights"] = (
+                        insights_prompt(results, req.question, run_meta.get("profile")),
+                        "Unable to generate insights."
+                    )
+
+                queue: asyncio.Queue = asyncio.Queue()
+                tasks = [
+                    asyncio.create_task(
+                        stream_analysis_field(name, prompt, fallback, api_key, queue, trace)
+                    )
+                    for name, (prompt, fallback) in prompts.items()
+                ]
+                pending = len(tasks)
+                while pending:
+                    name, kind, payload = await queue.get()
+                    if kind == "delta":
+                        yield sse_event(name, {"delta": payload})
+                    elif name == "optimization":
+                        if payload:
+                            analysis[name] = f"{plan_report}\n\n{payload}"
+                        pending -= 1
+                    else:
+                        analysis[name] = payload
+                        pending -= 1
+
+            # 4. Memory write, then the complete response
+            if hybrid_memory:
+                try:
+                    with stage_timer("memory_write", trace):
+                        await run_in_threadpool(
+                            hybrid_memory.store_interaction,
+                            question=req.question,
+                            sql=sql_query,
+                            results=results,
+                            insights=analysis["insights"],
+                            user_id=user_id,
+                            session_id=session_id
+                        )
+                except Exception as mem_error:
+                    print(f"Warning: Error storing memory: {mem_error}")
+
+            response = QueryResponse(
+                sql=sql_query,
+                results=results,
+                insights=analysis["insights"],
+                explanation=analysis["explanation"],
+                optimization=analysis["optimization"],
+                execution_time_ms=execution_time,
+                truncated=run_meta["truncated"],
+                cursor=run_meta["cursor"],
+                profile=run_meta.get("profile"),
+                memory_context=memory_contexts,
+                context_timings=generation["timings"],
+                timings=finish_trace(trace, "/rag/query/stream", "ok", include_timings),
+                cache=cache_info
+            )
+            yield sse_event("done", response.model_dump())
+
+        except Exception as e:
+            print(f"Error: {e}")
+            finish_trace(trace, "/rag/query/stream", "error", include_timings)
+            yield sse_event("error", {"error": str(e)})
+        finally:
+            # Client went away (or we failed): stop running SQL and LLM streams
+            scope.cancel()
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/query/cursor/{token}")
+def fetch_query_page(token: str, limit: int = RESULT_ROW_CAP):
+    """Fetch the next page of a truncated /rag/query result."""
+    limit = max(1, min(limit, RESULT_ROW_CAP))
+    try:
+        page = result_cursors.fetch(token, limit)
+    except QueryAborted as aborted:
+        return {"error": str(aborted), "abort": aborted.to_dict()}
+    except Exception as e:
+        result_cursors.close(token)
+        return {"error": str(e)}
+    if page is None:
+        return {"error": "Cursor expired or unknown. Re-run the query."}
+    return {
+        "results": page["results"],
+        "truncated": page["has_more"],
+        "cursor": page["cursor"],
+        "row_limit_reached": page["row_limit_reached"]
+    }
+
+# Cache endpoints
+@router.get("/cache/stats")
+def get_cache_stats():
+    """Get hit/miss counters for the query caches."""
+    return {
+        "sql": sql_cache.stats(),
+        "verified_sql": sql_examples.stats(),
+        "result": result_cache.stats(),
+        "embeddings": get_embedding_store().stats()
+    }
+
+@router.delete("/cache")
+def clear_caches():
+    """Clear the in-process query caches."""
+    sql_cache.clear()
+    sql_examples.clear()
+    result_cache.clear()
+    return {"status": "success"}
+
+@router.get("/templates/stats")
+def get_template_stats():
+    """Template fast-path usage and agreement with the LLM on the shadow sample."""
+    return sql_templates.stats()
+
+@router.get("/llm/stats")
+def get_llm_stats():
+    """Get LLM client registry statistics."""
+    return llm_clients.stats()
+
+@router.get("/db/stats")
+def get_db_stats():
+    """Get SQLite/Redis connection pool and result cursor statistics."""
+    return {
+        "pools": all_pool_stats(),
+        "cursors": result_cursors.stats(),
+        "schema_index": schema_index.stats(),
+        "index_advisor": index_advisor.stats(),
+        "redis": hybrid_memory.short_term.pool_stats() if hybrid_memory else None
+    }
+
+# Index advisor (admin)
+class ApplyIndexesRequest(BaseModel):
+    indexes: Optional[List[str]] = None  # CREATE INDEX statements; default: all accepted
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Admin endpoints are closed unless ADMIN_TOKEN is set and sent as X-Admin-Token."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    if not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@router.get("/admin/indexes", dependencies=[Depends(require_admin)])
+def get_index_candidates():
+    """Recorded workload and the index candidates mined from it."""
+    return {
+        "workload": index_advisor.workload.snapshot(),
+        "candidates": index_advisor.candidates(),
+        "last_report": index_advisor.last_report,
+    }
+
+@router.post("/admin/indexes/evaluate", dependencies=[Depends(require_admin)])
+def evaluate_indexes(max_candidates: int = 5):
+    """Benchmark the top candidates on a copy of the database."""
+    return index_advisor.evaluate(max_candidates=max(1, min(max_candidates, 20)))
+
+@router.post("/admin/indexes/apply", dependencies=[Depends(require_admin)])
+def apply_indexes(req: ApplyIndexesRequest):
+    """Create accepted indexes from the last evaluation, then ANALYZE."""
+    try:
+        return index_advisor.apply(req.indexes)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
 # Memory management endpoints
+@router.on_event("shutdown")
+def flush_memory_writes():
+    """Give queued long-term memory writes a chance to land before exit."""
+    if hybrid_memory:
+        hybrid_memory.close()
+
+@router.get("/memory/queue")
+def get_memory_queue_stats():
+    """Depth, lag and outcome counters of the long-term memory write queue."""
+    if not hybrid_memory:
+        return {"error": "Memory system not available"}
+    return hybrid_memory.get_write_queue_stats()
+
 @router.get("/memory/stats")
-def get_memory_stats(session_id: str = "default", user_id: str = "anonymous"):
+async def get_memory_stats(session_id: str = "default", user_id: str = "anonymous"):
     """Get memory statistics from both Redis and Mem0."""
     if not hybrid_memory:
         return {"error": "Memory system not available"}
-    return hybrid_memory.get_memory_stats(session_id, user_id)
+    return await hybrid_memory.aget_memory_stats(session_id, user_id)
 
 @router.delete("/memory/redis/{session_id}")
-def clear_redis_memory(session_id: str):
+async def clear_redis_memory(session_id: str):
     """Clear Redis short-term memory for a session."""
     if not hybrid_memory:
         return {"error": "Memory system not available"}
-    return hybrid_memory.clear_short_term(session_id)
+    return await hybrid_memory.aclear_short_term(session_id)
 
 @router.delete("/memory/mem0/{user_id}")
 def clear_mem0_memory(user_id: str):
@@ -0,0 +1,167 @@
+"""
+In-process schema retriever.
+
+Loads every schema chunk vector from the schema_embeddings Chroma
+collection into one contiguous, L2-normalized NumPy matrix and answers
+top-k queries with a single matrix-vector product, so the hot path no
+longer round-trips to Chroma. A BM25 lexical mode covers the case where
+embeddings are unavailable. The index reloads itself whenever
+embed_schema.py bumps the schema version.
+"""
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import RunnableLambda
+
+from .schema_version import current_schema_version
+
+# vector | bm25 | chroma (the latter bypasses this index entirely)
+SCHEMA_RETRIEVER_MODE = os.getenv("SCHEMA_RETRIEVER_MODE", "vector")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens; identifiers split on underscores, naive singulars."""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if len(token) > 3 and token.endswith("s"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class _BM25:
+    """Okapi BM25 over a handful of schema chunks."""
+
+    def __init__(self, texts: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokenize(t)) for t in texts]
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        doc_freq = Counter(term for tf in self.term_freqs for term in tf)
+        n = len(texts)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()
+        }
+
+    def scores(self, query: str) -> np.ndarray:
+        terms = [t for t in set(tokenize(query)) if t in self.idf]
+        scores = np.zeros(len(self.term_freqs), dtype=np.float32)
+        for i, tf in enumerate(self.term_freqs):
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / (self.avg_length or 1))
+            for term in terms:
+                freq = tf.get(term, 0)
+                if freq:
+                    scores[i] += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+        return scores
+
+
+class SchemaIndex:
+    """NumPy cosine-similarity (or BM25) retriever over schema chunks."""
+
+    def __init__(self, vectorstore, embeddings: Embeddings, mode: str = SCHEMA_RETRIEVER_MODE):
+        self.vectorstore = vectorstore
+        self.embeddings = embeddings
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._version = None
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._documents: List[Document] = []
+        self._bm25 = _BM25([])
+        self.reloads = 0
+        self.vector_searches = 0
+        self.bm25_searches = 0
+        self.fallbacks = 0
+
+    def reload(self):
+        """(Re)load all schema chunks and their vectors from Chroma."""
+        version = current_schema_version()
+        data = self.vectorstore.get(include=["embeddings", "documents", "metadatas"])
+        texts = data.get("documents") or []
+        metadatas = data.get("metadatas") or [{} for _ in texts]
+        vectors = data.get("embeddings")
+
+        documents = [
+            Document(page_content=text, metadata=meta or {})
+            for text, meta in zip(texts, metadatas)
+        ]
+        if vectors is not None and len(vectors):
+            matrix = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32))
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1, norms)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+
+        with self._lock:
+            self._matrix = matrix
+            self._documents = documents
+            self._bm25 = _BM25(texts)
+            self._version = version
+            self.reloads += 1
+        print(f"📚 Schema index loaded: {len(documents)} chunks (schema version {version})")
+
+    def _ensure_fresh(self):
+        version = current_schema_version()
+        if self._version != version:
+            try:
+                self.reload()
+            except Exception as e:
+                # Don't retry on every request; wait for the next schema version
+                print(f"Warning: schema index reload failed - {e}")
+                self._version = version
+
+    def search(self, query: str, k: int = 3, mode: Optional[str] = None) -> List[Document]:
+        """Top-k schema chunks for a query."""
+        self._ensure_fresh()
+        mode = mode or self.mode
+        with self._lock:
+            matrix, documents, bm25 = self._matrix, self._documents, self._bm25
+        if not documents:
+            # Index unavailable: fall back to querying Chroma directly
+            self.fallbacks += 1
+            return self.vectorstore.similarity_search(query, k=k)
+
+        scores = None
+        if mode == "vector" and matrix.size:
+            try:
+                q = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+                q /= (np.linalg.norm(q) or 1.0)
+                scores = matrix @ q
+                self.vector_searches += 1
+            except Exception as e:
+                print(f"Warning: schema embedding failed, using BM25 - {e}")
+                self.fallbacks += 1
+        if scores is None:
+            scores = bm25.scores(query)
+            self.bm25_searches += 1
+
+        k = min(k, len(documents))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [documents[i] for i in top]
+
+    def as_retriever(self, k: int = 3, mode: Optional[str] = None) -> RunnableLambda:
+        """LCEL-compatible retriever (drop-in for vectorstore.as_retriever())."""
+        return RunnableLambda(lambda query: self.search(query, k=k, mode=mode))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "chunks": len(self._documents),
+                "dimensions": int(self._matrix.shape[1]) if self._matrix.size else 0,
+                "schema_version": self._version,
+                "reloads": self.reloads,
+                "vector_searches": self.vector_searches,
+                "bm25_searches": self.bm25_searches,
+                "fallbacks": self.fallbacks,
+            }
@@ -0,0 +1,125 @@
+"""
+Schema introspection for embed_schema.py (and anything else that needs the
+live schema).
+
+Reads tables and views from sqlite_master plus PRAGMA table_info,
+foreign_key_list and index_list, so indexes, views and tables created
+outside schema.sql are all picked up. If the database file does not exist
+yet, the schema is loaded from schema.sql into an in-memory database and
+introspected from there.
+"""
+import hashlib
+import os
+import sqlite3
+from typing import Dict, List
+
+# Works both as `python backend/rag/embed_schema.py` and as a package import
+try:
+    from .db_pool import DB_PATH
+except ImportError:
+    from db_pool import DB_PATH
+
+SCHEMA_FILE = "backend/db/schema.sql"
+
+
+def _connect(db_path: str, schema_file: str) -> sqlite3.Connection:
+    if os.path.exists(db_path):
+        return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    print(f"⚠️  {db_path} not found, introspecting {schema_file} in memory")
+    conn = sqlite3.connect(":memory:")
+    with open(schema_file, "r") as f:
+        conn.executescript(f.read())
+    return conn
+
+
+def introspect_schema(db_path: str = DB_PATH, schema_file: str = SCHEMA_FILE) -> List[Dict]:
+    """
+    Describe every user table and view:
+        {"name", "type", "sql", "columns", "foreign_keys", "indexes"}
+    """
+    conn = _connect(db_path, schema_file)
+    try:
+        objects = conn.execute(
+            "SELECT type, name, sql FROM sqlite_master "
+            "WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%' "
+            "ORDER BY name"
+        ).fetchall()
+
+        described = []
+        for obj_type, name, sql in objects:
+            columns = [
+                {
+                    "name": row[1],
+                    "type": row[2] or "",
+                    "notnull": bool(row[3]),
+                    "default": row[4],
+                    "pk": bool(row[5]),
+                }
+                for row in conn.execute(f'PRAGMA table_info("{name}")')
+            ]
+            foreign_keys = [
+                {"column": row[3], "references": row[2], "to": row[4]}
+                for row in conn.execute(f'PRAGMA foreign_key_list("{name}")')
+            ]
+            indexes = []
+            for row in conn.execute(f'PRAGMA index_list("{name}")'):
+                index_columns = [
+                    info[2] for info in conn.execute(f'PRAGMA index_info("{row[1]}")')
+                ]
+                indexes.append({"name": row[1], "unique": bool(row[2]), "columns": index_columns})
+            described.append({
+                "name": name,
+                "type": obj_type,
+                "sql": sql or "",
+                "columns": columns,
+                "foreign_keys": foreign_keys,
+                "indexes": indexes,
+            })
+        return described
+    finally:
+        conn.close()
+
+
+def render_chunk(table: Dict) -> str:
+    """Text embedded for one table or view."""
+    lines = [table["sql"].strip().rstrip(";") + ";"]
+    lines.append(
+        "Columns: " + ", ".join(
+            f"{c['name']} {c['type']}".strip() + (" PRIMARY KEY" if c["pk"] else "")
+            for c in table["columns"]
+        )
+    )
+    if table["foreign_keys"]:
+        lines.append(
+            "Foreign keys: " + ", ".join(
+                f"{table['name']}.{fk['column']} -> {fk['references']}.{fk['to']}"
+                for fk in table["foreign_keys"]
+            )
+        )
+    if table["indexes"]:
+        lines.append(
+            "Indexes: " + ", ".join(
+                f"{i['name']}({', '.join(i['columns'])})" + (" UNIQUE" if i["unique"] else "")
+                for i in table["indexes"]
+            )
+        )
+    return "\n".join(lines)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def schema_chunks(db_path: str = DB_PATH, schema_file: str = SCHEMA_FILE) -> List[Dict]:
+    """One {"id", "table", "type", "text", "hash"} chunk per table/view."""
+    chunks = []
+    for table in introspect_schema(db_path, schema_file):
+        text = render_chunk(table)
+        chunks.append({
+            "id": f"{table['type']}:{table['name']}",
+            "table": table["name"],
+            "type": table["type"],
+            "text": text,
+            "hash": content_hash(text),
+        })
+    return chunks
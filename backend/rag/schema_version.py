@@ -0,0 +1,43 @@
+"""
+Schema version marker shared by embed_schema.py and the query caches.
+
+embed_schema.py writes a new token every time it rebuilds the
+schema_embeddings collection. Anything keyed by schema version (cached SQL,
+reusable query pairs) becomes unreachable as soon as the token changes, even
+across worker processes.
+"""
+import os
+import uuid
+import threading
+
+VECTOR_DIR = os.getenv("SQL_BUDDY_VECTOR_DIR", "backend/rag/vectorstore")
+SCHEMA_VERSION_FILE = os.path.join(VECTOR_DIR, "schema_version")
+
+_lock = threading.Lock()
+_cached = {"mtime_ns": None, "version": "0"}
+
+
+def current_schema_version() -> str:
+    """Return the current schema version token (re-read only when the file changes)."""
+    try:
+        mtime_ns = os.stat(SCHEMA_VERSION_FILE).st_mtime_ns
+    except OSError:
+        return "0"
+
+    with _lock:
+        if _cached["mtime_ns"] != mtime_ns:
+            with open(SCHEMA_VERSION_FILE, "r") as f:
+                _cached["version"] = f.read().strip() or "0"
+            _cached["mtime_ns"] = mtime_ns
+        return _cached["version"]
+
+
+def bump_schema_version() -> str:
+    """Write a fresh schema version token and return it."""
+    version = uuid.uuid4().hex[:12]
+    os.makedirs(VECTOR_DIR, exist_ok=True)
+    tmp_path = SCHEMA_VERSION_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, SCHEMA_VERSION_FILE)
+    return version
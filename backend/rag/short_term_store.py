@@ -0,0 +1,199 @@
+"""
+Redis short-term conversation store used by HybridMemoryManager.
+
+- Every operation is one round-trip: writes are a single MULTI pipeline
+  (LPUSH + LTRIM + EXPIRE), stats a single pipeline (LLEN + TTL).
+- Interactions are stored as compact binary records (struct header +
+  length-prefixed UTF-8, zlib when it pays off) instead of JSON. Legacy
+  JSON records written by older versions still decode.
+- The rendered "RECENT CONVERSATION" text is cached per session and reused
+  while the raw list is unchanged; local writes drop the entry.
+- Sync and asyncio clients share the same key layout, each with a bounded
+  (blocking) connection pool sized by REDIS_POOL_SIZE. Request-path reads and
+  writes run in worker threads (context gathering deadlines, background
+  writes) and use the sync client; the asyncio client serves the stats and
+  clear endpoints.
+"""
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .providers import redis_clients
+
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", "32"))
+REDIS_POOL_TIMEOUT_S = float(os.getenv("REDIS_POOL_TIMEOUT_S", "2"))
+SHORT_TERM_MAX_ITEMS = 10
+SHORT_TERM_TTL_S = 3600
+RENDER_CACHE_SESSIONS = 1024
+
+# version, flags, timestamp, result_count
+_HEADER = struct.Struct("<BBdI")
+_RECORD_VERSION = 1
+_FLAG_ZLIB = 0x01
+_TEXT_FIELDS = ("question", "sql", "result_summary", "insights_preview")
+_COMPRESS_MIN_BYTES = 256
+
+
+def encode_interaction(interaction: Dict) -> bytes:
+    """Pack an interaction into a compact binary record."""
+    body = b"".join(
+        struct.pack("<I", len(raw)) + raw
+        for raw in (str(interaction.get(f, "")).encode("utf-8") for f in _TEXT_FIELDS)
+    )
+    flags = 0
+    if len(body) >= _COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(body, 6)
+        if len(compressed) < len(body):
+            body, flags = compressed, _FLAG_ZLIB
+    timestamp = interaction.get("timestamp") or time.time()
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp).timestamp()
+    header = _HEADER.pack(
+        _RECORD_VERSION, flags, float(timestamp), int(interaction.get("result_count", 0))
+    )
+    return header + body
+
+
+def decode_interaction(blob: bytes) -> Dict:
+    """Unpack a binary record (or a legacy JSON one)."""
+    if blob[:1] == b"{":
+        return json.loads(blob)
+    _, flags, timestamp, result_count = _HEADER.unpack_from(blob)
+    body = blob[_HEADER.size:]
+    if flags & _FLAG_ZLIB:
+        body = zlib.decompress(body)
+    record = {
+        "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+        "result_count": result_count,
+    }
+    offset = 0
+    for field in _TEXT_FIELDS:
+        (length,) = struct.unpack_from("<I", body, offset)
+        offset += 4
+        record[field] = body[offset:offset + length].decode("utf-8")
+        offset += length
+    return record
+
+
+def render_context(items: List[bytes]) -> str:
+    """Format LRANGE output (newest first) as prompt context."""
+    if not items:
+        return ""
+    context_parts = ["RECENT CONVERSATION (from Redis):"]
+    for item in reversed(items):  # Chronological order
+        data = decode_interaction(item)
+        context_parts.append(
+            f"Q: {data['question']}\n"
+            f"SQL: {data['sql']}\n"
+            f"Results: {data.get('result_summary', 'N/A')}"
+        )
+    return "\n\n".join(context_parts)
+
+
+class ShortTermStore:
+    """Per-session capped list of recent interactions in Redis."""
+
+    def __init__(
+        self,
+        redis_url: str,
+        max_items: int = SHORT_TERM_MAX_ITEMS,
+        ttl_s: int = SHORT_TERM_TTL_S,
+        pool_size: int = REDIS_POOL_SIZE
+    ):
+        self.max_items = max_items
+        self.ttl_s = ttl_s
+        # Binary clients (decode_responses=False): records are not text
+        self.client, self.async_client = redis_clients(redis_url, pool_size, REDIS_POOL_TIMEOUT_S)
+        self._render_cache: "OrderedDict[Tuple[str, int], Tuple[Tuple[bytes, ...], str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.render_hits = 0
+        self.render_misses = 0
+
+    @staticmethod
+    def key(session_id: str) -> str:
+        return f"conversation:{session_id}"
+
+    # ---------- render cache ----------
+
+    def _rendered(self, session_id: str, limit: int, items: List[bytes]) -> str:
+        """Reuse the cached rendering while the raw records are unchanged."""
+        raw = tuple(items)
+        with self._lock:
+            cached = self._render_cache.get((session_id, limit))
+            if cached is not None and cached[0] == raw:
+                self._render_cache.move_to_end((session_id, limit))
+                self.render_hits += 1
+                return cached[1]
+            self.render_misses += 1
+        text = render_context(items)
+        with self._lock:
+            self._render_cache[(session_id, limit)] = (raw, text)
+            while len(self._render_cache) > RENDER_CACHE_SESSIONS:
+                self._render_cache.popitem(last=False)
+        return text
+
+    def _invalidate(self, session_id: str):
+        with self._lock:
+            for cache_key in [k for k in self._render_cache if k[0] == session_id]:
+                del self._render_cache[cache_key]
+
+    # ---------- sync API ----------
+
+    def append(self, session_id: str, interaction: Dict):
+        """LPUSH + LTRIM + EXPIRE in one MULTI round-trip."""
+        key = self.key(session_id)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.lpush(key, encode_interaction(interaction))
+        pipe.ltrim(key, 0, self.max_items - 1)
+        pipe.expire(key, self.ttl_s)
+        pipe.execute()
+        self._invalidate(session_id)
+
+    def recent(self, session_id: str, limit: int = 3) -> List[Dict]:
+        return [decode_interaction(i) for i in self.client.lrange(self.key(session_id), 0, limit - 1)]
+
+    def render(self, session_id: str, limit: int = 3) -> str:
+        items = self.client.lrange(self.key(session_id), 0, limit - 1)
+        return self._rendered(session_id, limit, items)
+
+    def stats(self, session_id: str) -> Dict:
+        """LLEN + TTL in one round-trip."""
+        pipe = self.client.pipeline(transaction=False)
+        pipe.llen(self.key(session_id))
+        pipe.ttl(self.key(session_id))
+        count, ttl = pipe.execute()
+        return {"recent_exchanges": count, "expires_in_seconds": ttl if ttl > 0 else 0}
+
+    def clear(self, session_id: str):
+        self.client.delete(self.key(session_id))
+        self._invalidate(session_id)
+
+    # ---------- asyncio API ----------
+
+    async def astats(self, session_id: str) -> Dict:
+        async with self.async_client.pipeline(transaction=False) as pipe:
+            pipe.llen(self.key(session_id))
+            pipe.ttl(self.key(session_id))
+            count, ttl = await pipe.execute()
+        return {"recent_exchanges": count, "expires_in_seconds": ttl if ttl > 0 else 0}
+
+    async def aclear(self, session_id: str):
+        await self.async_client.delete(self.key(session_id))
+        self._invalidate(session_id)
+
+    def pool_stats(self) -> Dict:
+        pool = self.client.connection_pool
+        with self._lock:
+            renders = self.render_hits + self.render_misses
+            return {
+                "max_connections": pool.max_connections,
+                "connections_created": len(getattr(pool, "_connections", [])),
+                "render_cache_entries": len(self._render_cache),
+                "render_cache_hit_rate": round(self.render_hits / renders, 4) if renders else 0.0,
+            }
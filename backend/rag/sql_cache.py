@@ -0,0 +1,153 @@
+"""
+Question -> SQL cache that sits in front of generate_sql_with_hybrid_memory.
+
+- Tier 1: in-process LRU with TTL (per worker)
+- Tier 2: optional shared Redis layer (set SQL_CACHE_REDIS_URL)
+
+Keys combine the normalized question text, the schema version written by
+embed_schema.py and a hash of the short-term (Redis) conversation context,
+so follow-up questions in different conversations never share an entry.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from .providers import redis_from_url
+from .schema_version import current_schema_version
+
+SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "1024"))
+SQL_CACHE_TTL_S = int(os.getenv("SQL_CACHE_TTL_S", "3600"))
+SQL_CACHE_REDIS_URL = os.getenv("SQL_CACHE_REDIS_URL", "")
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?.!;]+$")
+
+
+def normalize_question(question: str) -> str:
+    """Lower-case, collapse whitespace and drop trailing punctuation."""
+    text = _WHITESPACE.sub(" ", question.strip().lower())
+    return _TRAILING_PUNCTUATION.sub("", text)
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class QuestionSQLCache:
+    """LRU+TTL cache of generated SQL with an optional shared Redis tier."""
+
+    def __init__(
+        self,
+        max_entries: int = SQL_CACHE_MAX_ENTRIES,
+        ttl_seconds: int = SQL_CACHE_TTL_S,
+        redis_url: str = SQL_CACHE_REDIS_URL
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._schema_version = current_schema_version()
+        self.hits = 0
+        self.misses = 0
+        self.redis_hits = 0
+
+        self.redis_client = None
+        if redis_url:
+            try:
+                self.redis_client = redis_from_url(redis_url, decode_responses=True)
+                self.redis_client.ping()
+            except Exception as e:
+                print(f"Warning: SQL cache Redis layer disabled - {e}")
+                self.redis_client = None
+
+    def make_key(self, question: str, short_term_context: str = "") -> str:
+        """Build the cache key for a question in a given conversation state."""
+        version = current_schema_version()
+        if version != self._schema_version:
+            # Schema was re-embedded: old entries can never match again
+            self.clear()
+            self._schema_version = version
+        context_hash = _digest(short_term_context or "")[:16]
+        return _digest(f"{version}\0{context_hash}\0{normalize_question(question)}")
+
+    def get(self, key: str) -> Optional[str]:
+        """Return cached SQL for a key, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                sql, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return sql
+                del self._entries[key]
+
+        if self.redis_client is not None:
+            try:
+                sql = self.redis_client.get(f"sqlcache:{key}")
+            except Exception as e:
+                print(f"Warning: SQL cache Redis lookup failed - {e}")
+                sql = None
+            if sql:
+                self._store_local(key, sql)
+                with self._lock:
+                    self.hits += 1
+                    self.redis_hits += 1
+                return sql
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, sql: str):
+        """Store generated SQL under a key in both tiers."""
+        self._store_local(key, sql)
+        if self.redis_client is not None:
+            try:
+                self.redis_client.setex(f"sqlcache:{key}", self.ttl_seconds, sql)
+            except Exception as e:
+                print(f"Warning: SQL cache Redis write failed - {e}")
+
+    def discard(self, key: Optional[str]):
+        """Drop a key, e.g. when the cached SQL failed to execute."""
+        if key is None:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.redis_client is not None:
+            try:
+                self.redis_client.delete(f"sqlcache:{key}")
+            except Exception as e:
+                print(f"Warning: SQL cache Redis delete failed - {e}")
+
+    def clear(self):
+        """Drop every in-process entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def _store_local(self, key: str, sql: str):
+        with self._lock:
+            self._entries[key] = (sql, time.time() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "redis_hits": self.redis_hits,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "redis_enabled": self.redis_client is not None,
+                "schema_version": self._schema_version,
+            }
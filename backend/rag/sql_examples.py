@@ -0,0 +1,278 @@
+"""
+Question -> SQL pairs that executed successfully, searchable by question
+embedding.
+
+Paraphrases ("top spenders" / "customers who spent the most") miss the
+exact-text SQL cache but land close together in embedding space. Every
+LLM-generated query that runs without error is stored here with its
+L2-normalized question vector in one preallocated float32 matrix, so a
+lookup is a single matrix-vector product:
+
+- similarity >= SQL_REUSE_THRESHOLD: the stored SQL is reused, no LLM call
+- similarity >= SQL_FEW_SHOT_THRESHOLD: the nearest pairs are added to the
+  generation prompt as examples
+
+The index holds at most SQL_EXAMPLES_MAX_ENTRIES pairs (least recently
+used slot is overwritten) and is emptied when the schema version changes.
+Follow-up questions ("them", "those", ...) are neither stored nor reused,
+and the router only stores or reuses pairs for questions asked with no
+short-term conversation context (demote() turns a reuse into an example).
+Embeddings put "orders in California" / "orders in Texas" or "cheapest" /
+"most expensive" above the reuse threshold, so a pair is only reused when
+both questions also name the same literals: numbers ("top 5" vs "top 10"),
+quoted strings and capitalized names, sampled column values
+(value_terms, supplied by the router), date words ("last month" vs "this
+month") and sort direction. Otherwise the match is only a few-shot example.
+"""
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .schema_version import current_schema_version
+from .sql_cache import normalize_question
+from .sql_templates import FOLLOW_UP_WORDS
+
+SQL_REUSE_ENABLED = os.getenv("SQL_REUSE_ENABLED", "true").lower() == "true"
+SQL_REUSE_THRESHOLD = float(os.getenv("SQL_REUSE_THRESHOLD", "0.92"))
+SQL_FEW_SHOT_THRESHOLD = float(os.getenv("SQL_FEW_SHOT_THRESHOLD", "0.6"))
+SQL_FEW_SHOT_K = int(os.getenv("SQL_FEW_SHOT_K", "3"))
+SQL_EXAMPLES_MAX_ENTRIES = int(os.getenv("SQL_EXAMPLES_MAX_ENTRIES", "2000"))
+
+_WORD = re.compile(r"[a-z0-9]+")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_QUOTED = re.compile(r"'([^']+)'|\"([^\"]+)\"")
+_NAME = re.compile(r"(?<=\w )[A-Z][\w.-]*")  # capitalized word, not the first
+
+DATE_WORDS = {
+    "today", "yesterday", "tomorrow", "this", "last", "next", "current", "day", "days",
+    "week", "weeks", "weekend", "month", "months", "quarter", "quarters", "year", "years",
+    "january", "february", "march", "april", "may", "june", "july", "august",
+    "september", "october", "november", "december",
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+}
+DATE_SYNONYMS = {"past": "last", "previous": "last"}
+DIRECTION_WORDS = {
+    "top": "desc", "most": "desc", "highest": "desc", "largest": "desc", "biggest": "desc",
+    "greatest": "desc", "max": "desc", "maximum": "desc", "priciest": "desc", "best": "desc",
+    "latest": "desc", "newest": "desc", "recent": "desc", "descending": "desc", "desc": "desc",
+    "bottom": "asc", "least": "asc", "lowest": "asc", "smallest": "asc", "fewest": "asc",
+    "min": "asc", "minimum": "asc", "cheapest": "asc", "worst": "asc", "earliest": "asc",
+    "oldest": "asc", "ascending": "asc", "asc": "asc",
+}
+
+
+def is_follow_up(question: str) -> bool:
+    return bool(set(_WORD.findall(question.lower())) & FOLLOW_UP_WORDS)
+
+
+def _numbers(question: str) -> List[str]:
+    return sorted(_NUMBER.findall(question))
+
+
+def literal_terms(question: str) -> Dict[str, List[str]]:
+    """The parts of a question that change its SQL but barely move its embedding."""
+    words = [DATE_SYNONYMS.get(w, w) for w in _WORD.findall(question.lower())]
+    quoted = [a or b for a, b in _QUOTED.findall(question)]
+    return {
+        "numbers": _numbers(question),
+        "names": sorted({q.lower() for q in quoted} | {n.lower() for n in _NAME.findall(question)}),
+        "dates": sorted({w for w in words if w in DATE_WORDS}),
+        "directions": sorted({DIRECTION_WORDS[w] for w in words if w in DIRECTION_WORDS}),
+    }
+
+
+class VerifiedSQLIndex:
+    """Bounded in-memory cosine index of verified question -> SQL pairs."""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_entries: int = SQL_EXAMPLES_MAX_ENTRIES,
+        reuse_threshold: float = SQL_REUSE_THRESHOLD,
+        few_shot_threshold: float = SQL_FEW_SHOT_THRESHOLD,
+        few_shot_k: int = SQL_FEW_SHOT_K,
+        enabled: bool = SQL_REUSE_ENABLED,
+        value_terms: Optional[Callable[[str], List[str]]] = None
+    ):
+        self.embeddings = embeddings
+        self.value_terms = value_terms
+        self.max_entries = max_entries
+        self.reuse_threshold = reuse_threshold
+        self.few_shot_threshold = few_shot_threshold
+        self.few_shot_k = few_shot_k
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((0, 0), dtype=np.float32)  # allocated on first add
+        self._questions: List[Optional[str]] = []
+        self._sql: List[Optional[str]] = []
+        self._last_used = np.zeros(0, dtype=np.float64)
+        self._slots: Dict[str, int] = {}  # normalized question -> row
+        self._size = 0
+        self._schema_version = current_schema_version()
+        self.reuses = 0
+        self.few_shots = 0
+        self.misses = 0
+        self.evictions = 0
+        self.demoted = 0
+
+    def _check_version(self):
+        version = current_schema_version()
+        if version != self._schema_version:
+            # Schema was re-embedded: stored SQL may reference old tables/columns
+            self.clear()
+            self._schema_version = version
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def add(self, question: str, sql: str):
+        """Store a pair whose SQL executed successfully."""
+        if not self.enabled or is_follow_up(question):
+            return
+        self._check_version()
+        vector = self._embed(question)
+        key = normalize_question(question)
+        with self._lock:
+            if not self._matrix.size:
+                self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._questions = [None] * self.max_entries
+                self._sql = [None] * self.max_entries
+                self._last_used = np.zeros(self.max_entries, dtype=np.float64)
+            row = self._slots.get(key)
+            if row is None:
+                if self._size < self.max_entries:
+                    row = self._size
+                    self._size += 1
+                else:
+                    row = int(np.argmin(self._last_used))
+                    if self._questions[row] is not None:
+                        del self._slots[normalize_question(self._questions[row])]
+                        self.evictions += 1
+                self._slots[key] = row
+            self._matrix[row] = vector
+            self._questions[row] = question
+            self._sql[row] = sql
+            self._last_used[row] = time.time()
+
+    def _same_literals(self, question: str, other: str) -> bool:
+        if literal_terms(question) != literal_terms(other):
+            return False
+        if self.value_terms is None:
+            return True
+        try:
+            return self.value_terms(question) == self.value_terms(other)
+        except Exception as e:
+            print(f"Warning: could not compare column values - {e}")
+            return False
+
+    def discard_sql(self, sql: str):
+        """Forget every pair with this SQL (e.g. reused SQL that failed to execute)."""
+        with self._lock:
+            for row in range(self._size):
+                if self._sql[row] == sql and self._questions[row] is not None:
+                    del self._slots[normalize_question(self._questions[row])]
+                    self._questions[row] = None
+                    self._sql[row] = None
+                    self._matrix[row] = 0.0
+                    self._last_used[row] = 0.0  # reused first
+
+    def search(self, question: str) -> Dict:
+        """
+        Look up the nearest verified pairs. Returns
+        {"reuse": {"question", "sql", "similarity"} | None, "examples": [...]},
+        examples being the pairs above the few-shot threshold, best first.
+        """
+        result = {"reuse": None, "examples": []}
+        if not self.enabled:
+            return result
+        self._check_version()
+        with self._lock:
+            size = self._size
+        if not size:
+            with self._lock:
+                self.misses += 1
+            return result
+
+        vector = self._embed(question)
+        with self._lock:
+            size = self._size
+            scores = self._matrix[:size] @ vector
+            k = min(self.few_shot_k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            rows = [
+                i for i in top
+                if self._questions[i] is not None and scores[i] >= self.few_shot_threshold
+            ]
+            hits = [
+                {"question": self._questions[i], "sql": self._sql[i], "similarity": round(float(scores[i]), 4)}
+                for i in rows
+            ]
+        best = hits[0] if hits else None
+        # Value lookups may rebuild the template matcher, so run them unlocked
+        reusable = (
+            best is not None
+            and best["similarity"] >= self.reuse_threshold
+            and not is_follow_up(question)
+            and self._same_literals(question, best["question"])
+        )
+        with self._lock:
+            # clear() may have run while the lock was released
+            touch = rows if len(self._last_used) >= size else []
+            if reusable:
+                self._last_used[touch[:1]] = time.time()
+                self.reuses += 1
+                result["reuse"] = best
+            elif hits:
+                self._last_used[touch] = time.time()
+                self.few_shots += 1
+                result["examples"] = hits
+            else:
+                self.misses += 1
+        return result
+
+    def demote(self, result: Dict) -> Dict:
+        """Turn a search() reuse into a few-shot example (e.g. the question has conversation context)."""
+        with self._lock:
+            self.reuses -= 1
+            self.few_shots += 1
+            self.demoted += 1
+        return {"reuse": None, "examples": [result["reuse"]] + result["examples"]}
+
+    def clear(self):
+        with self._lock:
+            self._matrix = np.zeros((0, 0), dtype=np.float32)
+            self._questions = []
+            self._sql = []
+            self._last_used = np.zeros(0, dtype=np.float64)
+            self._slots = {}
+            self._size = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.reuses + self.few_shots + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._slots),
+                "max_entries": self.max_entries,
+                "reuses": self.reuses,
+                "few_shots": self.few_shots,
+                "misses": self.misses,
+                "reuse_rate": round(self.reuses / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "demoted": self.demoted,
+                "reuse_threshold": self.reuse_threshold,
+                "few_shot_threshold": self.few_shot_threshold,
+                "schema_version": self._schema_version,
+            }
+
+
+def format_examples(examples: List[Dict]) -> str:
+    """Few-shot block for the SQL generation prompt."""
+    return "\n\n".join(f"Question: {e['question']}\nSQL: {e['sql']}" for e in examples)
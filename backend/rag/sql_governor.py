@@ -0,0 +1,164 @@
+"""
+Execution governor for LLM-generated SQL.
+
+Every statement run on behalf of /rag/query gets a budget:
+- wall clock (SQL_TIMEOUT_S)
+- SQLite VM steps (SQL_MAX_VM_STEPS), counted via set_progress_handler
+- total rows handed out, first page plus cursor pages (SQL_MAX_ROWS)
+
+and can be cancelled from another thread (client disconnect) through a
+CancelScope, which flips a flag checked by the progress handler and calls
+Connection.interrupt() on every connection it is watching. An aborted
+statement raises QueryAborted describing which limit was hit and how far
+the query had gotten.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+SQL_TIMEOUT_S = float(os.getenv("SQL_TIMEOUT_S", "10"))
+SQL_MAX_VM_STEPS = int(os.getenv("SQL_MAX_VM_STEPS", "200000000"))
+SQL_MAX_ROWS = int(os.getenv("SQL_MAX_ROWS", "100000"))
+
+# VM instructions between progress-handler callbacks
+PROGRESS_INTERVAL = 1000
+
+
+class QueryAborted(Exception):
+    """A statement was stopped by the governor."""
+
+    def __init__(
+        self,
+        limit: str,
+        elapsed_ms: float,
+        vm_steps: int,
+        rows_fetched: int,
+        budget: Optional[float] = None
+    ):
+        self.limit = limit
+        self.budget = budget
+        self.elapsed_ms = elapsed_ms
+        self.vm_steps = vm_steps
+        self.rows_fetched = rows_fetched
+        super().__init__(self.message())
+
+    def message(self) -> str:
+        reasons = {
+            "time": f"exceeded the {self.budget or SQL_TIMEOUT_S:g}s time limit",
+            "vm_steps": f"exceeded the {int(self.budget or SQL_MAX_VM_STEPS):,} VM step budget",
+            "cancelled": "was cancelled (client disconnected)",
+        }
+        return f"Query {reasons.get(self.limit, 'was aborted')}"
+
+    def to_dict(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "budget": self.budget,
+            "message": self.message(),
+            "elapsed_ms": round(self.elapsed_ms, 2),
+            "vm_steps": self.vm_steps,
+            "rows_fetched": self.rows_fetched,
+        }
+
+
+class CancelScope:
+    """Cancellation handle shared between a request and its running statements."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._connections = set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        """Flag cancellation and interrupt any statement currently running."""
+        self._event.set()
+        with self._lock:
+            for conn in self._connections:
+                conn.interrupt()
+
+    def _watch(self, conn: sqlite3.Connection):
+        with self._lock:
+            self._connections.add(conn)
+
+    def _unwatch(self, conn: sqlite3.Connection):
+        with self._lock:
+            self._connections.discard(conn)
+
+
+class QueryGovernor:
+    """Time / VM-step budget for one statement on one connection."""
+
+    def __init__(
+        self,
+        wall_clock_s: float = SQL_TIMEOUT_S,
+        max_vm_steps: int = SQL_MAX_VM_STEPS,
+        scope: Optional[CancelScope] = None
+    ):
+        self.wall_clock_s = wall_clock_s
+        self.max_vm_steps = max_vm_steps
+        self.scope = scope
+        self.vm_steps = 0
+        self.rows_fetched = 0
+        self.limit_hit: Optional[str] = None
+        self._started = time.monotonic()
+
+    @property
+    def elapsed_ms(self) -> float:
+        return (time.monotonic() - self._started) * 1000
+
+    def _progress(self) -> int:
+        self.vm_steps += PROGRESS_INTERVAL
+        if self.scope is not None and self.scope.cancelled:
+            self.limit_hit = "cancelled"
+        elif time.monotonic() - self._started > self.wall_clock_s:
+            self.limit_hit = "time"
+        elif self.vm_steps > self.max_vm_steps:
+            self.limit_hit = "vm_steps"
+        return 1 if self.limit_hit else 0
+
+    def aborted(self) -> QueryAborted:
+        limit = self.limit_hit or "cancelled"
+        budget = {"time": self.wall_clock_s, "vm_steps": self.max_vm_steps}.get(limit)
+        return QueryAborted(limit, self.elapsed_ms, self.vm_steps, self.rows_fetched, budget)
+
+    @contextmanager
+    def attach(self, conn: sqlite3.Connection) -> Iterator["QueryGovernor"]:
+        """Enforce the budget on `conn` for the duration of the block."""
+        if self.scope is not None:
+            if self.scope.cancelled:
+                self.limit_hit = "cancelled"
+                raise self.aborted()
+            self.scope._watch(conn)
+        self._started = time.monotonic()
+        conn.set_progress_handler(self._progress, PROGRESS_INTERVAL)
+        try:
+            yield self
+        except sqlite3.OperationalError as e:
+            if "interrupted" in str(e):
+                if self.limit_hit is None and self.scope is not None and self.scope.cancelled:
+                    self.limit_hit = "cancelled"
+                raise self.aborted() from e
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+            if self.scope is not None:
+                self.scope._unwatch(conn)
+
+
+def fetch_governed(cursor: sqlite3.Cursor, governor: QueryGovernor, max_rows: int, chunk: int = 256) -> list:
+    """fetchmany in chunks up to max_rows, tracking progress on the governor."""
+    rows = []
+    while len(rows) < max_rows:
+        batch = cursor.fetchmany(min(chunk, max_rows - len(rows)))
+        if not batch:
+            break
+        rows.extend(batch)
+        governor.rows_fetched = len(rows)
+    return rows
@@ -0,0 +1,737 @@
+"""
+Deterministic NL -> SQL fast path for simple single-table questions.
+
+"show all customers", "list products with prices above 50", "how many
+orders were placed last month", "the 3 most expensive products" and the
+like are answered from templates built from the introspected schema
+instead of an LLM round-trip:
+
+- tables and columns are recognized by name, singular/plural and
+  underscore-less forms plus a small synonym list
+- filters: numeric comparisons ("above 50", "between 10 and 20"),
+  low-cardinality text values sampled from the database ("in California",
+  "Electronics"), and date phrases ("last month", "in 2024", "since
+  2024-01-01", "last 30 days")
+- ORDER BY / LIMIT: "sorted by", "top N", "first N", superlatives
+  ("cheapest", "latest", "highest price")
+- COUNT(*) for "how many" / "number of", COUNT(DISTINCT col) for "how many
+  regions"
+
+A question is only answered when every content word was understood
+(confidence >= TEMPLATE_MIN_CONFIDENCE), exactly one table is involved and
+it is not a follow-up ("them", "those", ...). Grouping ("per category",
+"count ... by region") and aggregates of a column ("total amount",
+"average price") are left to the LLM (reason "aggregate"), as is
+everything else not understood. A TEMPLATE_SHADOW_RATE sample of template answers is also sent
+to the LLM in the background and the two result sets are compared.
+"""
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .schema_introspection import introspect_schema
+from .schema_version import current_schema_version
+
+SQL_TEMPLATES_ENABLED = os.getenv("SQL_TEMPLATES_ENABLED", "true").lower() == "true"
+TEMPLATE_MIN_CONFIDENCE = float(os.getenv("TEMPLATE_MIN_CONFIDENCE", "1.0"))
+TEMPLATE_SHADOW_RATE = float(os.getenv("TEMPLATE_SHADOW_RATE", "0.05"))
+TEMPLATE_MAX_VALUES = int(os.getenv("TEMPLATE_MAX_VALUES", "50"))
+TEMPLATE_REFRESH_S = float(os.getenv("TEMPLATE_REFRESH_S", "600"))
+
+# Extra names for tables and columns beyond the automatic forms
+TABLE_SYNONYMS = {
+    "customers": ["clients", "client", "buyers", "buyer"],
+    "orders": ["purchases", "purchase"],
+    "order_items": ["line items", "line item"],
+}
+COLUMN_SYNONYMS = {
+    "price": ["cost", "costs", "costing", "priced"],
+    "total_amount": ["order total", "order value"],
+    "region": ["state", "states", "location"],
+    "signup_date": ["signed up", "joined", "signup"],
+    "order_date": ["placed", "ordered on"],
+    "quantity": ["qty"],
+}
+
+# Words that carry no meaning for the templates
+STOPWORDS = {
+    "a", "about", "all", "an", "and", "any", "are", "as", "by", "can", "data",
+    "details", "display", "do", "does", "entire", "every", "fetch", "find", "for",
+    "from", "get", "give", "have", "has", "i", "in", "info", "information", "is",
+    "list", "me", "of", "on", "our", "please", "records", "rows", "see", "show",
+    "table", "tell", "that", "the", "their", "there", "to", "we", "were", "was",
+    "what", "which", "who", "whole", "with", "you",
+}
+# A question containing one of these depends on earlier conversation
+FOLLOW_UP_WORDS = {
+    "them", "those", "these", "they", "it", "previous", "same", "again",
+    "instead", "also", "too", "ones", "such",
+}
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "fifteen": 15,
+    "twenty": 20, "fifty": 50, "hundred": 100,
+}
+MONTHS = [
+    "january", "february", "march", "april", "may", "june", "july", "august",
+    "september", "october", "november", "december",
+]
+COMPARATORS = {
+    "greater than or equal to": ">=", "less than or equal to": "<=",
+    "greater than": ">", "more than": ">", "higher than": ">", "over": ">", "above": ">",
+    "less than": "<", "lower than": "<", "under": "<", "below": "<",
+    "at least": ">=", "at most": "<=", "exactly": "=", "equal to": "=", "equals": "=",
+    ">=": ">=", "<=": "<=", ">": ">", "<": "<", "=": "=",
+}
+# phrase -> (column hint, direction); "@date" is the table's date column
+SUPERLATIVES = {
+    "most expensive": ("price", "DESC"), "priciest": ("price", "DESC"),
+    "highest priced": ("price", "DESC"), "least expensive": ("price", "ASC"),
+    "cheapest": ("price", "ASC"), "lowest priced": ("price", "ASC"),
+    "most recent": ("@date", "DESC"), "latest": ("@date", "DESC"),
+    "newest": ("@date", "DESC"), "recent": ("@date", "DESC"),
+    "oldest": ("@date", "ASC"), "earliest": ("@date", "ASC"),
+}
+DIRECTIONS = {
+    "asc": "ASC", "ascending": "ASC", "lowest first": "ASC", "oldest first": "ASC",
+    "desc": "DESC", "descending": "DESC", "highest first": "DESC", "newest first": "DESC",
+}
+TOP_DEFAULT_LIMIT = 10
+# A column after one of these is aggregated, not listed
+AGGREGATE_WORDS = ("total", "sum", "average", "avg", "mean", "minimum", "maximum", "min", "max")
+
+_WORD = re.compile(r"[a-z0-9]+")
+_NUMBER = r"\$?(\d+(?:\.\d+)?)"
+_DATE = r"(\d{4}-\d{2}-\d{2})"
+
+
+def _alternation(phrases) -> str:
+    ordered = sorted(set(phrases), key=len, reverse=True)
+    return "|".join(re.escape(p) for p in ordered)
+
+
+def _plural(word: str) -> str:
+    if word.endswith("y") and not word.endswith(("ay", "ey", "oy", "uy")):
+        return word[:-1] + "ies"
+    if word.endswith(("s", "x", "ch", "sh")):
+        return word + "es"
+    return word + "s"
+
+
+def _singular(word: str) -> str:
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("ses", "xes", "ches", "shes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def normalize(question: str) -> str:
+    """Lower-case, spell out number words as digits, drop punctuation."""
+    text = question.lower().replace("’", "'")
+    text = re.sub(r"'s\b", "", text)
+    text = re.sub(r"[^a-z0-9$.\-<>=\s]", " ", text)
+    text = re.sub(r"(?<!\d)\.|\.(?!\d)", " ", text)
+    text = re.sub(
+        r"\b(" + "|".join(NUMBER_WORDS) + r")\b",
+        lambda m: str(NUMBER_WORDS[m.group(1)]),
+        text,
+    )
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class _Spans:
+    """Tracks which characters of the question have been understood."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.used = [False] * len(text)
+
+    def free(self, start: int, end: int) -> bool:
+        return not any(self.used[start:end])
+
+    def take(self, start: int, end: int):
+        for i in range(start, end):
+            self.used[i] = True
+
+    def matches(self, pattern: "re.Pattern") -> List["re.Match"]:
+        """Matches of pattern that don't overlap understood text (not yet taken)."""
+        return [m for m in pattern.finditer(self.text) if self.free(m.start(), m.end())]
+
+    def words(self) -> Tuple[List[str], List[str]]:
+        """(content words, understood content words)."""
+        content, understood = [], []
+        for m in _WORD.finditer(self.text):
+            if m.group() in STOPWORDS:
+                continue
+            content.append(m.group())
+            if not self.free(m.start(), m.end()):
+                understood.append(m.group())
+        return content, understood
+
+
+class TemplateMatcher:
+    """Schema-derived lexicon and the template rules applied to one question."""
+
+    def __init__(self, tables: List[Dict], values: Optional[Dict[str, Dict[str, List[str]]]] = None):
+        values = values or {}
+        self.tables: Dict[str, Dict] = {}
+        table_phrases: Dict[str, str] = {}
+
+        for table in tables:
+            if table["type"] != "table":
+                continue
+            name = table["name"]
+            spaced = name.replace("_", " ")
+            singular = _singular(spaced)
+            phrases = {spaced, singular, _plural(singular), *TABLE_SYNONYMS.get(name, [])}
+            for phrase in phrases:
+                table_phrases.setdefault(phrase, name)
+            self.tables[name] = self._describe(table, values.get(name, {}), singular)
+
+        self.table_phrases = table_phrases
+        # "order by" is a clause, not the orders table
+        self.table_re = re.compile(rf"\b(?:{_alternation(table_phrases)})\b(?!(?<=\border)\s+by\b)")
+        known = {value for t in self.tables.values() for value in t["values"]}
+        self.value_re = re.compile(rf"\b(?:{_alternation(known)})\b") if known else None
+
+    @staticmethod
+    def _describe(table: Dict, values: Dict[str, List[str]], singular: str) -> Dict:
+        columns = [c["name"] for c in table["columns"]]
+        pk = next((c["name"] for c in table["columns"] if c["pk"]), None)
+        date_columns, numeric_columns, text_columns = [], [], []
+        for c in table["columns"]:
+            col_type = c["type"].upper()
+            if "DATE" in col_type or "TIME" in col_type or c["name"].endswith(("_date", "_at")):
+                date_columns.append(c["name"])
+            elif c["pk"] or c["name"].endswith("_id"):
+                continue
+            elif any(t in col_type for t in ("INT", "REAL", "DEC", "NUM", "FLOA", "DOUB")):
+                numeric_columns.append(c["name"])
+            else:
+                text_columns.append(c["name"])
+        label = next(
+            (c["name"] for c in table["columns"] if c["name"] in text_columns and c["notnull"]),
+            text_columns[0] if text_columns else None,
+        )
+
+        column_phrases: Dict[str, str] = {}
+        last_words: Dict[str, List[str]] = {}
+        for column in columns:
+            spaced = column.replace("_", " ")
+            for phrase in (column, spaced, _plural(spaced), *COLUMN_SYNONYMS.get(column, [])):
+                column_phrases.setdefault(phrase, column)
+            if " " in spaced:
+                last_words.setdefault(spaced.rsplit(" ", 1)[1], []).append(column)
+        for word, owners in last_words.items():
+            # "amount" for total_amount, "date" for order_date, when unambiguous
+            if len(owners) == 1 and word not in STOPWORDS and word != "id":
+                column_phrases.setdefault(word, owners[0])
+                column_phrases.setdefault(_plural(word), owners[0])
+
+        value_index: Dict[str, List[Tuple[str, str]]] = {}
+        for column, column_values in values.items():
+            for value in column_values:
+                value_index.setdefault(value.lower(), []).append((column, value))
+
+        def phrases_for(cols):
+            return [p for p, c in column_phrases.items() if c in cols]
+
+        return {
+            "name": table["name"],
+            "singular": singular,
+            "columns": columns,
+            "pk": pk,
+            "label": label,
+            "date_columns": date_columns,
+            "numeric_columns": numeric_columns,
+            "text_columns": text_columns,
+            "column_phrases": column_phrases,
+            "column_re": re.compile(rf"\b(?:{_alternation(column_phrases)})\b"),
+            "numeric_alt": _alternation(phrases_for(numeric_columns)),
+            "date_alt": _alternation(phrases_for(date_columns)),
+            "sortable_alt": _alternation(phrases_for(numeric_columns + date_columns + text_columns)),
+            "values": value_index,
+            "value_alt": _alternation(value_index),
+        }
+
+    def value_terms(self, question: str) -> List[str]:
+        """Sampled column values ("california", "electronics") named in the question."""
+        if self.value_re is None:
+            return []
+        return sorted({m.group() for m in self.value_re.finditer(normalize(question))})
+
+    # ---------- matching ----------
+
+    def match(self, question: str) -> Dict:
+        """
+        Returns {"sql", "confidence", "table", "reason", "unmatched"}; sql is
+        None unless every rule that fired was resolved (reason "matched").
+        """
+        text = normalize(question)
+        result = {"sql": None, "confidence": 0.0, "table": None, "reason": "", "unmatched": []}
+        words = set(_WORD.findall(text))
+        if words & FOLLOW_UP_WORDS:
+            result["reason"] = "follow_up"
+            return result
+
+        spans = _Spans(text)
+        table, table_hits, distinct = self._pick_table(text)
+        if table is None:
+            result["reason"] = "no_table" if not table_hits else "ambiguous_table"
+            return result
+        t = self.tables[table]
+        for m in table_hits:
+            spans.take(m.start(), m.end())
+        singular = any(m.group() == t["singular"] for m in table_hits)
+
+        conditions: List[str] = []
+        used_columns = set()
+        count = self._count(spans)
+        if self._grouped(text, t, count):
+            result.update({"table": table, "reason": "aggregate"})
+            return result
+        mentioned_dates = [t["column_phrases"][m.group()] for m in spans.matches(t["column_re"])
+                           if t["column_phrases"][m.group()] in t["date_columns"]]
+        date_column = mentioned_dates[0] if mentioned_dates else (
+            t["date_columns"][0] if len(t["date_columns"]) == 1 else None
+        )
+        if date_column:
+            for condition in self._date_filters(spans, date_column):
+                conditions.append(condition)
+                used_columns.add(date_column)
+        for column, condition in self._numeric_filters(spans, t):
+            conditions.append(condition)
+            used_columns.add(column)
+        for column, condition in self._value_filters(spans, t):
+            conditions.append(condition)
+            used_columns.add(column)
+
+        order, limit, needs_order = self._ordering(spans, t, date_column, singular)
+        if needs_order and order is None:
+            result["reason"] = "ambiguous_order"
+            return result
+        if order:
+            used_columns.add(order[0])
+
+        projection = []
+        aggregated = False
+        for m in spans.matches(t["column_re"]):
+            spans.take(m.start(), m.end())
+            column = t["column_phrases"][m.group()]
+            if column in t["numeric_columns"] and self._aggregated(text, m):
+                aggregated = True
+            if column not in used_columns and column not in projection:
+                projection.append(column)
+        if aggregated or (count and projection and (not distinct or len(projection) > 1)):
+            # "total amount of orders", "how many customers have an email"
+            result.update({"table": table, "reason": "aggregate"})
+            return result
+
+        content, understood = spans.words()
+        confidence = len(understood) / len(content) if content else 0.0
+        result.update({
+            "table": table,
+            "confidence": round(confidence, 3),
+            "unmatched": [w for w in content if w not in understood],
+        })
+        if confidence < TEMPLATE_MIN_CONFIDENCE:
+            result["reason"] = "low_confidence"
+            return result
+
+        if count and projection:
+            select = f"COUNT(DISTINCT {projection[0]}) AS count"  # "how many regions"
+        elif count:
+            select = "COUNT(*) AS count"
+        elif projection and distinct:
+            select = "DISTINCT " + ", ".join(projection)
+        elif projection:
+            if t["label"] and t["label"] not in projection:
+                projection.insert(0, t["label"])
+            select = ", ".join(projection)
+        else:
+            select = "*"
+
+        sql = f"SELECT {select} FROM {table}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if order and not count:
+            sql += f" ORDER BY {order[0]} {order[1]}"
+        if limit and not count:
+            sql += f" LIMIT {limit}"
+        result.update({"sql": sql, "reason": "matched"})
+        return result
+
+    def _pick_table(self, text: str) -> Tuple[Optional[str], List["re.Match"], bool]:
+        """
+        The single table the question is about: named tables, minus table
+        words that are part of a column name ("customer id" in orders). With
+        no table named, columns that all belong to one table pick it
+        ("list all regions" -> DISTINCT region FROM customers).
+        """
+        hits = list(self.table_re.finditer(text))
+        candidates = {self.table_phrases[m.group()] for m in hits}
+        for name in candidates:
+            column_spans = [
+                (m.start(), m.end()) for m in self.tables[name]["column_re"].finditer(text)
+            ]
+            remaining = {
+                self.table_phrases[m.group()] for m in hits
+                if not any(s <= m.start() and m.end() <= e for s, e in column_spans)
+            }
+            if remaining == {name}:
+                return name, [m for m in hits if self.table_phrases[m.group()] == name], False
+        if hits:
+            return None, hits, False
+
+        owners = set()
+        for name, t in self.tables.items():
+            if any(True for _ in t["column_re"].finditer(text)):
+                owners.add(name)
+        if len(owners) == 1:
+            return owners.pop(), [], True
+        return None, [], False
+
+    def _grouped(self, text: str, t: Dict, count: bool) -> bool:
+        """
+        "per category", "for each region", "grouped by category" - and, with
+        a count, a plain "by category" - ask for one row per group.
+        """
+        keys = _alternation([*t["column_phrases"], *self.table_phrases])
+        prefix = r"per|for each|each|group(?:ed)? by|broken down by|break(?:down|s)? (?:down )?by"
+        if count:
+            prefix += r"|by"
+        return re.search(rf"\b(?:{prefix})\s+(?:the\s+)?(?:{keys})\b", text) is not None
+
+    @staticmethod
+    def _aggregated(text: str, m: "re.Match") -> bool:
+        """Column phrase m is a SUM/AVG/MIN/MAX target ("total amount", "average price")."""
+        words = _alternation(AGGREGATE_WORDS)
+        if re.match(rf"(?:{words})\b", m.group()):
+            return True  # "total" inside the column name, e.g. total_amount
+        return re.search(rf"\b(?:{words})\s+(?:of\s+)?(?:the\s+|all\s+)?$", text[:m.start()]) is not None
+
+    @staticmethod
+    def _count(spans: _Spans) -> bool:
+        pattern = re.compile(r"\bhow many\b|\b(?:the )?(?:total )?(?:number|count) of\b|\bcount\b")
+        hits = spans.matches(pattern)
+        for m in hits:
+            spans.take(m.start(), m.end())
+        return bool(hits)
+
+    @staticmethod
+    def _date_filters(spans: _Spans, column: str) -> List[str]:
+        c = column
+        rules = [
+            (r"\b(?:in |during )?(?:the )?(?:last|previous|past) month\b",
+             lambda m: f"{c} >= date('now', 'start of month', '-1 month') AND {c} < date('now', 'start of month')"),
+            (r"\b(?:in |during )?this month\b",
+             lambda m: f"{c} >= date('now', 'start of month')"),
+            (r"\b(?:in |during )?(?:the )?(?:last|previous|past) year\b",
+             lambda m: f"{c} >= date('now', 'start of year', '-1 year') AND {c} < date('now', 'start of year')"),
+            (r"\b(?:in |during )?this year\b",
+             lambda m: f"{c} >= date('now', 'start of year')"),
+            (r"\b(?:in |during )?(?:the )?(?:last|previous|past) week\b",
+             lambda m: f"{c} >= date('now', '-13 days', 'weekday 0') AND {c} < date('now', '-6 days', 'weekday 0')"),
+            (r"\b(?:in |during )?this week\b",
+             lambda m: f"{c} >= date('now', '-6 days', 'weekday 0')"),
+            (r"\b(?:in |during |over |within )?(?:the )?(?:last|past) (\d+) (day|week|month|year)s?\b",
+             lambda m: f"{c} >= date('now', '-{int(m.group(1)) * (7 if m.group(2) == 'week' else 1)} "
+                       f"{'day' if m.group(2) == 'week' else m.group(2)}s')"),
+            (r"\btoday\b", lambda m: f"date({c}) = date('now')"),
+            (r"\byesterday\b", lambda m: f"date({c}) = date('now', '-1 day')"),
+            (rf"\bbetween {_DATE} and {_DATE}\b",
+             lambda m: f"{c} BETWEEN {_literal(m.group(1))} AND {_literal(m.group(2))}"),
+            (rf"\b(since|after|before|from|until) {_DATE}\b",
+             lambda m: f"{c} {({'since': '>=', 'from': '>=', 'after': '>', 'before': '<', 'until': '<='})[m.group(1)]} "
+                       f"{_literal(m.group(2))}"),
+            (rf"\b(?:in |during )?({'|'.join(MONTHS)}) (\d{{4}})\b",
+             lambda m: _month_range(c, int(m.group(2)), MONTHS.index(m.group(1)) + 1)),
+            (rf"\b(?:in |during )?({'|'.join(MONTHS)})\b",
+             lambda m: f"strftime('%m', {c}) = '{MONTHS.index(m.group(1)) + 1:02d}' "
+                       f"AND strftime('%Y', {c}) = strftime('%Y', 'now')"),
+            (r"\b(?:in |during )(\d{4})\b",
+             lambda m: f"{c} >= '{m.group(1)}-01-01' AND {c} < '{int(m.group(1)) + 1}-01-01'"),
+        ]
+        conditions = []
+        for pattern, build in rules:
+            for m in spans.matches(re.compile(pattern)):
+                spans.take(m.start(), m.end())
+                conditions.append(build(m))
+        return conditions
+
+    @staticmethod
+    def _numeric_filters(spans: _Spans, t: Dict) -> List[Tuple[str, str]]:
+        default = t["numeric_columns"][0] if len(t["numeric_columns"]) == 1 else None
+        col = rf"(?:(?P<col>{t['numeric_alt']})\s+)?" if t["numeric_alt"] else ""
+        filler = r"(?:(?:is|are|of|that|which|cost|costs)\s+)*"
+        between = re.compile(rf"\b{col}{filler}between {_NUMBER} and {_NUMBER}\b")
+        compare = re.compile(rf"(?:\b{col})?{filler}(?P<op>{_alternation(COMPARATORS)})\s*{_NUMBER}\b")
+
+        filters = []
+        for pattern in (between, compare):
+            for m in spans.matches(pattern):
+                phrase = m.groupdict().get("col")
+                column = t["column_phrases"][phrase] if phrase else default
+                if column is None:
+                    continue  # which column "above 50" means is unknown
+                spans.take(m.start(), m.end())
+                if pattern is between:
+                    low, high = m.groups()[-2:]
+                    filters.append((column, f"{column} BETWEEN {low} AND {high}"))
+                else:
+                    filters.append((column, f"{column} {COMPARATORS[m.group('op')]} {m.groups()[-1]}"))
+        return filters
+
+    @staticmethod
+    def _value_filters(spans: _Spans, t: Dict) -> List[Tuple[str, str]]:
+        if not t["values"]:
+            return []
+        text_alt = _alternation(p for p, c in t["column_phrases"].items() if c in t["text_columns"])
+        named = rf"(?:\b(?P<before>{text_alt})\s+(?:is\s+|=\s+|of\s+)?)?" if text_alt else ""
+        pattern = re.compile(rf"{named}\b(?P<value>{t['value_alt']})\b")
+        filters = []
+        for m in spans.matches(pattern):
+            candidates = t["values"][m.group("value")]
+            named = m.groupdict().get("before")
+            if named:
+                candidates = [c for c in candidates if c[0] == t["column_phrases"][named]]
+            if len(candidates) != 1:
+                continue  # value appears in several columns
+            column, value = candidates[0]
+            spans.take(m.start(), m.end())
+            filters.append((column, f"{column} = {_literal(value)}"))
+        return filters
+
+    @staticmethod
+    def _ordering(
+        spans: _Spans,
+        t: Dict,
+        date_column: Optional[str],
+        singular: bool
+    ) -> Tuple[Optional[Tuple[str, str]], Optional[int], bool]:
+        """Returns (order, limit, needs_order)."""
+        order = None
+        limit = None
+        top = False
+
+        def resolve(hint: str) -> Optional[str]:
+            if hint == "@date":
+                return date_column
+            return next((c for p, c in t["column_phrases"].items() if p == hint), None)
+
+        for m in spans.matches(re.compile(r"\b(?:top|first|limit(?:ed)? to|limit|only) (\d+)\b")):
+            spans.take(m.start(), m.end())
+            limit = int(m.group(1))
+            top = top or m.group().startswith("top")
+        for m in spans.matches(re.compile(r"\b(?:top|first)\b")):
+            spans.take(m.start(), m.end())
+            top = top or m.group() == "top"
+            if m.group() == "first" and limit is None:
+                limit = TOP_DEFAULT_LIMIT
+
+        if t["sortable_alt"]:
+            sort_by = re.compile(
+                rf"\b(?:(?:sorted|ordered|sort|order|ranked|rank)\s+)?by\s+(?P<col>{t['sortable_alt']})"
+                rf"(?:\s+(?P<dir>{_alternation(DIRECTIONS)}))?\b"
+            )
+            for m in spans.matches(sort_by):
+                spans.take(m.start(), m.end())
+                direction = DIRECTIONS.get(m.group("dir") or "", "DESC" if top else "ASC")
+                order = (t["column_phrases"][m.group("col")], direction)
+            generic = re.compile(
+                rf"\b(?:(?P<n>\d+)\s+)?(?:the\s+)?(?P<adj>highest|largest|biggest|most|lowest|smallest|least)"
+                rf"\s+(?P<col>{t['sortable_alt']})\b"
+            )
+            for m in spans.matches(generic):
+                spans.take(m.start(), m.end())
+                desc = m.group("adj") in ("highest", "largest", "biggest", "most")
+                order = (t["column_phrases"][m.group("col")], "DESC" if desc else "ASC")
+                if m.group("n"):
+                    limit = int(m.group("n"))
+
+        superlative = re.compile(rf"\b(?:(?P<n>\d+)\s+)?(?:the\s+)?(?P<adj>{_alternation(SUPERLATIVES)})\b")
+        for m in spans.matches(superlative):
+            hint, direction = SUPERLATIVES[m.group("adj")]
+            column = resolve(hint)
+            if column is None:
+                continue
+            spans.take(m.start(), m.end())
+            order = (column, direction)
+            if m.group("n"):
+                limit = int(m.group("n"))
+            elif limit is None and singular:
+                limit = 1  # "the cheapest product"
+
+        if top and limit is None:
+            limit = TOP_DEFAULT_LIMIT
+        if order is None and limit is not None and not top and t["pk"]:
+            order = (t["pk"], "ASC")  # "first 5 orders"
+        return order, limit, top
+
+
+def _month_range(column: str, year: int, month: int) -> str:
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return (
+        f"{column} >= '{year}-{month:02d}-01' "
+        f"AND {column} < '{next_year}-{next_month:02d}-01'"
+    )
+
+
+def sample_values(db_path: str, tables: List[Dict], max_values: int = TEMPLATE_MAX_VALUES) -> Dict:
+    """{table: {column: [values]}} for low-cardinality, non-unique text columns."""
+    values: Dict[str, Dict[str, List[str]]] = {}
+    if not os.path.exists(db_path):
+        return values
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        for table in tables:
+            if table["type"] != "table":
+                continue
+            unique = {
+                index["columns"][0] for index in table["indexes"]
+                if index["unique"] and len(index["columns"]) == 1
+            }
+            for column in table["columns"]:
+                col_type = column["type"].upper()
+                name = column["name"]
+                if column["pk"] or name in unique or name.endswith(("_id", "_date", "_at")):
+                    continue
+                if col_type and not any(t in col_type for t in ("CHAR", "TEXT", "CLOB")):
+                    continue
+                rows = conn.execute(
+                    f'SELECT DISTINCT "{name}" FROM "{table["name"]}" '
+                    f'WHERE "{name}" IS NOT NULL LIMIT ?',
+                    (max_values + 1,)
+                ).fetchall()
+                column_values = [r[0] for r in rows if isinstance(r[0], str) and 0 < len(r[0]) <= 60]
+                if 0 < len(rows) <= max_values:
+                    values.setdefault(table["name"], {})[name] = column_values
+    finally:
+        conn.close()
+    return values
+
+
+class TemplateFastPath:
+    """
+    Matcher plus usage counters and shadow comparison against the LLM.
+
+    shadow_generate(question) -> SQL from the LLM, and shadow_rows(sql) ->
+    rows, are supplied by the router.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        shadow_generate: Optional[Callable[[str], str]] = None,
+        shadow_rows: Optional[Callable[[str], List[tuple]]] = None,
+        enabled: bool = SQL_TEMPLATES_ENABLED,
+        shadow_rate: float = TEMPLATE_SHADOW_RATE
+    ):
+        self.db_path = db_path
+        self.enabled = enabled
+        self.shadow_rate = shadow_rate if shadow_generate and shadow_rows else 0.0
+        self.shadow_generate = shadow_generate
+        self.shadow_rows = shadow_rows
+        self._matcher: Optional[TemplateMatcher] = None
+        self._version = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="template-shadow")
+        self.counters = {"attempts": 0, "matches": 0}
+        self.reasons: Dict[str, int] = {}
+        self.shadow = {"sampled": 0, "agree": 0, "disagree": 0, "errors": 0}
+        self.disagreements = deque(maxlen=20)
+
+    def matcher(self) -> TemplateMatcher:
+        """Current matcher, rebuilt when the schema version changes or it gets stale."""
+        version = current_schema_version()
+        with self._lock:
+            stale = time.time() - self._loaded_at > TEMPLATE_REFRESH_S
+            if self._matcher is None or version != self._version or stale:
+                tables = introspect_schema(self.db_path)
+                self._matcher = TemplateMatcher(tables, sample_values(self.db_path, tables))
+                self._version = version
+                self._loaded_at = time.time()
+            return self._matcher
+
+    def value_terms(self, question: str) -> List[str]:
+        """Sampled column values named in the question (see TemplateMatcher.value_terms)."""
+        return self.matcher().value_terms(question)
+
+    def try_match(self, question: str) -> Optional[Dict]:
+        """The template match for a confident question, else None (use the LLM)."""
+        if not self.enabled:
+            return None
+        try:
+            match = self.matcher().match(question)
+        except Exception as e:
+            print(f"Warning: template matcher failed - {e}")
+            return None
+        with self._lock:
+            self.counters["attempts"] += 1
+            self.reasons[match["reason"]] = self.reasons.get(match["reason"], 0) + 1
+            if match["sql"] is None:
+                return None
+            self.counters["matches"] += 1
+        if self.shadow_rate and random.random() < self.shadow_rate:
+            self._shadow_executor.submit(self._compare, question, match["sql"])
+        return match
+
+    def _compare(self, question: str, template_sql: str):
+        """Run the LLM on the same question and compare result sets."""
+        try:
+            llm_sql = self.shadow_generate(question)
+            agree = _same_rows(self.shadow_rows(template_sql), self.shadow_rows(llm_sql))
+        except Exception as e:
+            print(f"Warning: template shadow comparison failed - {e}")
+            with self._lock:
+                self.shadow["sampled"] += 1
+                self.shadow["errors"] += 1
+            return
+        with self._lock:
+            self.shadow["sampled"] += 1
+            self.shadow["agree" if agree else "disagree"] += 1
+            if not agree:
+                self.disagreements.append(
+                    {"question": question, "template_sql": template_sql, "llm_sql": llm_sql}
+                )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            attempts = self.counters["attempts"]
+            compared = self.shadow["agree"] + self.shadow["disagree"]
+            return {
+                "enabled": self.enabled,
+                "attempts": attempts,
+                "matches": self.counters["matches"],
+                "match_rate": round(self.counters["matches"] / attempts, 4) if attempts else 0.0,
+                "reasons": dict(self.reasons),
+                "shadow_rate": self.shadow_rate,
+                "shadow": {
+                    **self.shadow,
+                    "agreement_rate": round(self.shadow["agree"] / compared, 4) if compared else None,
+                    "recent_disagreements": list(self.disagreements),
+                },
+                "schema_version": self._version,
+            }
+
+
+def _same_rows(a: List[tuple], b: List[tuple]) -> bool:
+    """Result sets are equal ignoring column names and row order."""
+    def key(rows):
+        return sorted((tuple("" if v is None else str(v) for v in row) for row in rows))
+    return key(a) == key(b)
@@ -0,0 +1,383 @@
+"""
+Deterministic offline stand-ins for the external providers, selected with
+SQL_BUDDY_PROVIDERS=stub (see providers.py):
+
+- FakeChatModel:  LangChain chat model with configurable latency that
+                  answers SQL-generation prompts with canned SQL
+- HashEmbeddings: feature-hashing embedder (same text -> same vector)
+- InMemoryRedis:  the subset of redis-py used here, with pipelines, TTLs
+                  and an asyncio facade
+- LocalMemory:    Mem0 substitute (add / search / get_all / delete_all)
+
+They exist so the full /rag/query pipeline can be load tested without
+OpenAI, Redis or Mem0. Stub latencies are set with STUB_LLM_LATENCY_MS,
+STUB_LLM_JITTER_MS and STUB_MEM0_LATENCY_MS.
+"""
+import fnmatch
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+STUB_LLM_LATENCY_MS = float(os.getenv("STUB_LLM_LATENCY_MS", "200"))
+STUB_LLM_JITTER_MS = float(os.getenv("STUB_LLM_JITTER_MS", "50"))
+STUB_MEM0_LATENCY_MS = float(os.getenv("STUB_MEM0_LATENCY_MS", "20"))
+
+# keyword in the question -> SQL; extend with STUB_LLM_SQL='{"keyword": "SELECT ..."}'
+CANNED_SQL = {
+    "customer": "SELECT customer_id, name, region FROM customers ORDER BY customer_id LIMIT 10",
+    "product": "SELECT product_id, name, category, price FROM products ORDER BY price DESC LIMIT 10",
+    "revenue": "SELECT strftime('%Y-%m', order_date) AS month, SUM(total_amount) AS revenue "
+               "FROM orders GROUP BY month ORDER BY month",
+    "order": "SELECT o.order_id, c.name, o.total_amount FROM orders o "
+             "JOIN customers c ON c.customer_id = o.customer_id ORDER BY o.order_date DESC LIMIT 20",
+}
+CANNED_SQL.update(json.loads(os.getenv("STUB_LLM_SQL", "{}")))
+DEFAULT_SQL = "SELECT COUNT(*) AS order_count FROM orders"
+
+_QUESTION = re.compile(r"(?:USER QUESTION|Question):\s*(.+)")
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+# ==================== Chat model ====================
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that sleeps like an API call and returns canned text."""
+
+    model_name: str = "stub-chat"
+    latency_ms: float = STUB_LLM_LATENCY_MS
+    jitter_ms: float = STUB_LLM_JITTER_MS
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(m.content) for m in messages)
+        if "SQL Query:" in prompt:
+            match = _QUESTION.search(prompt)
+            question = (match.group(1) if match else prompt).lower()
+            for keyword, sql in CANNED_SQL.items():
+                if keyword in question:
+                    return sql
+            return DEFAULT_SQL
+        if prompt.lstrip().startswith("{") or '"explanation"' in prompt:
+            return json.dumps({
+                "explanation": "Stub explanation.",
+                "optimization": "Stub optimization.",
+                "insights": "Stub insights.",
+            })
+        return "Stub analysis: the results look consistent with the question."
+
+    def _usage(self, messages: List[BaseMessage], text: str) -> Dict[str, int]:
+        """Word counts standing in for the provider's token usage."""
+        prompt_tokens = sum(len(str(m.content).split()) for m in messages)
+        completion_tokens = len(text.split())
+        return {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _sleep(self):
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(0.0, delay) / 1000)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        self._sleep()
+        text = self._respond(messages)
+        message = AIMessage(
+            content=text,
+            usage_metadata=self._usage(messages, text),
+            response_metadata={"model_name": self.model_name},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        self._sleep()
+        text = self._respond(messages)
+        for token in re.findall(r"\S+\s*", text):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        # Usage arrives on a final empty chunk, as with stream_usage=True
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="",
+            usage_metadata=self._usage(messages, text),
+            response_metadata={"model_name": self.model_name},
+        ))
+
+
+# ==================== Embeddings ====================
+
+class HashEmbeddings(Embeddings):
+    """Signed feature hashing of word tokens, L2-normalized."""
+
+    def __init__(self, dimensions: int = 1536):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for token in _TOKEN.findall(text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+# ==================== Redis ====================
+
+class _ConnectionPoolInfo:
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self._connections: List[Any] = []
+
+
+class InMemoryRedis:
+    """Thread-safe in-process subset of redis-py (strings, lists, hashes, TTLs)."""
+
+    def __init__(self, max_connections: int = 0):
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self.connection_pool = _ConnectionPoolInfo(max_connections)
+
+    def _live(self, key: str) -> bool:
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def ping(self) -> bool:
+        return True
+
+    def get(self, key: str):
+        with self._lock:
+            return self._data.get(key) if self._live(key) else None
+
+    def setex(self, key: str, ttl: int, value) -> bool:
+        with self._lock:
+            self._data[key] = value
+            self._expires[key] = time.time() + ttl
+            return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._live(key):
+                    removed += 1
+                self._data.pop(key, None)
+                self._expires.pop(key, None)
+            return removed
+
+    def expire(self, key: str, ttl: int) -> bool:
+        with self._lock:
+            if not self._live(key):
+                return False
+            self._expires[key] = time.time() + ttl
+            return True
+
+    def ttl(self, key: str) -> int:
+        with self._lock:
+            if not self._live(key):
+                return -2
+            expires_at = self._expires.get(key)
+            return -1 if expires_at is None else max(0, int(expires_at - time.time()))
+
+    def lpush(self, key: str, *values) -> int:
+        with self._lock:
+            self._live(key)  # drop an expired value first
+            items = self._data.setdefault(key, [])
+            for value in values:
+                items.insert(0, value)
+            return len(items)
+
+    def ltrim(self, key: str, start: int, end: int) -> bool:
+        with self._lock:
+            if self._live(key):
+                items = self._data[key]
+                self._data[key] = items[start:None if end == -1 else end + 1]
+            return True
+
+    def lrange(self, key: str, start: int, end: int) -> list:
+        with self._lock:
+            if not self._live(key):
+                return []
+            return list(self._data[key][start:None if end == -1 else end + 1])
+
+    def llen(self, key: str) -> int:
+        with self._lock:
+            return len(self._data[key]) if self._live(key) else 0
+
+    def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        with self._lock:
+            self._live(key)
+            hash_ = self._data.setdefault(key, {})
+            hash_[field] = str(int(hash_.get(field, 0)) + amount)
+            return int(hash_[field])
+
+    def hset(self, key: str, field: Optional[str] = None, value=None, mapping: Optional[Dict] = None) -> int:
+        with self._lock:
+            self._live(key)
+            hash_ = self._data.setdefault(key, {})
+            updates = dict(mapping or {})
+            if field is not None:
+                updates[field] = value
+            for f, v in updates.items():
+                hash_[f] = str(v)
+            return len(updates)
+
+    def hgetall(self, key: str) -> Dict:
+        with self._lock:
+            return dict(self._data[key]) if self._live(key) else {}
+
+    def scan_iter(self, match: str = "*", count: int = 100):
+        with self._lock:
+            keys = [k for k in list(self._data) if self._live(k) and fnmatch.fnmatchcase(k, match)]
+        return iter(keys)
+
+    def pipeline(self, transaction: bool = True) -> "_Pipeline":
+        return _Pipeline(self)
+
+
+class _Pipeline:
+    """Queues commands and runs them atomically on execute()."""
+
+    def __init__(self, client: InMemoryRedis):
+        self._client = client
+        self._commands: List[tuple] = []
+
+    def __getattr__(self, name: str):
+        method = getattr(self._client, name)
+
+        def queue_command(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+        return queue_command
+
+    def execute(self) -> list:
+        with self._client._lock:
+            results = [method(*args, **kwargs) for method, args, kwargs in self._commands]
+        self._commands = []
+        return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class AsyncInMemoryRedis:
+    """asyncio facade over an InMemoryRedis instance."""
+
+    def __init__(self, client: InMemoryRedis):
+        self._client = client
+        self.connection_pool = client.connection_pool
+
+    def __getattr__(self, name: str):
+        method = getattr(self._client, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+    def pipeline(self, transaction: bool = True) -> "_AsyncPipeline":
+        return _AsyncPipeline(self._client.pipeline(transaction))
+
+
+class _AsyncPipeline:
+    def __init__(self, pipeline: _Pipeline):
+        self._pipeline = pipeline
+
+    def __getattr__(self, name: str):
+        return getattr(self._pipeline, name)
+
+    async def execute(self) -> list:
+        return self._pipeline.execute()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+# ==================== Mem0 ====================
+
+class LocalMemory:
+    """In-process Mem0 substitute with token-overlap search."""
+
+    def __init__(self, latency_ms: float = STUB_MEM0_LATENCY_MS):
+        self.latency_ms = latency_ms
+        self._memories: Dict[str, List[Dict]] = {}
+        self._lock = threading.Lock()
+
+    def _sleep(self):
+        time.sleep(self.latency_ms / 1000)
+
+    def add(self, messages: List[Dict], user_id: str, metadata: Optional[Dict] = None) -> Dict:
+        self._sleep()
+        events = []
+        with self._lock:
+            memories = self._memories.setdefault(user_id, [])
+            for message in messages:
+                text = str(message.get("content", "")).strip().splitlines()[0] if message.get("content") else ""
+                if not text:
+                    continue
+                memory = {"id": uuid.uuid4().hex, "memory": text, "metadata": metadata or {}}
+                memories.append(memory)
+                events.append({"id": memory["id"], "memory": text, "event": "ADD"})
+        return {"results": events}
+
+    def search(self, query: str, user_id: str, limit: int = 5) -> List[Dict]:
+        self._sleep()
+        terms = set(_TOKEN.findall(query.lower()))
+        with self._lock:
+            memories = list(self._memories.get(user_id, []))
+        scored = []
+        for memory in memories:
+            overlap = len(terms & set(_TOKEN.findall(memory["memory"].lower())))
+            if overlap:
+                scored.append((overlap / (len(terms) or 1), memory))
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return [{**memory, "score": round(score, 3)} for score, memory in scored[:limit]]
+
+    def get_all(self, user_id: str, limit: int = 100) -> List[Dict]:
+        with self._lock:
+            return list(self._memories.get(user_id, []))[:limit]
+
+    def delete_all(self, user_id: str):
+        with self._lock:
+            self._memories.pop(user_id, None)
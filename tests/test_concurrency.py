@@ -0,0 +1,87 @@
+"""
+Deadline handling of gather_with_deadlines on a shared, saturated pool.
+
+Run from the repository root: python -m pytest tests
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend.rag.concurrency import gather_with_deadlines
+
+
+def work(seconds: float) -> str:
+    time.sleep(seconds)
+    return "done"
+
+
+def analysis_tasks(seconds: float, deadline_s: float):
+    return {
+        name: (work, (seconds,), deadline_s, "timed out")
+        for name in ("explanation", "optimization", "insights")
+    }
+
+
+def concurrent_requests(executor, requests: int, **kwargs):
+    """Run `requests` analyses at once (3 calls each), like parallel /rag/query calls."""
+    outcomes = [None] * requests
+
+    def one(i: int):
+        outcomes[i] = gather_with_deadlines(executor, analysis_tasks(0.1, 0.3), **kwargs)
+
+    threads = [threading.Thread(target=one, args=(i,)) for i in range(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+@pytest.fixture()
+def executor():
+    # Room for 2 requests at a time, like 12 workers shared by 4+ requests
+    pool = ThreadPoolExecutor(max_workers=6)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+def test_queued_calls_time_out_when_deadlines_count_from_submission(executor):
+    outcomes = concurrent_requests(executor, 8)
+    statuses = [t["status"] for _, timings in outcomes for t in timings.values()]
+    assert "timeout" in statuses
+
+
+def test_deadlines_from_task_start_survive_a_saturated_pool(executor):
+    outcomes = concurrent_requests(executor, 8, queue_timeout_s=5)
+    for results, timings in outcomes:
+        assert set(results.values()) == {"done"}
+        assert {t["status"] for t in timings.values()} == {"ok"}
+    assert max(t["queue_ms"] for _, timings in outcomes for t in timings.values()) > 100
+
+
+def test_call_without_a_free_worker_gives_up_after_queue_timeout():
+    pool = ThreadPoolExecutor(max_workers=1)
+    try:
+        pool.submit(work, 0.5)
+        ran = []
+        start = time.monotonic()
+        results, timings = gather_with_deadlines(
+            pool, {"insights": (ran.append, (1,), 1.0, "timed out")}, queue_timeout_s=0.1
+        )
+        assert time.monotonic() - start < 0.4
+        assert results == {"insights": "timed out"}
+        assert timings["insights"]["status"] == "timeout"
+        pool.shutdown(wait=True)
+        assert ran == []  # cancelled before it started
+    finally:
+        pool.shutdown(wait=True)
+
+
+def test_slow_call_still_misses_its_deadline(executor):
+    results, timings = gather_with_deadlines(
+        executor, {"explanation": (work, (0.5,), 0.1, "timed out")}, queue_timeout_s=5
+    )
+    assert results == {"explanation": "timed out"}
+    assert timings["explanation"]["status"] == "timeout"
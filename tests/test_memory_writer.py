@@ -0,0 +1,57 @@
+"""
+Retry accounting of the long-term memory write-behind queue.
+
+Run from the repository root: python -m pytest tests
+"""
+import pytest
+
+from backend.rag import memory_writer
+from backend.rag.memory_writer import MemoryWriteBehind
+
+
+class SessionWriter:
+    """write_batch stand-in: one add per session, failing sessions raise."""
+
+    def __init__(self, failures):
+        self.failures = dict(failures)  # session -> times to fail
+        self.stored = []
+
+    def __call__(self, user_id, items):
+        for session in sorted({i["session_id"] for i in items}):
+            if self.failures.get(session, 0):
+                self.failures[session] -= 1
+                raise RuntimeError(f"mem0 unavailable for {session}")
+            self.stored += [i["question"] for i in items if i["session_id"] == session]
+            items[:] = [i for i in items if i["session_id"] != session]
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(memory_writer, "RETRY_BASE_S", 0)
+
+
+def write(writer, max_retries):
+    queue = MemoryWriteBehind(writer, workers=1, batch_wait_s=0.2, max_retries=max_retries)
+    for session, question in (("a", "q1"), ("a", "q2"), ("b", "q3")):
+        queue.submit("user", {"session_id": session, "question": question})
+    assert queue.flush(timeout=5)
+    queue.close()
+    return queue.stats()
+
+
+def test_only_failed_session_is_counted_failed():
+    writer = SessionWriter({"b": 10})
+    stats = write(writer, max_retries=2)
+    assert writer.stored == ["q1", "q2"]
+    assert stats["written"] == 2
+    assert stats["failed"] == 1
+    assert stats["retries"] == 2
+
+
+def test_retry_does_not_rewrite_stored_sessions():
+    writer = SessionWriter({"b": 1})
+    stats = write(writer, max_retries=2)
+    assert writer.stored == ["q1", "q2", "q3"]
+    assert stats["written"] == 3
+    assert stats["failed"] == 0
+    assert stats["retries"] == 1
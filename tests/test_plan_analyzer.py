@@ -0,0 +1,64 @@
+"""
+Plan analyzer advice against the sample schema (backend/db/schema.sql).
+
+Run from the repository root: python -m pytest tests
+"""
+import os
+import sqlite3
+
+import pytest
+
+from backend.rag.plan_analyzer import analyze_query_plan
+
+SCHEMA_FILE = os.path.join(os.path.dirname(__file__), "..", "backend", "db", "schema.sql")
+
+
+@pytest.fixture()
+def conn():
+    conn = sqlite3.connect(":memory:")
+    with open(SCHEMA_FILE) as f:
+        conn.executescript(f.read())
+    yield conn
+    conn.close()
+
+
+def suggested(conn, sql):
+    return [f["index_sql"] for f in analyze_query_plan(conn, sql)["findings"] if f["index_sql"]]
+
+
+def test_filtered_scan_suggests_index(conn):
+    assert suggested(conn, "SELECT * FROM orders WHERE total_amount > 100") == [
+        "CREATE INDEX idx_orders_total_amount ON orders(total_amount)"
+    ]
+
+
+def test_single_table_group_by_suggests_index(conn):
+    assert suggested(conn, "SELECT region, COUNT(*) FROM customers GROUP BY region") == [
+        "CREATE INDEX idx_customers_region ON customers(region)"
+    ]
+
+
+@pytest.mark.parametrize("sql", [
+    # The outer table of a join is read in full whatever its indexes
+    "SELECT p.category, SUM(oi.subtotal) FROM order_items oi "
+    "JOIN products p ON oi.product_id = p.product_id "
+    "JOIN orders o ON oi.order_id = o.order_id GROUP BY p.category",
+    "SELECT c.region, SUM(o.total_amount) FROM customers c "
+    "JOIN orders o ON o.customer_id = c.customer_id GROUP BY c.region",
+    "SELECT o.order_id, oi.quantity FROM orders o "
+    "JOIN order_items oi ON oi.order_id = o.order_id",
+])
+def test_multi_table_aggregate_has_no_index_advice(conn, sql):
+    assert suggested(conn, sql) == []
+
+
+def test_inner_table_scan_suggests_join_key(conn):
+    conn.execute("PRAGMA automatic_index=off")
+    sql = (
+        "SELECT o.order_id, c.name FROM orders o JOIN customers c ON c.name = o.customer_id "
+        "WHERE o.total_amount > 100"
+    )
+    assert suggested(conn, sql) == [
+        "CREATE INDEX idx_orders_total_amount ON orders(total_amount)",
+        "CREATE INDEX idx_customers_name ON customers(name)",
+    ]
@@ -0,0 +1,86 @@
+"""
+Template fast path against the sample schema (backend/db/schema.sql).
+
+Run from the repository root: python -m pytest tests
+"""
+import os
+import sqlite3
+
+import pytest
+
+from backend.rag.schema_introspection import introspect_schema
+from backend.rag.sql_templates import TemplateMatcher, sample_values
+
+SCHEMA_FILE = os.path.join(os.path.dirname(__file__), "..", "backend", "db", "schema.sql")
+
+
+@pytest.fixture(scope="module")
+def db_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("templates") / "sql_buddy.db")
+    conn = sqlite3.connect(path)
+    with open(SCHEMA_FILE) as f:
+        conn.executescript(f.read())
+    conn.close()
+    return path
+
+
+@pytest.fixture(scope="module")
+def matcher(db_path):
+    tables = introspect_schema(db_path, SCHEMA_FILE)
+    return TemplateMatcher(tables, sample_values(db_path, tables))
+
+
+@pytest.mark.parametrize("question, sql", [
+    ("show all customers", "SELECT * FROM customers"),
+    ("how many customers", "SELECT COUNT(*) AS count FROM customers"),
+    ("customers in California", "SELECT * FROM customers WHERE region = 'California'"),
+    ("list all regions", "SELECT DISTINCT region FROM customers"),
+    ("products and their prices", "SELECT name, price FROM products"),
+    ("the 3 most expensive products", "SELECT * FROM products ORDER BY price DESC LIMIT 3"),
+    ("products sorted by price", "SELECT * FROM products ORDER BY price ASC"),
+    ("orders by total amount", "SELECT * FROM orders ORDER BY total_amount ASC"),
+    ("orders with total amount above 500", "SELECT * FROM orders WHERE total_amount > 500"),
+    ("how many products cost more than 100", "SELECT COUNT(*) AS count FROM products WHERE price > 100"),
+    ("how many products in Electronics",
+     "SELECT COUNT(*) AS count FROM products WHERE category = 'Electronics'"),
+    ("how many orders were placed last month",
+     "SELECT COUNT(*) AS count FROM orders WHERE order_date >= date('now', 'start of month', '-1 month') "
+     "AND order_date < date('now', 'start of month')"),
+    # Counting a column counts its distinct values, not the rows
+    ("how many regions are there", "SELECT COUNT(DISTINCT region) AS count FROM customers"),
+    ("how many categories", "SELECT COUNT(DISTINCT category) AS count FROM products"),
+])
+def test_matched(matcher, question, sql):
+    result = matcher.match(question)
+    assert result["reason"] == "matched"
+    assert result["sql"] == sql
+
+
+@pytest.mark.parametrize("question, reason", [
+    # Grouping
+    ("count of products by category", "aggregate"),
+    ("products per category", "aggregate"),
+    ("total amount per order", "aggregate"),
+    # Aggregates of a numeric column
+    ("what is the total amount of orders", "aggregate"),
+    ("average price of products", "aggregate"),
+    ("sum of total amount", "aggregate"),
+    ("how many customers have an email", "aggregate"),
+    # Other fallbacks
+    ("show them again", "follow_up"),
+    ("number of orders per customer", "ambiguous_table"),
+    ("what is the weather like", "no_table"),
+])
+def test_falls_back_to_llm(matcher, question, reason):
+    result = matcher.match(question)
+    assert result["sql"] is None
+    assert result["reason"] == reason
+
+
+def test_matched_sql_executes(matcher, db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        for question in ("how many regions are there", "the 3 most expensive products", "customers in California"):
+            conn.execute(matcher.match(question)["sql"]).fetchall()
+    finally:
+        conn.close()